@@ -0,0 +1,180 @@
+"""Tabela de rollup public.consumo_diario (totais por usuário e dia) mantida por triggers.
+
+Os triggers de public.consumo aplicam apenas a diferença de cada comando
+(INSERT, UPDATE, DELETE, TRUNCATE), então ler os totais diários custa uma linha
+por dia, independente de quantos anos de histórico existam.
+
+Uso pela linha de comando (reparo/backfill):
+    python agregados.py reconstruir
+    python agregados.py verificar
+"""
+import argparse
+import sys
+
+import banco
+
+SQL_CONSUMO_DIARIO = [
+    """CREATE TABLE IF NOT EXISTS public.consumo_diario (
+        data DATE PRIMARY KEY,
+        kcal DOUBLE PRECISION NOT NULL DEFAULT 0,
+        proteina DOUBLE PRECISION NOT NULL DEFAULT 0,
+        carbo DOUBLE PRECISION NOT NULL DEFAULT 0,
+        gordura DOUBLE PRECISION NOT NULL DEFAULT 0,
+        itens INTEGER NOT NULL DEFAULT 0
+    );""",
+    """CREATE OR REPLACE FUNCTION public.consumo_diario_aplicar() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'TRUNCATE' THEN
+            TRUNCATE public.consumo_diario;
+            RETURN NULL;
+        END IF;
+
+        -- Linhas removidas/antigas entram com sinal negativo, novas com positivo
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            INSERT INTO public.consumo_diario AS d (data, kcal, proteina, carbo, gordura, itens)
+            SELECT data, -SUM(COALESCE(kcal, 0)), -SUM(COALESCE(proteina, 0)),
+                   -SUM(COALESCE(carbo, 0)), -SUM(COALESCE(gordura, 0)), -COUNT(*)
+            FROM antigas WHERE data IS NOT NULL GROUP BY data
+            ON CONFLICT (data) DO UPDATE SET
+                kcal = d.kcal + EXCLUDED.kcal, proteina = d.proteina + EXCLUDED.proteina,
+                carbo = d.carbo + EXCLUDED.carbo, gordura = d.gordura + EXCLUDED.gordura,
+                itens = d.itens + EXCLUDED.itens;
+            DELETE FROM public.consumo_diario
+            WHERE itens <= 0 AND data IN (SELECT DISTINCT data FROM antigas);
+        END IF;
+
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO public.consumo_diario AS d (data, kcal, proteina, carbo, gordura, itens)
+            SELECT data, SUM(COALESCE(kcal, 0)), SUM(COALESCE(proteina, 0)),
+                   SUM(COALESCE(carbo, 0)), SUM(COALESCE(gordura, 0)), COUNT(*)
+            FROM novas WHERE data IS NOT NULL GROUP BY data
+            ON CONFLICT (data) DO UPDATE SET
+                kcal = d.kcal + EXCLUDED.kcal, proteina = d.proteina + EXCLUDED.proteina,
+                carbo = d.carbo + EXCLUDED.carbo, gordura = d.gordura + EXCLUDED.gordura,
+                itens = d.itens + EXCLUDED.itens;
+        END IF;
+        RETURN NULL;
+    END $$;""",
+    "DROP TRIGGER IF EXISTS trg_consumo_diario_ins ON public.consumo;",
+    "DROP TRIGGER IF EXISTS trg_consumo_diario_upd ON public.consumo;",
+    "DROP TRIGGER IF EXISTS trg_consumo_diario_del ON public.consumo;",
+    "DROP TRIGGER IF EXISTS trg_consumo_diario_trunc ON public.consumo;",
+    """CREATE TRIGGER trg_consumo_diario_ins AFTER INSERT ON public.consumo
+       REFERENCING NEW TABLE AS novas FOR EACH STATEMENT EXECUTE FUNCTION public.consumo_diario_aplicar();""",
+    """CREATE TRIGGER trg_consumo_diario_upd AFTER UPDATE ON public.consumo
+       REFERENCING OLD TABLE AS antigas NEW TABLE AS novas FOR EACH STATEMENT EXECUTE FUNCTION public.consumo_diario_aplicar();""",
+    """CREATE TRIGGER trg_consumo_diario_del AFTER DELETE ON public.consumo
+       REFERENCING OLD TABLE AS antigas FOR EACH STATEMENT EXECUTE FUNCTION public.consumo_diario_aplicar();""",
+    """CREATE TRIGGER trg_consumo_diario_trunc AFTER TRUNCATE ON public.consumo
+       FOR EACH STATEMENT EXECUTE FUNCTION public.consumo_diario_aplicar();""",
+]
+
+# Versão por usuário (migração 10): chave (user_id, data). As listas acima ficam como a migração 2 as aplicou
+SQL_CONSUMO_DIARIO_POR_USUARIO = [
+    "ALTER TABLE public.consumo_diario ADD COLUMN IF NOT EXISTS user_id INTEGER NOT NULL DEFAULT 1;",
+    "ALTER TABLE public.consumo_diario ALTER COLUMN user_id DROP DEFAULT;",
+    "ALTER TABLE public.consumo_diario DROP CONSTRAINT consumo_diario_pkey, ADD PRIMARY KEY (user_id, data);",
+    """CREATE OR REPLACE FUNCTION public.consumo_diario_aplicar() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'TRUNCATE' THEN
+            TRUNCATE public.consumo_diario;
+            RETURN NULL;
+        END IF;
+
+        -- Linhas removidas/antigas entram com sinal negativo, novas com positivo
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            INSERT INTO public.consumo_diario AS d (user_id, data, kcal, proteina, carbo, gordura, itens)
+            SELECT user_id, data, -SUM(COALESCE(kcal, 0)), -SUM(COALESCE(proteina, 0)),
+                   -SUM(COALESCE(carbo, 0)), -SUM(COALESCE(gordura, 0)), -COUNT(*)
+            FROM antigas WHERE data IS NOT NULL GROUP BY user_id, data
+            ON CONFLICT (user_id, data) DO UPDATE SET
+                kcal = d.kcal + EXCLUDED.kcal, proteina = d.proteina + EXCLUDED.proteina,
+                carbo = d.carbo + EXCLUDED.carbo, gordura = d.gordura + EXCLUDED.gordura,
+                itens = d.itens + EXCLUDED.itens;
+            DELETE FROM public.consumo_diario
+            WHERE itens <= 0 AND (user_id, data) IN (SELECT DISTINCT user_id, data FROM antigas);
+        END IF;
+
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO public.consumo_diario AS d (user_id, data, kcal, proteina, carbo, gordura, itens)
+            SELECT user_id, data, SUM(COALESCE(kcal, 0)), SUM(COALESCE(proteina, 0)),
+                   SUM(COALESCE(carbo, 0)), SUM(COALESCE(gordura, 0)), COUNT(*)
+            FROM novas WHERE data IS NOT NULL GROUP BY user_id, data
+            ON CONFLICT (user_id, data) DO UPDATE SET
+                kcal = d.kcal + EXCLUDED.kcal, proteina = d.proteina + EXCLUDED.proteina,
+                carbo = d.carbo + EXCLUDED.carbo, gordura = d.gordura + EXCLUDED.gordura,
+                itens = d.itens + EXCLUDED.itens;
+        END IF;
+        RETURN NULL;
+    END $$;""",
+]
+
+SQL_RECONSTRUIR = [
+    "DELETE FROM public.consumo_diario;",
+    """INSERT INTO public.consumo_diario (data, kcal, proteina, carbo, gordura, itens)
+       SELECT data, SUM(COALESCE(kcal, 0)), SUM(COALESCE(proteina, 0)),
+              SUM(COALESCE(carbo, 0)), SUM(COALESCE(gordura, 0)), COUNT(*)
+       FROM public.consumo WHERE data IS NOT NULL GROUP BY data;""",
+]
+
+SQL_RECONSTRUIR_POR_USUARIO = [
+    "DELETE FROM public.consumo_diario;",
+    """INSERT INTO public.consumo_diario (user_id, data, kcal, proteina, carbo, gordura, itens)
+       SELECT user_id, data, SUM(COALESCE(kcal, 0)), SUM(COALESCE(proteina, 0)),
+              SUM(COALESCE(carbo, 0)), SUM(COALESCE(gordura, 0)), COUNT(*)
+       FROM public.consumo WHERE data IS NOT NULL GROUP BY user_id, data;""",
+]
+
+SQL_DIVERGENCIAS = """
+    WITH real AS (
+        SELECT user_id, data, SUM(COALESCE(kcal, 0)) AS kcal, SUM(COALESCE(proteina, 0)) AS proteina,
+               SUM(COALESCE(carbo, 0)) AS carbo, SUM(COALESCE(gordura, 0)) AS gordura, COUNT(*) AS itens
+        FROM public.consumo WHERE data IS NOT NULL GROUP BY user_id, data
+    )
+    SELECT COALESCE(r.user_id, d.user_id) AS user_id, COALESCE(r.data, d.data) AS data,
+           r.itens AS itens_consumo, d.itens AS itens_rollup, r.kcal AS kcal_consumo, d.kcal AS kcal_rollup
+    FROM real r FULL OUTER JOIN public.consumo_diario d ON d.user_id = r.user_id AND d.data = r.data
+    WHERE r.data IS NULL OR d.data IS NULL OR r.itens <> d.itens
+       OR abs(r.kcal - d.kcal) > 0.5 OR abs(r.proteina - d.proteina) > 0.5
+       OR abs(r.carbo - d.carbo) > 0.5 OR abs(r.gordura - d.gordura) > 0.5
+    ORDER BY 1, 2
+"""
+
+
+def reconstruir_consumo_diario(pool):
+    """Recalcula o rollup inteiro a partir de public.consumo (backfill/reparo). Retorna os dias gravados."""
+    with pool.transacao() as cur:
+        # Bloqueia escritas em consumo durante a reconstrução (leituras continuam)
+        cur.execute("LOCK TABLE public.consumo IN SHARE MODE")
+        for sql in SQL_RECONSTRUIR_POR_USUARIO:
+            cur.execute(sql)
+        return cur.rowcount
+
+
+def verificar_consumo_diario(pool):
+    """Retorna um DataFrame com os dias em que o rollup diverge de public.consumo (vazio = ok)."""
+    return pool.consultar(SQL_DIVERGENCIAS)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manutenção do rollup public.consumo_diario.")
+    parser.add_argument('comando', choices=['reconstruir', 'verificar'])
+    banco.argumento_dsn(parser)
+    args = parser.parse_args(argv)
+
+    pool = banco.pool_cli(args)
+    if args.comando == 'reconstruir':
+        print(f"Rollup reconstruído: {reconstruir_consumo_diario(pool)} dia(s).")
+        return 0
+    divergencias = verificar_consumo_diario(pool)
+    if divergencias.empty:
+        print("Rollup consistente com public.consumo.")
+        return 0
+    print(divergencias.to_string(index=False))
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
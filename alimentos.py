@@ -0,0 +1,180 @@
+"""Dicionário de alimentos (public.alimento) e o vínculo consumo.alimento_id.
+
+Cada nome livre que chega da IA, do JSON ou da TACO é reduzido a uma chave
+normalizada (sem acentos, caixa, pontuação, plural e stopwords: "Ovos cozidos"
+e "ovo  cozido." viram "ovo cozido"). A chave identifica o alimento, que guarda
+o nome canônico e, quando o índice TACO casa com segurança, o id da TACO.
+O texto original continua em consumo.alimento para exibição.
+
+Os ids ficam num dicionário em memória, um por pool (cada pool é um banco): só
+nomes nunca vistos vão ao banco, todos num único INSERT.
+
+Uso pela linha de comando (backfill/deduplicação do histórico):
+    python alimentos.py preencher
+"""
+import argparse
+import sys
+import threading
+import weakref
+
+from psycopg2.extras import execute_values
+
+import banco
+import taco
+
+SQL_ESQUEMA = [
+    """CREATE TABLE IF NOT EXISTS public.alimento (
+        id SERIAL PRIMARY KEY,
+        nome TEXT NOT NULL,
+        chave TEXT NOT NULL,
+        taco_id INTEGER REFERENCES public.tabela_taco (id) ON DELETE SET NULL,
+        criado_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+        CONSTRAINT alimento_chave_unica UNIQUE (chave)
+    );""",
+    "ALTER TABLE public.consumo ADD COLUMN IF NOT EXISTS alimento_id INTEGER REFERENCES public.alimento (id);",
+    "CREATE INDEX IF NOT EXISTS idx_consumo_alimento_id ON public.consumo (alimento_id, data);",
+    # Só as linhas ainda sem vínculo (histórico, COPY, scripts): o backfill as acha sem varrer a tabela
+    "CREATE INDEX IF NOT EXISTS idx_consumo_sem_alimento ON public.consumo (alimento) WHERE alimento_id IS NULL;",
+]
+
+# O DO UPDATE (sem mudar nada) faz o RETURNING devolver também as chaves que já existiam
+SQL_GARANTIR = """
+    INSERT INTO public.alimento (nome, chave, taco_id) VALUES %s
+    ON CONFLICT (chave) DO UPDATE SET chave = EXCLUDED.chave
+    RETURNING id, chave
+"""
+
+SQL_VINCULAR = """
+    UPDATE public.consumo c SET alimento_id = m.alimento_id
+    FROM (VALUES %s) AS m (texto, alimento_id)
+    WHERE c.alimento = m.texto AND c.alimento_id IS NULL
+"""
+
+
+def chave(nome):
+    """Chave normalizada de um nome de alimento ('' se não sobrar nenhuma palavra)."""
+    return ' '.join(taco.tokenizar(nome))
+
+
+class DicionarioAlimentos:
+    """Cache chave -> id de public.alimento, carregado uma vez e completado sob demanda."""
+
+    def __init__(self):
+        self._ids = None
+        self._lock = threading.Lock()
+
+    def _carregar(self, pool):
+        if self._ids is None:
+            df = pool.consultar("SELECT id, chave FROM public.alimento")
+            self._ids = dict(zip(df['chave'], df['id'].astype(int)))
+
+    def resolver(self, pool, nomes):
+        """``{nome: alimento_id}`` para os nomes dados; os que faltam no banco são criados num único INSERT.
+
+        Nomes sem chave (só stopwords/pontuação) ficam fora do resultado. Um
+        alimento novo recebe como nome canônico a primeira grafia da lista.
+        """
+        chaves = {nome: chave(nome) for nome in dict.fromkeys(nomes)}
+        with self._lock:
+            self._carregar(pool)
+            novos = {}
+            for nome, k in chaves.items():
+                if k and k not in self._ids and k not in novos:
+                    novos[k] = nome
+            if novos:
+                indice = _indice_taco(pool)
+                linhas = [(nome, k, _taco_id(indice, nome)) for k, nome in novos.items()]
+                with pool.transacao() as cur:
+                    retornados = execute_values(cur, SQL_GARANTIR, linhas, page_size=len(linhas), fetch=True)
+                # Só entra no cache depois do COMMIT
+                self._ids.update((k, id_) for id_, k in retornados)
+            return {nome: self._ids[k] for nome, k in chaves.items() if k}
+
+    def invalidar(self):
+        with self._lock:
+            self._ids = None
+
+
+def _indice_taco(pool):
+    try:
+        return taco.obter_indice(pool)
+    except Exception:
+        return None
+
+
+def _taco_id(indice, nome):
+    casado = indice.casar(nome) if indice else None
+    return casado['id'] if casado else None
+
+
+def vincular_linhas(pool, linhas):
+    """Acrescenta o alimento_id ao fim de cada tupla de public.consumo (o nome é a 2ª coluna)."""
+    ids = obter_dicionario(pool).resolver(pool, [linha[1] for linha in linhas])
+    return [(*linha, ids.get(linha[1])) for linha in linhas]
+
+
+def preencher(pool):
+    """Vincula as linhas de public.consumo ainda sem alimento_id (backfill e deduplicação).
+
+    Variações do mesmo nome caem na mesma chave; o nome canônico de um alimento
+    novo é a grafia mais frequente. Retorna ``(linhas_vinculadas, alimentos_criados)``.
+    """
+    df = pool.consultar(
+        "SELECT alimento, COUNT(*) AS n FROM public.consumo WHERE alimento_id IS NULL GROUP BY alimento"
+    )
+    if df.empty:
+        return 0, 0
+    # Grafia mais frequente primeiro (empate: a mais curta), para virar o nome canônico
+    df = df.assign(tamanho=df['alimento'].str.len()).sort_values(['n', 'tamanho'], ascending=[False, True])
+    total_antes = int(pool.consultar("SELECT COUNT(*) AS n FROM public.alimento")['n'].iloc[0])
+    ids = obter_dicionario(pool).resolver(pool, df['alimento'].tolist())
+    criados = int(pool.consultar("SELECT COUNT(*) AS n FROM public.alimento")['n'].iloc[0]) - total_antes
+    if not ids:
+        return 0, criados
+    with pool.transacao() as cur:
+        execute_values(cur, SQL_VINCULAR, list(ids.items()), page_size=len(ids))
+        return cur.rowcount, criados
+
+
+# --- UM DICIONÁRIO POR POOL ---
+# Chave é o próprio pool (não o id): os ids de public.alimento só valem no banco dele,
+# e um pool novo pode reaproveitar o endereço de um já fechado
+_dicionarios = weakref.WeakKeyDictionary()
+_dicionarios_lock = threading.Lock()
+_verificados = weakref.WeakSet()
+_lock = threading.Lock()
+
+
+def obter_dicionario(pool):
+    with _dicionarios_lock:
+        if pool not in _dicionarios:
+            _dicionarios[pool] = DicionarioAlimentos()
+        return _dicionarios[pool]
+
+
+def garantir_vinculos(pool):
+    """Roda ``preencher`` na primeira chamada do processo para este pool (linhas vindas de COPY/scripts)."""
+    if pool in _verificados:
+        return 0, 0
+    with _lock:
+        if pool in _verificados:
+            return 0, 0
+        resultado = preencher(pool)
+        _verificados.add(pool)
+        return resultado
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manutenção do dicionário de alimentos (public.alimento).")
+    parser.add_argument('comando', choices=['preencher'])
+    banco.argumento_dsn(parser)
+    args = parser.parse_args(argv)
+
+    pool = banco.pool_cli(args)
+    linhas, criados = preencher(pool)
+    print(f"{linhas} linha(s) de consumo vinculada(s); {criados} alimento(s) novo(s) no dicionário.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,340 @@
+"""Resumos semanais e mensais pré-calculados (macros, aderência às metas, sequências e glúten).
+
+Um trigger de public.consumo marca em public.analise_dia_pendente os dias
+alterados; ``atualizar`` recalcula só as semanas e os meses desses dias a partir
+do rollup public.consumo_diario e grava em public.analise_periodo. Ler um ano de
+aderência custa uma consulta de ~12 (ou ~52) linhas, sem varrer o consumo.
+
+Tudo é por usuário. "Dia na meta" de calorias é kcal <= meta; de proteína,
+proteína >= meta, com as metas de public.usuario. As metas usadas no último
+cálculo ficam em public.analise_estado: se mudarem, o usuário é recalculado.
+
+Uso pela linha de comando:
+    python analises.py atualizar
+    python analises.py reconstruir
+"""
+import argparse
+import sys
+
+import banco
+
+# Chave do advisory lock: só um processo recalcula por vez (os demais seguem com o que já está gravado)
+CHAVE_LOCK = 7_202_602
+
+GRANULARIDADES = {'semana': 'week', 'mes': 'month'}
+
+SQL_ESQUEMA = [
+    "CREATE TABLE IF NOT EXISTS public.analise_dia_pendente (data DATE PRIMARY KEY);",
+    """CREATE TABLE IF NOT EXISTS public.analise_periodo (
+        granularidade TEXT NOT NULL CHECK (granularidade IN ('semana', 'mes')),
+        inicio DATE NOT NULL,
+        fim DATE NOT NULL,
+        dias_registrados INTEGER NOT NULL,
+        kcal_total DOUBLE PRECISION NOT NULL,
+        proteina_total DOUBLE PRECISION NOT NULL,
+        carbo_total DOUBLE PRECISION NOT NULL,
+        gordura_total DOUBLE PRECISION NOT NULL,
+        kcal_media DOUBLE PRECISION NOT NULL,
+        proteina_media DOUBLE PRECISION NOT NULL,
+        carbo_media DOUBLE PRECISION NOT NULL,
+        gordura_media DOUBLE PRECISION NOT NULL,
+        dias_meta_kcal INTEGER NOT NULL,
+        dias_meta_proteina INTEGER NOT NULL,
+        dias_meta_ambas INTEGER NOT NULL,
+        maior_sequencia INTEGER NOT NULL,
+        dias_com_gluten INTEGER NOT NULL,
+        itens_com_gluten INTEGER NOT NULL,
+        atualizado_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (granularidade, inicio)
+    );""",
+    """CREATE TABLE IF NOT EXISTS public.analise_estado (
+        id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+        meta_kcal DOUBLE PRECISION NOT NULL,
+        meta_proteina DOUBLE PRECISION NOT NULL,
+        maior_sequencia INTEGER NOT NULL DEFAULT 0,
+        sequencia_recente INTEGER NOT NULL DEFAULT 0,
+        sequencia_recente_fim DATE,
+        processado_em TIMESTAMPTZ NOT NULL DEFAULT now()
+    );""",
+    """CREATE OR REPLACE FUNCTION public.analise_marcar_dias() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'TRUNCATE' THEN
+            TRUNCATE public.analise_periodo, public.analise_dia_pendente;
+            UPDATE public.analise_estado SET maior_sequencia = 0, sequencia_recente = 0, sequencia_recente_fim = NULL;
+            RETURN NULL;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            INSERT INTO public.analise_dia_pendente SELECT DISTINCT data FROM antigas WHERE data IS NOT NULL
+            ON CONFLICT DO NOTHING;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO public.analise_dia_pendente SELECT DISTINCT data FROM novas WHERE data IS NOT NULL
+            ON CONFLICT DO NOTHING;
+        END IF;
+        RETURN NULL;
+    END $$;""",
+    """CREATE TRIGGER trg_analise_ins AFTER INSERT ON public.consumo
+       REFERENCING NEW TABLE AS novas FOR EACH STATEMENT EXECUTE FUNCTION public.analise_marcar_dias();""",
+    """CREATE TRIGGER trg_analise_upd AFTER UPDATE ON public.consumo
+       REFERENCING OLD TABLE AS antigas NEW TABLE AS novas FOR EACH STATEMENT EXECUTE FUNCTION public.analise_marcar_dias();""",
+    """CREATE TRIGGER trg_analise_del AFTER DELETE ON public.consumo
+       REFERENCING OLD TABLE AS antigas FOR EACH STATEMENT EXECUTE FUNCTION public.analise_marcar_dias();""",
+    """CREATE TRIGGER trg_analise_trunc AFTER TRUNCATE ON public.consumo
+       FOR EACH STATEMENT EXECUTE FUNCTION public.analise_marcar_dias();""",
+    # Histórico existente: todos os dias entram como pendentes e o primeiro ``atualizar`` faz o backfill
+    "INSERT INTO public.analise_dia_pendente SELECT data FROM public.consumo_diario ON CONFLICT DO NOTHING;",
+]
+
+# Versão por usuário (migração 10). As tabelas só guardam dados derivados: são recriadas com
+# user_id na chave e o histórico inteiro volta como pendente (o próximo ``atualizar`` refaz tudo)
+SQL_ESQUEMA_POR_USUARIO = [
+    "DROP TABLE IF EXISTS public.analise_dia_pendente, public.analise_periodo, public.analise_estado;",
+    """CREATE TABLE public.analise_dia_pendente (
+        user_id INTEGER NOT NULL,
+        data DATE NOT NULL,
+        PRIMARY KEY (user_id, data)
+    );""",
+    """CREATE TABLE public.analise_periodo (
+        user_id INTEGER NOT NULL REFERENCES public.usuario (id) ON DELETE CASCADE,
+        granularidade TEXT NOT NULL CHECK (granularidade IN ('semana', 'mes')),
+        inicio DATE NOT NULL,
+        fim DATE NOT NULL,
+        dias_registrados INTEGER NOT NULL,
+        kcal_total DOUBLE PRECISION NOT NULL,
+        proteina_total DOUBLE PRECISION NOT NULL,
+        carbo_total DOUBLE PRECISION NOT NULL,
+        gordura_total DOUBLE PRECISION NOT NULL,
+        kcal_media DOUBLE PRECISION NOT NULL,
+        proteina_media DOUBLE PRECISION NOT NULL,
+        carbo_media DOUBLE PRECISION NOT NULL,
+        gordura_media DOUBLE PRECISION NOT NULL,
+        dias_meta_kcal INTEGER NOT NULL,
+        dias_meta_proteina INTEGER NOT NULL,
+        dias_meta_ambas INTEGER NOT NULL,
+        maior_sequencia INTEGER NOT NULL,
+        dias_com_gluten INTEGER NOT NULL,
+        itens_com_gluten INTEGER NOT NULL,
+        atualizado_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (user_id, granularidade, inicio)
+    );""",
+    """CREATE TABLE public.analise_estado (
+        user_id INTEGER PRIMARY KEY REFERENCES public.usuario (id) ON DELETE CASCADE,
+        meta_kcal DOUBLE PRECISION NOT NULL,
+        meta_proteina DOUBLE PRECISION NOT NULL,
+        maior_sequencia INTEGER NOT NULL DEFAULT 0,
+        sequencia_recente INTEGER NOT NULL DEFAULT 0,
+        sequencia_recente_fim DATE,
+        processado_em TIMESTAMPTZ NOT NULL DEFAULT now()
+    );""",
+    """CREATE OR REPLACE FUNCTION public.analise_marcar_dias() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'TRUNCATE' THEN
+            TRUNCATE public.analise_periodo, public.analise_dia_pendente;
+            UPDATE public.analise_estado SET maior_sequencia = 0, sequencia_recente = 0, sequencia_recente_fim = NULL;
+            RETURN NULL;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            INSERT INTO public.analise_dia_pendente SELECT DISTINCT user_id, data FROM antigas WHERE data IS NOT NULL
+            ON CONFLICT DO NOTHING;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO public.analise_dia_pendente SELECT DISTINCT user_id, data FROM novas WHERE data IS NOT NULL
+            ON CONFLICT DO NOTHING;
+        END IF;
+        RETURN NULL;
+    END $$;""",
+    "INSERT INTO public.analise_dia_pendente SELECT user_id, data FROM public.consumo_diario ON CONFLICT DO NOTHING;",
+]
+
+# Metas vêm de public.usuario; se diferirem das usadas no último cálculo, o usuário é recalculado inteiro
+SQL_SITUACAO = """
+    SELECT u.meta_kcal::double precision AS meta_kcal, u.meta_proteina::double precision AS meta_proteina,
+           e.user_id IS NULL
+               OR e.meta_kcal IS DISTINCT FROM u.meta_kcal::double precision
+               OR e.meta_proteina IS DISTINCT FROM u.meta_proteina::double precision AS metas_mudaram,
+           EXISTS (SELECT 1 FROM public.analise_dia_pendente p WHERE p.user_id = u.id) AS ha_pendentes
+    FROM public.usuario u LEFT JOIN public.analise_estado e ON e.user_id = u.id
+    WHERE u.id = %s
+"""
+
+# Semanas (ISO, começam na segunda) e meses que contêm os dias pendentes
+SQL_PERIODOS_AFETADOS = """
+    SELECT DISTINCT g.granularidade, date_trunc(g.unidade, d)::date AS inicio,
+           (date_trunc(g.unidade, d) + ('1 ' || g.unidade)::interval - interval '1 day')::date AS fim
+    FROM unnest(%(dias)s::date[]) AS d
+    CROSS JOIN (VALUES ('semana', 'week'), ('mes', 'month')) AS g(granularidade, unidade)
+"""
+
+SQL_RECALCULAR_PERIODOS = f"""
+    WITH periodos AS ({SQL_PERIODOS_AFETADOS}),
+    dias AS (
+        SELECT p.granularidade, p.inicio, p.fim, c.data, c.kcal, c.proteina, c.carbo, c.gordura,
+               c.kcal <= %(meta_kcal)s AS meta_kcal, c.proteina >= %(meta_proteina)s AS meta_proteina
+        FROM periodos p
+        JOIN public.consumo_diario c ON c.user_id = %(user_id)s AND c.data BETWEEN p.inicio AND p.fim
+    ),
+    -- Ilhas de dias consecutivos com as duas metas: data - posição é constante dentro de cada ilha
+    sequencias AS (
+        SELECT granularidade, inicio, MAX(n) AS maior_sequencia
+        FROM (
+            SELECT granularidade, inicio, COUNT(*) AS n
+            FROM (
+                SELECT granularidade, inicio, data - (ROW_NUMBER() OVER (PARTITION BY granularidade, inicio ORDER BY data))::int AS ilha
+                FROM dias WHERE meta_kcal AND meta_proteina
+            ) x
+            GROUP BY granularidade, inicio, ilha
+        ) y
+        GROUP BY granularidade, inicio
+    ),
+    -- Só as linhas com glúten (índice parcial idx_consumo_usuario_com_gluten)
+    gluten AS (
+        SELECT p.granularidade, p.inicio, COUNT(DISTINCT c.data) AS dias_com_gluten, COUNT(*) AS itens_com_gluten
+        FROM periodos p
+        JOIN public.consumo c ON c.contem_gluten AND c.user_id = %(user_id)s AND c.data BETWEEN p.inicio AND p.fim
+        GROUP BY p.granularidade, p.inicio
+    )
+    INSERT INTO public.analise_periodo (
+        user_id, granularidade, inicio, fim, dias_registrados,
+        kcal_total, proteina_total, carbo_total, gordura_total,
+        kcal_media, proteina_media, carbo_media, gordura_media,
+        dias_meta_kcal, dias_meta_proteina, dias_meta_ambas, maior_sequencia,
+        dias_com_gluten, itens_com_gluten
+    )
+    SELECT %(user_id)s, d.granularidade, d.inicio, MIN(d.fim), COUNT(*),
+           SUM(d.kcal), SUM(d.proteina), SUM(d.carbo), SUM(d.gordura),
+           AVG(d.kcal), AVG(d.proteina), AVG(d.carbo), AVG(d.gordura),
+           COUNT(*) FILTER (WHERE d.meta_kcal), COUNT(*) FILTER (WHERE d.meta_proteina),
+           COUNT(*) FILTER (WHERE d.meta_kcal AND d.meta_proteina), COALESCE(MAX(s.maior_sequencia), 0),
+           COALESCE(MAX(g.dias_com_gluten), 0), COALESCE(MAX(g.itens_com_gluten), 0)
+    FROM dias d
+    LEFT JOIN sequencias s USING (granularidade, inicio)
+    LEFT JOIN gluten g USING (granularidade, inicio)
+    GROUP BY d.granularidade, d.inicio
+"""
+
+SQL_SEQUENCIAS_GERAIS = """
+    WITH ok AS (
+        SELECT data, data - (ROW_NUMBER() OVER (ORDER BY data))::int AS ilha
+        FROM public.consumo_diario
+        WHERE user_id = %(user_id)s AND kcal <= %(meta_kcal)s AND proteina >= %(meta_proteina)s
+    ),
+    ilhas AS (SELECT MAX(data) AS fim, COUNT(*) AS n FROM ok GROUP BY ilha)
+    INSERT INTO public.analise_estado (user_id, meta_kcal, meta_proteina, maior_sequencia, sequencia_recente, sequencia_recente_fim, processado_em)
+    SELECT %(user_id)s, %(meta_kcal)s, %(meta_proteina)s, COALESCE(MAX(n), 0),
+           COALESCE((SELECT n FROM ilhas ORDER BY fim DESC LIMIT 1), 0), MAX(fim), now()
+    FROM ilhas
+    ON CONFLICT (user_id) DO UPDATE SET
+        meta_kcal = EXCLUDED.meta_kcal, meta_proteina = EXCLUDED.meta_proteina,
+        maior_sequencia = EXCLUDED.maior_sequencia, sequencia_recente = EXCLUDED.sequencia_recente,
+        sequencia_recente_fim = EXCLUDED.sequencia_recente_fim, processado_em = EXCLUDED.processado_em
+"""
+
+SQL_DIARIO = """
+    SELECT c.data, c.itens, c.kcal, c.proteina, c.carbo, c.gordura,
+           c.kcal <= %(meta_kcal)s AS meta_kcal, c.proteina >= %(meta_proteina)s AS meta_proteina,
+           COALESCE(g.itens_com_gluten, 0) AS itens_com_gluten
+    FROM public.consumo_diario c
+    LEFT JOIN (
+        SELECT data, COUNT(*) AS itens_com_gluten FROM public.consumo
+        WHERE contem_gluten AND user_id = %(user_id)s AND data BETWEEN %(inicio)s AND %(fim)s GROUP BY data
+    ) g USING (data)
+    WHERE c.user_id = %(user_id)s AND c.data BETWEEN %(inicio)s AND %(fim)s
+    ORDER BY c.data
+"""
+
+
+def atualizar(pool, user_id, forcar=False):
+    """Recalcula as semanas/meses dos dias pendentes do usuário. Retorna quantos dias foram processados.
+
+    As metas são as de public.usuario. Sem pendências e com as mesmas metas,
+    custa uma única consulta. Se outro processo já estiver recalculando este
+    usuário, retorna 0 sem esperar.
+    """
+    situacao = pool.consultar(SQL_SITUACAO, (int(user_id),))
+    if situacao.empty:
+        raise ValueError(f"Usuário inexistente: {user_id}")
+    situacao = situacao.iloc[0]
+    metas_mudaram = bool(situacao['metas_mudaram'])
+    if not (forcar or metas_mudaram or situacao['ha_pendentes']):
+        return 0
+
+    params = {
+        'user_id': int(user_id),
+        'meta_kcal': float(situacao['meta_kcal']),
+        'meta_proteina': float(situacao['meta_proteina']),
+    }
+    with pool.transacao() as cur:
+        # Um lock por usuário: recálculos de usuários diferentes não se bloqueiam
+        cur.execute("SELECT pg_try_advisory_xact_lock(%s, %s)", (CHAVE_LOCK, params['user_id']))
+        if not cur.fetchone()[0]:
+            return 0
+        if forcar or metas_mudaram:
+            cur.execute("DELETE FROM public.analise_periodo WHERE user_id = %(user_id)s", params)
+            cur.execute(
+                "INSERT INTO public.analise_dia_pendente SELECT user_id, data FROM public.consumo_diario "
+                "WHERE user_id = %(user_id)s ON CONFLICT DO NOTHING",
+                params
+            )
+        cur.execute("DELETE FROM public.analise_dia_pendente WHERE user_id = %(user_id)s RETURNING data", params)
+        params['dias'] = [linha[0] for linha in cur.fetchall()]
+        # Períodos afetados saem inteiros (inclusive os que ficaram sem nenhum dia) e voltam recalculados
+        cur.execute(
+            f"DELETE FROM public.analise_periodo a USING ({SQL_PERIODOS_AFETADOS}) p "
+            "WHERE a.user_id = %(user_id)s AND a.granularidade = p.granularidade AND a.inicio = p.inicio",
+            params
+        )
+        cur.execute(SQL_RECALCULAR_PERIODOS, params)
+        cur.execute(SQL_SEQUENCIAS_GERAIS, params)
+    return len(params['dias'])
+
+
+def ler_periodos(pool, user_id, granularidade, inicio, fim):
+    """Linhas de public.analise_periodo do usuário cujo período começa entre ``inicio`` e ``fim``, em ordem."""
+    if granularidade not in GRANULARIDADES:
+        raise ValueError(f"Granularidade inválida: {granularidade}")
+    return pool.consultar(
+        "SELECT * FROM public.analise_periodo WHERE user_id = %s AND granularidade = %s AND inicio BETWEEN %s AND %s "
+        "ORDER BY inicio",
+        (int(user_id), granularidade, inicio, fim), cache=True
+    )
+
+
+def ler_diario(pool, user_id, inicio, fim, meta_kcal, meta_proteina):
+    """Totais por dia (do rollup) com a aderência às metas e os itens com glúten."""
+    return pool.consultar(
+        SQL_DIARIO,
+        {'user_id': int(user_id), 'inicio': inicio, 'fim': fim,
+         'meta_kcal': float(meta_kcal), 'meta_proteina': float(meta_proteina)},
+        cache=True
+    )
+
+
+def ler_sequencias(pool, user_id):
+    """``{'maior_sequencia', 'sequencia_recente', 'sequencia_recente_fim'}`` (dias seguidos com as duas metas)."""
+    df = pool.consultar(
+        "SELECT maior_sequencia, sequencia_recente, sequencia_recente_fim FROM public.analise_estado WHERE user_id = %s",
+        (int(user_id),), cache=True
+    )
+    if df.empty:
+        return {'maior_sequencia': 0, 'sequencia_recente': 0, 'sequencia_recente_fim': None}
+    return df.iloc[0].to_dict()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manutenção dos resumos semanais/mensais (public.analise_periodo).")
+    parser.add_argument('comando', choices=['atualizar', 'reconstruir'])
+    banco.argumento_dsn(parser)
+    args = parser.parse_args(argv)
+
+    pool = banco.pool_cli(args)
+    usuarios = pool.consultar("SELECT id, login FROM public.usuario ORDER BY id")
+    for user_id, login in usuarios.itertuples(index=False):
+        dias = atualizar(pool, user_id, forcar=args.comando == 'reconstruir')
+        print(f"{login}: resumos atualizados, {dias} dia(s) processado(s).")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Detecção de mudanças para o modo ao vivo do dashboard.
+
+Uma thread em segundo plano por processo mantém uma conexão dedicada com
+``LISTEN dados_alterados`` (os triggers de versao_dados fazem o NOTIFY). A cada
+notificação ela relê public.versao_dados; os fragments do dashboard comparam
+essas versões em memória e só vão ao banco quando alguma tabela mudou.
+Se o LISTEN não estiver disponível (ex: PgBouncer em modo transação), a thread
+cai para um poll barato de versao_dados.
+"""
+import select
+import threading
+import time
+
+import psycopg2
+
+import repositorio
+
+CANAL = 'dados_alterados'
+
+
+class OuvinteDados:
+    def __init__(self, dsn, pool, intervalo_poll_s=60, intervalo_sem_listen_s=5):
+        self.dsn = dsn
+        self.pool = pool
+        self.intervalo_poll_s = intervalo_poll_s
+        self.intervalo_sem_listen_s = intervalo_sem_listen_s
+        self.escutando = False
+        self.atualizado_em = None
+        self._versoes = {}
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._reler()
+        self._thread = threading.Thread(target=self._executar, name="ouvinte-dados", daemon=True)
+        self._thread.start()
+
+    def versoes(self):
+        """Cópia das versões por tabela conhecidas (sem consultar o banco)."""
+        with self._lock:
+            return dict(self._versoes)
+
+    def parar(self):
+        self._parar.set()
+
+    def _reler(self):
+        try:
+            versoes = repositorio.ler_versoes_dados(self.pool)
+        except Exception:
+            return
+        with self._lock:
+            self._versoes = versoes
+            self.atualizado_em = time.time()
+
+    def _executar(self):
+        espera = 1
+        while not self._parar.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CANAL}")
+                self.escutando = True
+                espera = 1
+                # Pode ter havido escrita enquanto estávamos desconectados
+                self._reler()
+                while not self._parar.is_set():
+                    prontos, _, _ = select.select([conn], [], [], self.intervalo_poll_s)
+                    if prontos:
+                        conn.poll()
+                        if conn.notifies:
+                            conn.notifies.clear()
+                            self._reler()
+                    else:
+                        # Rede de segurança: notificações perdidas também são pegas
+                        self._reler()
+            except Exception:
+                self.escutando = False
+                # Sem LISTEN: poll de versao_dados enquanto tenta reconectar com backoff
+                limite = time.monotonic() + min(espera * 10, 300)
+                while not self._parar.is_set() and time.monotonic() < limite:
+                    self._reler()
+                    self._parar.wait(self.intervalo_sem_listen_s)
+                espera = min(espera * 2, 30)
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
+
+
+# --- UM OUVINTE POR PROCESSO E DSN ---
+_ouvintes = {}
+_ouvintes_lock = threading.Lock()
+
+
+def obter_ouvinte(dsn, pool):
+    with _ouvintes_lock:
+        if dsn not in _ouvintes:
+            _ouvintes[dsn] = OuvinteDados(dsn, pool)
+        return _ouvintes[dsn]
@@ -1,11 +1,23 @@
 import streamlit as st
 import pandas as pd
-import psycopg2
-from psycopg2 import OperationalError
 from datetime import datetime, timedelta
+import io
 import json
+import time
 import pytz 
-from groq import Groq 
+
+import alimentos
+import analises
+import banco
+import exportacao
+import fila_offline
+import ia
+import metricas
+import migracoes
+import projecao
+import repositorio
+import taco
+import usuarios
 
 # 1. CONFIGURAÇÃO DA PÁGINA
 st.set_page_config(page_title="Leo Tracker Pro", page_icon="🦁", layout="wide")
@@ -46,211 +58,282 @@ PLANO_ALIMENTAR = {
 
 # --- SISTEMA DE LOGIN ---
 def check_password():
-    if "password_correct" not in st.session_state:
-        st.session_state["password_correct"] = False
-    if st.session_state["password_correct"]: return True
+    """Login por usuário e senha; o usuário logado (com as metas) fica na sessão."""
+    if st.session_state.get("usuario"): return True
     
     st.title("🦁 Leo Tracker Pro")
+    login = st.text_input("Usuário:")
     password = st.text_input("Senha de Acesso:", type="password")
     if st.button("Entrar"):
-        if password == st.secrets.get("PASSWORD", "admin"): 
-            st.session_state["password_correct"] = True
+        try:
+            # Quem ainda não tem senha própria (o usuário do histórico antigo) entra com o PASSWORD do secrets
+            usuario = usuarios.autenticar(get_pool(), login, password, st.secrets.get("PASSWORD", "admin"))
+        except Exception as e:
+            st.error(f"Erro no Banco de Dados: {e}")
+            return False
+        if usuario:
+            st.session_state["usuario"] = usuario
             st.rerun()
-        else: st.error("Senha incorreta!")
+        else: st.error("Usuário ou senha incorretos!")
     return False
 
-if not check_password(): st.stop()
+# 2. CONEXÃO AO BANCO NEON (pool compartilhado, fuso fixado por conexão)
+def get_pool():
+    return banco.obter_pool(st.secrets["DATABASE_URL"])
 
-# 2. CONEXÃO AO BANCO NEON
-@st.cache_resource(ttl=600)
-def get_connection_raw():
-    return psycopg2.connect(st.secrets["DATABASE_URL"])
+def get_fila():
+    """Fila local das escritas (uma por processo), já com a drenagem para o banco em segundo plano."""
+    fila = fila_offline.obter_fila()
+    fila.iniciar_drenagem(get_pool)
+    return fila
 
 def executar_sql(sql, params=None, is_select=False):
-    conn = None
-    try:
-        conn = get_connection_raw()
-        if conn.closed != 0:
-            st.cache_resource.clear()
-            conn = get_connection_raw()
-            
-        with conn.cursor() as cur:
-            cur.execute("SET timezone TO 'America/Sao_Paulo';")
-            
+    idas_antes = banco.idas_ao_banco()
+    with metricas.obter_registro().medir('sql', sql) as m:
+        try:
+            pool = get_pool()
             if is_select:
-                df = pd.read_sql(sql, conn, params=params)
+                # Leituras memoizadas no processo; qualquer escrita pelo pool invalida
+                df = pool.consultar(sql, params, cache=True)
                 if 'data' in df.columns:
                     df['data'] = pd.to_datetime(df['data'])
+                m['linhas'] = len(df)
                 return df
-            else:
-                cur.execute(sql, params)
-                conn.commit()
-                return True
+            m['linhas'] = pool.executar(sql, params)
+            return True
+        except Exception as e:
+            m['erros'] = 1
+            st.error(f"Erro no Banco de Dados: {e}")
+            return pd.DataFrame() if is_select else False
+        finally:
+            m['idas'] = banco.idas_ao_banco() - idas_antes
+
+def importar_itens(itens, parcial=False):
+    """Valida e grava a lista de alimentos num único INSERT (na fila local se o banco estiver fora do ar). Retorna (gravados, erros)."""
+    try:
+        return repositorio.importar_consumo(get_pool, USER_ID, itens, get_now_br().date(), parcial=parcial, fila=get_fila())
     except Exception as e:
-        if conn: conn.rollback()
-        st.error(f"Erro no Banco de Dados: {e}")
-        return pd.DataFrame() if is_select else False
-
-# 3. CONSTANTES E METAS
-META_KCAL = 1650 
-META_PROTEINA = 110 
-META_PESO = 120.0
-PERDA_SEMANAL_KG = 0.8
-
-# 4. INICIALIZAÇÃO DAS TABELAS
-def inicializar_banco():
-    queries = [
-        "CREATE TABLE IF NOT EXISTS public.consumo (id SERIAL PRIMARY KEY, data DATE, alimento TEXT, quantidade REAL, kcal REAL, proteina REAL, carbo REAL, gordura REAL, gluten TEXT DEFAULT 'Não informado');",
-        "CREATE TABLE IF NOT EXISTS public.peso (id SERIAL PRIMARY KEY, data DATE, peso_kg REAL);",
-        "CREATE TABLE IF NOT EXISTS public.tabela_taco (id SERIAL PRIMARY KEY, alimento TEXT, kcal REAL, proteina REAL, carbo REAL, gordura REAL);"
-    ]
-    for q in queries: executar_sql(q)
+        st.error(f"Erro ao gravar: {e}")
+        return 0, []
+
+def obter_indice_taco():
+    """Índice TACO em memória (carregado uma vez por processo); None se a tabela não puder ser lida."""
+    try:
+        return taco.obter_indice(get_pool())
+    except Exception:
+        return None
 
-inicializar_banco()
+def mostrar_erros_validacao(erros):
+    if erros:
+        st.warning(f"⚠️ {len(erros)} item(ns) inválido(s):")
+        st.dataframe(pd.DataFrame(erros), hide_index=True)
 
-# --- FUNÇÃO NOVA: TEXTO -> GROQ (JSON + ANÁLISE) ---
-def processar_texto_ia(texto_usuario, api_key):
-    """Envia texto para Groq e retorna JSON com 'analise' e 'alimentos'."""
-    client = Groq(api_key=api_key)
+# Clicar de novo logo depois de salvar (ou um clique duplo) gravaria tudo outra vez: o cache da IA
+# devolve o mesmo resultado. Passada a janela, o mesmo texto volta a valer (ex: o café da manhã e o da tarde)
+JANELA_REPETICAO_S = 10
+
+def marcar_salvo(chave, texto):
+    st.session_state[chave] = (texto.strip(), time.monotonic())
+
+def acabou_de_salvar(chave, texto, rotulo):
+    """True se ``texto`` foi salvo há menos de JANELA_REPETICAO_S; mostra o aviso e o botão "Registrar de novo"."""
+    salvo = st.session_state.get(chave)
+    if not (texto.strip() and salvo and salvo[0] == texto.strip() and time.monotonic() - salvo[1] < JANELA_REPETICAO_S):
+        return False
+    col_aviso, col_botao = st.columns([3, 1])
+    col_aviso.caption(f"✅ {rotulo} acabou de ser registrado.")
+    if col_botao.button("🔁 Registrar de novo", key=f"repetir_{chave}"):
+        del st.session_state[chave]
+        st.rerun()
+    return True
+
+def mostrar_item(item):
+    col_ico, col_txt = st.columns([0.5, 4])
+    col_ico.info("🍽️")
+    col_txt.write(f"**{item.get('alimento', '?')}** ({item.get('quantidade_g', '?')}g) | 🔥 {item.get('kcal', '?')} kcal | 🥩 {item.get('p', '?')}g prot")
+
+def mostrar_ultimo_registro():
+    """Exibe o feedback da IA e os itens salvos guardados na sessão, até o usuário dispensar."""
+    registro = st.session_state.get("ultimo_registro")
+    if not registro:
+        return
     
-    prompt_system = f"""
-    Aja como um nutricionista focado em:
-    1. Dieta Sem Glúten (Restrição severa).
-    2. Controle de Ansiedade (Alimentos anti-inflamatórios).
-    3. Hipertrofia (Meta proteica).
+    # 1. Exibe a Análise da Nutri IA
+    analise = registro["analise"]
+    # Define cor da caixa baseada no texto (simples heurística)
+    if "cuidado" in analise.lower() or "evit" in analise.lower() or "glúten" in analise.lower():
+        st.warning(f"👩‍⚕️ **Feedback da IA:**\n\n{analise}")
+    else:
+        st.success(f"👩‍⚕️ **Feedback da IA:**\n\n{analise}")
     
-    Hoje é: {get_now_br().strftime('%Y-%m-%d')}.
+    # 2. Exibe os Itens Técnicos
+    st.markdown("---")
+    st.write("**Itens identificados:**")
+    for item in registro["alimentos"]:
+        mostrar_item(item)
     
-    Sua tarefa:
-    1. Analisar o texto do usuário.
-    2. Gerar uma breve "analise" (máx 3 frases): Destaque pontos positivos ou negativos (ex: alertar sobre glúten ou excesso de gordura/açúcar, elogiar proteína).
-    3. Gerar a lista técnica "alimentos" com macros estimados.
+    mostrar_erros_validacao(registro["erros"])
+    if registro["salvos"] > 0:
+        st.success(f"✅ {registro['salvos']} item(ns) salvo(s)!")
     
-    SAÍDA OBRIGATÓRIA: Um JSON com duas chaves ("analise" e "alimentos").
-    Exemplo:
-    {{
-        "analise": "Cuidado! O pastel é frito e a massa tem glúten, o que pode aumentar a inflamação. Tente evitar.",
-        "alimentos": [
-            {{
-                "data": "AAAA-MM-DD",
-                "alimento": "Pastel de Carne Frito",
-                "quantidade_g": 100,
-                "kcal": 350,
-                "p": 10,
-                "c": 35,
-                "g": 20,
-                "gluten": "Contém"
-            }}
-        ]
-    }}
-    """
+    if st.button("✖️ Dispensar feedback"):
+        del st.session_state["ultimo_registro"]
+        st.rerun()
 
-    try:
-        completion = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": prompt_system},
-                {"role": "user", "content": texto_usuario}
-            ],
-            model="llama-3.3-70b-versatile", 
-            temperature=0.3, # Um pouco de criatividade para a análise
-            response_format={"type": "json_object"}
-        )
-        
-        resposta_json = completion.choices[0].message.content
-        dados = json.loads(resposta_json)
-        
-        # Garante estrutura
-        if "alimentos" not in dados:
-             # Fallback caso a IA esqueça a estrutura (raro)
-             return False, "Erro na estrutura do JSON da IA."
-            
-        return True, dados
-    except Exception as e:
-        return False, f"Erro na IA: {e}"
+# 3. ESQUEMA DO BANCO (migrações versionadas: só a primeira execução do processo vai ao banco)
+try:
+    migracoes.garantir_esquema(get_pool())
+    # Linhas de consumo ainda sem alimento_id (histórico, importações): uma vez por processo
+    alimentos.garantir_vinculos(get_pool())
+except Exception as e:
+    st.error(f"Erro ao migrar o banco de dados: {e}")
+
+if not check_password(): st.stop()
+
+# 4. USUÁRIO E METAS (de public.usuario; toda consulta abaixo filtra por USER_ID)
+USUARIO = st.session_state["usuario"]
+USER_ID = USUARIO['id']
+META_KCAL = USUARIO['meta_kcal']
+META_PROTEINA = USUARIO['meta_proteina']
+META_PESO = USUARIO['meta_peso']
+PERDA_SEMANAL_KG = USUARIO['perda_semanal_kg']
 
 # 5. INTERFACE DO APP
 st.title("🦁 Leo Tracker Pro")
-st.markdown(f"**Data Atual (BR):** {get_now_br().strftime('%d/%m/%Y %H:%M')}")
+st.markdown(f"**Data Atual (BR):** {get_now_br().strftime('%d/%m/%Y %H:%M')} | 👤 {USUARIO['nome']}")
+# Registros ainda na fila local (banco suspenso ou fora do ar): aparecem no resumo assim que forem enviados
+pendentes = get_fila().pendentes()
+if pendentes['consumo'] + pendentes['peso']:
+    erro_fila = get_fila().ultimo_erro
+    st.caption(f"⏳ {pendentes['consumo'] + pendentes['peso']} registro(s) aguardando envio ao banco" + (f" — {erro_fila}" if erro_fila else ""))
 
-# Abas
-tab_groq, tab_json, tab_plano, tab_hist, tab_peso, tab_admin = st.tabs(["🍽️ IA Rápida", "🤖 JSON (Gemini)", "📝 Plano", "📊 Gráficos & Metas", "⚖️ Peso (120kg)", "⚙️ Admin"])
+# Navegação: só a seção ativa roda (st.tabs executaria as consultas de todas as abas a cada rerun)
+SECOES = ["🍽️ IA Rápida", "🤖 JSON (Gemini)", "📝 Plano", "📊 Gráficos & Metas", f"⚖️ Peso ({META_PESO:g}kg)", "⚙️ Admin"]
+secao = st.radio("Seção", SECOES, horizontal=True, key="secao", label_visibility="collapsed")
+st.divider()
+inicio_secao, idas_secao = time.perf_counter(), banco.idas_ao_banco()
 
 # --- ABA 1: IA RÁPIDA (GROQ) ---
-with tab_groq:
+if secao == SECOES[0]:
     st.subheader("Resumo do Dia")
     data_hoje = get_now_br().date()
-    df_hoje = executar_sql("SELECT * FROM public.consumo WHERE data = %s", (data_hoje,), is_select=True)
+    df_hoje = executar_sql("SELECT kcal, proteina FROM public.consumo_diario WHERE user_id = %s AND data = %s", (USER_ID, data_hoje), is_select=True)
     
     kcal_hoje = float(df_hoje['kcal'].sum()) if not df_hoje.empty else 0.0
     prot_hoje = float(df_hoje['proteina'].sum()) if not df_hoje.empty else 0.0
     
     c1, c2, c3 = st.columns(3)
-    c1.metric("Kcal", f"{int(kcal_hoje)}", f"Meta: {META_KCAL}")
-    c2.metric("Proteína", f"{int(prot_hoje)}g", f"Meta: {META_PROTEINA}g")
+    c1.metric("Kcal", f"{int(kcal_hoje)}", f"Meta: {META_KCAL:g}")
+    c2.metric("Proteína", f"{int(prot_hoje)}g", f"Meta: {META_PROTEINA:g}g")
     c3.progress(min(kcal_hoje/META_KCAL, 1.0))
     
     st.divider()
     
     st.write("#### 💬 O que você comeu?")
-    st.caption("A IA vai analisar seus macros e te dar um feedback sobre a dieta.")
+    st.caption("A IA vai analisar seus macros e te dar um feedback sobre a dieta. Itens com quantidade (ex: \"200g arroz integral cozido + 2 ovos\") são calculados direto pela tabela TACO.")
     
     texto_input = st.text_area("Descreva aqui:", height=100)
+    ja_salvo = acabou_de_salvar("texto_ia_salvo", texto_input, "Este texto")
     
-    if st.button("🚀 Processar"):
+    if st.button("🚀 Processar", disabled=ja_salvo):
         api_key = st.secrets.get("GROQ_API_KEY")
-        if not api_key:
-            st.error("⚠️ Configure a GROQ_API_KEY nos secrets!")
-        elif not texto_input:
+        if not texto_input:
             st.warning("Digite algo primeiro.")
         else:
+            # A análise e os itens aparecem conforme a resposta da IA chega (streaming)
+            espaco_analise, espaco_itens = st.empty(), st.empty()
+            def ao_receber(analise, itens):
+                if analise:
+                    espaco_analise.info(f"👩‍⚕️ **Feedback da IA:**\n\n{analise}▌")
+                with espaco_itens.container():
+                    for item in itens:
+                        if isinstance(item, dict):
+                            mostrar_item(item)
             with st.spinner("Analisando nutricionalmente..."):
-                sucesso, resultado = processar_texto_ia(texto_input, api_key)
+                # Alimentos conhecidos da TACO saem na hora; só o resto vai para a Groq
+                sucesso, resultado = ia.processar_refeicao(texto_input, api_key, obter_indice_taco(), get_now_br().date(), ao_receber=ao_receber)
+            
+            if sucesso:
+                lista_alimentos = resultado.get('alimentos', [])
+                # Salva tudo num único INSERT (itens inválidos são ignorados e listados)
+                count, erros = importar_itens(lista_alimentos, parcial=True)
                 
-                if sucesso:
-                    # 1. Exibe a Análise da Nutri IA
-                    analise = resultado.get('analise', 'Sem análise.')
-                    
-                    # Define cor da caixa baseada no texto (simples heurística)
-                    if "cuidado" in analise.lower() or "evit" in analise.lower() or "glúten" in analise.lower():
-                        st.warning(f"👩‍⚕️ **Feedback da IA:**\n\n{analise}")
+                # Guarda o feedback na sessão: ele sobrevive ao rerun até ser dispensado
+                st.session_state["ultimo_registro"] = {
+                    "analise": resultado.get('analise', 'Sem análise.'),
+                    "alimentos": lista_alimentos,
+                    "erros": erros,
+                    "salvos": count,
+                }
+                if count > 0:
+                    marcar_salvo("texto_ia_salvo", texto_input)
+                    # Rerun imediato: o resumo do dia acima já reflete os itens salvos (se foram para a fila, o aviso de pendentes aparece)
+                    st.rerun()
+            else:
+                st.error(f"Erro: {resultado}")
+    
+    mostrar_ultimo_registro()
+
+    # Lote: cada refeição vai para a IA em paralelo; o tempo total é o da chamada mais lenta
+    with st.expander("📚 Vários dias/refeições de uma vez"):
+        st.caption("Uma refeição por linha. Uma linha com a data (ex: \"12/10\" ou \"12/10: almoço ...\") vale para as linhas seguintes.")
+        texto_lote = st.text_area("Refeições:", height=150, key="texto_lote", placeholder="12/10\ncafé: 2 ovos e 1 banana\nalmoço: 200g arroz integral cozido + 150g frango grelhado\n13/10\n...")
+        lote_ja_salvo = acabou_de_salvar("texto_lote_salvo", texto_lote, "Este lote")
+        if st.button("🚀 Processar lote", disabled=lote_ja_salvo):
+            refeicoes = ia.separar_refeicoes(texto_lote, get_now_br().date())
+            if not refeicoes:
+                st.warning("Digite algo primeiro.")
+            else:
+                # Um espaço por refeição, preenchido conforme cada resposta chega
+                espacos = [st.empty() for _ in refeicoes]
+                for espaco, (data, texto) in zip(espacos, refeicoes):
+                    espaco.info(f"⏳ {data.strftime('%d/%m') + ' · ' if data else ''}{texto}")
+                todos, falhas = [], 0
+                lote = ia.processar_lote(refeicoes, st.secrets.get("GROQ_API_KEY"), obter_indice_taco(), hoje=get_now_br().date())
+                for i, sucesso, resultado in lote:
+                    data, texto = refeicoes[i]
+                    rotulo = f"{data.strftime('%d/%m') + ' · ' if data else ''}{texto}"
+                    if sucesso:
+                        itens = resultado.get('alimentos', [])
+                        todos.extend(itens)
+                        kcal = sum(float(item.get('kcal') or 0) for item in itens if isinstance(item, dict))
+                        espacos[i].success(f"✅ {rotulo} — {len(itens)} item(ns), {int(kcal)} kcal")
                     else:
-                        st.success(f"👩‍⚕️ **Feedback da IA:**\n\n{analise}")
-                    
-                    # 2. Exibe os Itens Técnicos
-                    st.markdown("---")
-                    st.write("**Itens identificados:**")
-                    
-                    count = 0
-                    lista_alimentos = resultado.get('alimentos', [])
-                    
-                    for item in lista_alimentos:
-                        col_ico, col_txt = st.columns([0.5, 4])
-                        col_ico.info("🍽️")
-                        col_txt.write(f"**{item['alimento']}** ({item['quantidade_g']}g) | 🔥 {item['kcal']} kcal | 🥩 {item['p']}g prot")
-                        
-                        # Salva no banco
-                        executar_sql(
-                            """INSERT INTO public.consumo (data, alimento, quantidade, kcal, proteina, carbo, gordura, gluten) 
-                               VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""", 
-                            (
-                                item.get('data'), item.get('alimento'), float(item.get('quantidade_g', 1)), 
-                                float(item.get('kcal', 0)), float(item.get('p', 0)), 
-                                float(item.get('c', 0)), float(item.get('g', 0)), item.get('gluten', 'NI')
-                            )
-                        )
-                        count += 1
-                    
-                    if count > 0:
-                        st.success("✅ Dados salvos no banco!")
-                        import time
-                        # AUMENTADO PARA 15 SEGUNDOS PARA DAR TEMPO DE LER
-                        time.sleep(15) 
+                        falhas += 1
+                        espacos[i].error(f"❌ {rotulo} — {resultado}")
+                # Tudo num único INSERT no final: ou o lote inteiro válido entra, ou nada (banco fora do ar: tudo para a fila local)
+                count, erros = importar_itens(todos, parcial=True)
+                mostrar_erros_validacao(erros)
+                if count:
+                    marcar_salvo("texto_lote_salvo", texto_lote)
+                    st.success(f"✅ {count} item(ns) de {len(refeicoes) - falhas} refeição(ões) salvo(s)!")
+                if falhas:
+                    st.warning(f"{falhas} refeição(ões) com erro não foram salvas; ajuste e processe de novo só essas linhas.")
+
+    # Autocomplete sobre o índice TACO em memória (sem consulta ao banco por busca)
+    with st.expander("🔎 Adicionar alimento da tabela TACO"):
+        indice_taco = obter_indice_taco()
+        busca = st.text_input("Buscar alimento:", placeholder="ex: aroz integrl, feijao, pao de qeijo")
+        if not indice_taco:
+            st.info("Tabela TACO vazia. Rode o carga_taco_csv.py primeiro.")
+        elif busca:
+            opcoes = {a['id']: a for a in indice_taco.buscar(busca, limite=15)}
+            if not opcoes:
+                st.caption("Nenhum alimento encontrado.")
+            else:
+                id_escolhido = st.selectbox("Resultados:", list(opcoes), format_func=lambda i: f"{opcoes[i]['alimento']} ({int(opcoes[i]['kcal'])} kcal/100g)")
+                gramas = st.number_input("Quantidade (g):", 1.0, 2000.0, 100.0, step=10.0)
+                item = indice_taco.montar_item(opcoes[id_escolhido], gramas, get_now_br().date())
+                st.caption(f"🔥 {item['kcal']} kcal | 🥩 {item['p']}g prot | 🍞 {item['c']}g carbo | 🥑 {item['g']}g gord | Glúten: {item['gluten']}")
+                if st.button("➕ Adicionar"):
+                    count, erros = importar_itens([item])
+                    mostrar_erros_validacao(erros)
+                    if count:
+                        st.toast(f"✅ {item['alimento']} adicionado!")
                         st.rerun()
-                else:
-                    st.error(f"Erro: {resultado}")
 
 # --- ABA 2: IMPORTAR JSON (MANUAL/GEMINI) ---
-with tab_json:
+if secao == SECOES[1]:
     st.header("🤖 Importação via JSON (Gemini)")
     st.markdown("**Copie este prompt para o Gemini (com foto):**")
     prompt_json = """
@@ -280,21 +363,18 @@ with tab_json:
                 lista = json.loads(limpo)
                 if isinstance(lista, dict): lista = [lista]
                 
-                count = 0
-                for item in lista:
-                    dt_final = item.get('data') if item.get('data') else get_now_br().date()
-                    executar_sql(
-                        """INSERT INTO public.consumo (data, alimento, quantidade, kcal, proteina, carbo, gordura, gluten) 
-                           VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""", 
-                        (dt_final, item.get('alimento', '?'), float(item.get('quantidade_g', 1)), float(item.get('kcal', 0)), float(item.get('p', 0)), float(item.get('c', 0)), float(item.get('g', 0)), item.get('gluten', 'NI'))
-                    )
-                    count += 1
-                st.success(f"{count} itens importados!")
-                st.rerun()
+                # Tudo ou nada: um item inválido cancela a importação
+                count, erros = importar_itens(lista)
+                if erros:
+                    mostrar_erros_validacao(erros)
+                    st.error("Nada foi importado. Corrija os itens acima e tente novamente.")
+                elif count:
+                    st.success(f"{count} itens importados!")
+                    st.rerun()
             except Exception as e: st.error(f"Erro: {e}")
 
 # --- ABA 3: PLANO ALIMENTAR ---
-with tab_plano:
+if secao == SECOES[2]:
     st.header("📋 Plano: Nutri vs. Econômico")
     for ref, dados in PLANO_ALIMENTAR.items():
         with st.expander(ref, expanded=True):
@@ -304,14 +384,14 @@ with tab_plano:
             st.caption(f"💡 {dados['Dica']}")
 
 # --- ABA 4: HISTÓRICO E GRÁFICOS ---
-with tab_hist:
+if secao == SECOES[3]:
     st.subheader("📊 Performance Diária")
     dt_inicio = (get_now_br() - timedelta(days=14)).date() 
     sql_chart = """
-        SELECT data, SUM(kcal) as kcal, SUM(proteina) as proteina 
-        FROM public.consumo WHERE data >= %s GROUP BY data ORDER BY data ASC
+        SELECT data, kcal, proteina 
+        FROM public.consumo_diario WHERE user_id = %s AND data >= %s ORDER BY data ASC
     """
-    df_chart = executar_sql(sql_chart, (dt_inicio,), is_select=True)
+    df_chart = executar_sql(sql_chart, (USER_ID, dt_inicio), is_select=True)
     
     if not df_chart.empty:
         df_chart = df_chart.sort_values(by='data')
@@ -327,58 +407,330 @@ with tab_hist:
             st.markdown("#### 🥩 Proteínas")
             st.line_chart(df_chart[['proteina', 'Meta Proteína']], color=["#3366CC", "#00FF00"])
     
+    st.divider()
+    st.subheader("📅 Aderência por Período")
+    c_gran, c_desde = st.columns([1, 2])
+    granularidade = c_gran.radio("Agrupar por:", ["Dia", "Semana", "Mês"], index=1, horizontal=True)
+    desde = c_desde.date_input("Desde:", value=(get_now_br() - timedelta(days=365)).date(), format="DD/MM/YYYY")
+    try:
+        # Recalcula só as semanas/meses com dias alterados; sem alterações é uma consulta só
+        analises.atualizar(get_pool(), USER_ID)
+        if granularidade == "Dia":
+            df_per = analises.ler_diario(get_pool(), USER_ID, desde, get_now_br().date(), META_KCAL, META_PROTEINA)
+            dias_reg = len(df_per)
+            dias_kcal, dias_prot = int(df_per['meta_kcal'].sum()), int(df_per['meta_proteina'].sum())
+            dias_gluten = int((df_per['itens_com_gluten'] > 0).sum())
+            df_per = df_per.set_index('data')
+        else:
+            df_per = analises.ler_periodos(get_pool(), USER_ID, 'semana' if granularidade == "Semana" else 'mes', desde, get_now_br().date())
+            dias_reg = int(df_per['dias_registrados'].sum())
+            dias_kcal, dias_prot = int(df_per['dias_meta_kcal'].sum()), int(df_per['dias_meta_proteina'].sum())
+            dias_gluten = int(df_per['dias_com_gluten'].sum())
+            df_per = df_per.set_index('inicio')
+        sequencias = analises.ler_sequencias(get_pool(), USER_ID)
+    except Exception as e:
+        st.error(f"Erro no Banco de Dados: {e}")
+        df_per = pd.DataFrame()
+
+    if df_per.empty:
+        st.info("Nenhum dia registrado no período.")
+    else:
+        # A sequência só está "em andamento" se chegou até ontem (hoje ainda pode ser completado)
+        fim_seq = sequencias['sequencia_recente_fim']
+        seq_atual = sequencias['sequencia_recente'] if fim_seq and fim_seq >= get_now_br().date() - timedelta(days=1) else 0
+        k1, k2, k3, k4, k5 = st.columns(5)
+        k1.metric("Dias registrados", dias_reg)
+        k2.metric("Na meta de kcal", f"{dias_kcal / dias_reg:.0%}")
+        k3.metric("Na meta de proteína", f"{dias_prot / dias_reg:.0%}")
+        k4.metric("Dias com glúten", f"{dias_gluten / dias_reg:.0%}")
+        k5.metric("Sequência (recorde)", f"{seq_atual} ({sequencias['maior_sequencia']})")
+        st.caption(f"Meta de kcal: até {META_KCAL:g} kcal/dia. Meta de proteína: {META_PROTEINA:g} g/dia ou mais. Sequência: dias seguidos com as duas metas.")
+        if granularidade == "Dia":
+            df_g = df_per[['kcal', 'proteina']]
+        else:
+            df_g = df_per[['kcal_media', 'proteina_media']].rename(columns={'kcal_media': 'kcal', 'proteina_media': 'proteina'})
+        c_graf1, c_graf2 = st.columns(2)
+        with c_graf1:
+            st.markdown(f"#### 🔥 Calorias ({'total do dia' if granularidade == 'Dia' else 'média diária'})")
+            st.bar_chart(df_g['kcal'], color="#FF4B4B")
+        with c_graf2:
+            st.markdown(f"#### 🥩 Proteínas ({'total do dia' if granularidade == 'Dia' else 'média diária'})")
+            st.bar_chart(df_g['proteina'], color="#3366CC")
+        with st.expander("Ver tabela"):
+            st.dataframe(df_per.drop(columns=['granularidade', 'atualizado_em'], errors='ignore'))
+        st.markdown("#### 🏆 Alimentos mais frequentes")
+        try:
+            df_top = repositorio.top_alimentos(get_pool(), USER_ID, desde, get_now_br().date())
+            st.dataframe(df_top, hide_index=True, column_config={
+                "alimento": "Alimento", "vezes": "Vezes",
+                "quantidade_g": st.column_config.NumberColumn("Total (g)", format="%.0f"),
+                "kcal": st.column_config.NumberColumn("Kcal", format="%.0f"),
+                "proteina": st.column_config.NumberColumn("Prot (g)", format="%.0f"),
+                "dias_com_gluten": "Dias c/ glúten",
+            })
+        except Exception as e:
+            st.error(f"Erro no Banco de Dados: {e}")
+
     st.divider()
     st.subheader("📜 Diário de Consumo")
-    df_detalhe = executar_sql("SELECT * FROM public.consumo WHERE data >= %s ORDER BY data DESC, id DESC", (dt_inicio,), is_select=True)
+    c_periodo, c_tam = st.columns([3, 1])
+    periodo = c_periodo.date_input("Período:", value=(dt_inicio, get_now_br().date()), format="DD/MM/YYYY")
+    tamanho_pag = c_tam.selectbox("Itens por página:", [25, 50, 100], index=1)
+    # Enquanto o usuário escolhe o intervalo, o date_input devolve só a data inicial
+    p_ini, p_fim = (periodo[0], periodo[-1]) if isinstance(periodo, (tuple, list)) and periodo else (dt_inicio, get_now_br().date())
     
-    if not df_detalhe.empty:
-        for i, row in df_detalhe.iterrows():
-            col_dt, col_nm, col_kc, col_del = st.columns([1.5, 3, 1.5, 1])
-            data_vis = pd.to_datetime(row['data']).strftime('%d/%m/%Y')
-            col_dt.write(f"**{data_vis}**")
-            col_nm.write(f"{row['alimento']}")
-            col_kc.write(f"{int(row['kcal'])} kcal")
-            if col_del.button("❌", key=f"del_{row['id']}"):
-                executar_sql("DELETE FROM public.consumo WHERE id = %s", (row['id'],))
-                st.rerun()
+    # Pilha de cursores (data, id): a página N começa depois do cursor N-1
+    filtros = (p_ini, p_fim, tamanho_pag)
+    if st.session_state.get("diario_filtros") != filtros:
+        st.session_state["diario_filtros"] = filtros
+        st.session_state["diario_cursores"] = [None]
+    cursores = st.session_state["diario_cursores"]
+    
+    try:
+        df_detalhe, proximo = repositorio.listar_consumo_pagina(get_pool(), USER_ID, p_ini, p_fim, tamanho_pag, cursores[-1])
+        total_itens = repositorio.contar_consumo(get_pool(), USER_ID, p_ini, p_fim)
+    except Exception as e:
+        st.error(f"Erro no Banco de Dados: {e}")
+        df_detalhe, proximo, total_itens = pd.DataFrame(), None, 0
+    
+    if df_detalhe.empty:
+        st.info("Nada registrado no período.")
+    else:
+        total_pags = max(1, -(-total_itens // tamanho_pag))
+        st.caption(f"{total_itens} itens | Página {len(cursores)} de {total_pags}")
+        
+        # Uma única tabela com seleção de linhas no lugar de botões por item
+        evento = st.dataframe(
+            df_detalhe,
+            key="diario_tabela",
+            on_select="rerun",
+            selection_mode="multi-row",
+            hide_index=True,
+            column_config={
+                "id": None,
+                "data": st.column_config.DateColumn("Data", format="DD/MM/YYYY"),
+                "alimento": "Alimento",
+                "quantidade": st.column_config.NumberColumn("Qtd (g)", format="%.0f"),
+                "kcal": st.column_config.NumberColumn("Kcal", format="%.0f"),
+                "proteina": st.column_config.NumberColumn("Prot (g)", format="%.1f"),
+                "carbo": st.column_config.NumberColumn("Carbo (g)", format="%.1f"),
+                "gordura": st.column_config.NumberColumn("Gord (g)", format="%.1f"),
+                "gluten": "Glúten (texto)",
+                "contem_gluten": st.column_config.CheckboxColumn("⚠️ Glúten", help="Classificado pelo banco; vazio = não informado."),
+            },
+        )
+        ids_sel = df_detalhe.iloc[evento.selection.rows]['id'].tolist()
+        
+        # Edição em lote dentro de um form: mexer nos campos não dispara rerun
+        if ids_sel:
+            with st.form("diario_edicao_lote"):
+                st.write(f"**✏️ Editar {len(ids_sel)} item(ns) selecionado(s)**")
+                c_mover, c_data, c_escala = st.columns([1, 1.5, 1.5])
+                mover = c_mover.checkbox("Mudar data")
+                nova_data = c_data.date_input("Nova data:", value=get_now_br().date(), format="DD/MM/YYYY")
+                escala_pct = c_escala.number_input("Quantidade (% da atual):", 1, 1000, 100, step=5, help="Kcal e macros são recalculados na mesma proporção.")
+                if st.form_submit_button("✅ Aplicar"):
+                    try:
+                        n = repositorio.editar_consumo_lote(get_pool(), USER_ID, ids_sel, nova_data if mover else None, escala_pct / 100)
+                        st.toast(f"✏️ {n} item(ns) atualizado(s).")
+                    except Exception as e:
+                        st.error(f"Erro no Banco de Dados: {e}")
+                    st.rerun()
+        
+        c_ant, c_prox, c_del = st.columns([1, 1, 2])
+        if c_ant.button("⬅️ Anterior", disabled=len(cursores) == 1):
+            cursores.pop()
+            st.rerun()
+        if c_prox.button("Próxima ➡️", disabled=proximo is None):
+            cursores.append(proximo)
+            st.rerun()
+        if c_del.button(f"🗑️ Excluir selecionados ({len(ids_sel)})", disabled=not ids_sel):
+            try:
+                n = repositorio.excluir_consumo(get_pool(), USER_ID, ids_sel)
+                st.toast(f"🗑️ {n} item(ns) excluído(s).")
+            except Exception as e:
+                st.error(f"Erro no Banco de Dados: {e}")
+            st.rerun()
 
 # --- ABA 5: PESO ---
-with tab_peso:
-    st.subheader(f"⚖️ Rumo aos {int(META_PESO)}kg")
+if secao == SECOES[4]:
+    st.subheader(f"⚖️ Rumo aos {META_PESO:g}kg")
     c_input, c_meta = st.columns([2, 1])
     p_val = c_input.number_input("Registrar Peso Atual (kg):", 40.0, 200.0, step=0.1)
     
     if c_input.button("Gravar Peso"):
-        executar_sql("INSERT INTO public.peso (data, peso_kg) VALUES (%s, %s)", (get_now_br().date(), float(p_val)))
+        try:
+            get_fila().gravar(get_pool, 'peso', [(get_now_br().date(), float(p_val), USER_ID)])
+        except Exception as e:
+            st.error(f"Erro ao gravar: {e}")
+            st.stop()
         st.success("Peso registrado!")
         st.rerun()
 
-    df_p = executar_sql("SELECT * FROM public.peso ORDER BY data ASC", is_select=True)
+    df_p = executar_sql("SELECT * FROM public.peso WHERE user_id = %s ORDER BY data ASC", (USER_ID,), is_select=True)
     if not df_p.empty and len(df_p) > 0:
-        df_p['data'] = pd.to_datetime(df_p['data'])
-        df_p = df_p.sort_values('data')
-        
-        d_ini = df_p['data'].iloc[0]; p_ini = df_p['peso_kg'].iloc[0]
-        u_dia = df_p['data'].iloc[-1]
-        dias_tot = (u_dia - d_ini).days + 30
-        
-        lst_data = [d_ini + timedelta(days=x) for x in range(dias_tot)]
-        lst_peso = [max(META_PESO, p_ini - (x * (PERDA_SEMANAL_KG/7))) for x in range(dias_tot)]
-        
-        df_meta = pd.DataFrame({'data': lst_data, 'Plano Saudável': lst_peso}).set_index('data')
-        df_p.set_index('data', inplace=True)
-        st.line_chart(df_p[['peso_kg']].join(df_meta, how='outer'), color=["#0000FF", "#AAAAAA"])
+        # Plano, tendência e previsão vetorizados; o gráfico fica com no máximo ~400 pontos
+        df_grafico, resumo = projecao.projetar(df_p, META_PESO, PERDA_SEMANAL_KG)
+        df_grafico = df_grafico.rename(columns={'tendencia': 'Tendência', 'plano': 'Plano Saudável'})
+        st.line_chart(df_grafico[['peso_kg', 'Tendência', 'Plano Saudável']], color=["#0000FF", "#00AAFF", "#AAAAAA"])
+        st.caption(projecao.texto_previsao(resumo, META_PESO))
     else:
         st.info("Registre seu peso hoje para ver o gráfico.")
 
 # --- ABA 6: ADMIN ---
-with tab_admin:
+if secao == SECOES[5]:
+    st.write("### 👥 Usuário e metas")
+    with st.form("metas_usuario"):
+        st.write(f"**{USUARIO['nome']}** ({USUARIO['login']})")
+        c1, c2, c3 = st.columns(3)
+        novas_metas = {
+            'meta_kcal': c1.number_input("Meta de kcal/dia:", 500.0, 6000.0, META_KCAL, step=50.0),
+            'meta_proteina': c2.number_input("Meta de proteína (g/dia):", 10.0, 400.0, META_PROTEINA, step=5.0),
+            'meta_carbo': c3.number_input("Meta de carbo (g/dia):", 0.0, 800.0, USUARIO['meta_carbo'], step=10.0),
+            'meta_gordura': c1.number_input("Meta de gordura (g/dia):", 0.0, 300.0, USUARIO['meta_gordura'], step=5.0),
+            'meta_peso': c2.number_input("Peso alvo (kg):", 30.0, 300.0, META_PESO, step=0.5),
+            'perda_semanal_kg': c3.number_input("Perda semanal planejada (kg):", 0.1, 2.0, PERDA_SEMANAL_KG, step=0.1),
+        }
+        if st.form_submit_button("💾 Salvar metas"):
+            try:
+                usuarios.atualizar_metas(get_pool(), USER_ID, **novas_metas)
+                # Resumos de aderência se recalculam com as metas novas na próxima leitura
+                st.session_state["usuario"] = {**USUARIO, **novas_metas}
+                st.rerun()
+            except Exception as e:
+                st.error(f"Erro no Banco de Dados: {e}")
+    c1, c2 = st.columns(2)
+    with c1.form("trocar_senha", clear_on_submit=True):
+        nova_senha = st.text_input("Nova senha:", type="password")
+        if st.form_submit_button("🔑 Trocar senha"):
+            try:
+                usuarios.trocar_senha(get_pool(), USER_ID, nova_senha)
+                st.success("Senha alterada!")
+            except Exception as e:
+                st.error(str(e))
+    if c2.button("🚪 Sair"):
+        st.session_state.clear()
+        st.rerun()
+    if USUARIO['administrador']:
+        with st.expander("➕ Novo usuário"):
+            with st.form("novo_usuario", clear_on_submit=True):
+                c1, c2, c3 = st.columns(3)
+                novo_login = c1.text_input("Login:")
+                novo_nome = c2.text_input("Nome:")
+                nova_senha_usuario = c3.text_input("Senha inicial:", type="password")
+                novo_admin = st.checkbox("Administrador")
+                if st.form_submit_button("Criar"):
+                    try:
+                        novo_id = usuarios.criar_usuario(get_pool(), novo_login, novo_nome, nova_senha_usuario, novo_admin)
+                        st.success(f"Usuário {novo_login} criado (id {novo_id}).")
+                    except Exception as e:
+                        st.error(f"Não foi possível criar o usuário: {e}")
+            st.dataframe(usuarios.listar_usuarios(get_pool()), hide_index=True)
+
+    st.divider()
     st.write("### 🛠️ Corretor de Fuso")
     hoje = get_now_br().date()
     c1, c2 = st.columns(2)
     if c1.button("⏪ Mover AMANHÃ -> HOJE"):
-        executar_sql("UPDATE public.consumo SET data = %s WHERE data = %s", (hoje, hoje + timedelta(days=1)))
+        executar_sql("UPDATE public.consumo SET data = %s WHERE user_id = %s AND data = %s", (hoje, USER_ID, hoje + timedelta(days=1)))
         st.success("Feito!")
     if c2.button("⏩ Mover ONTEM -> HOJE"):
-        executar_sql("UPDATE public.consumo SET data = %s WHERE data = %s", (hoje, hoje - timedelta(days=1)))
+        executar_sql("UPDATE public.consumo SET data = %s WHERE user_id = %s AND data = %s", (hoje, USER_ID, hoje - timedelta(days=1)))
         st.success("Feito!")
+
+    st.divider()
+    st.write("### 🧠 Cache da IA")
+    stats_ia = ia.obter_cache().estatisticas()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Acertos", stats_ia['hits'])
+    c2.metric("Faltas", stats_ia['misses'])
+    c3.metric("Taxa de acerto", f"{stats_ia['taxa_acerto']:.0%}")
+    c4.metric("Respostas guardadas", stats_ia['itens'])
+    st.caption(f"Cliques duplicados aproveitados: {stats_ia['deduplicadas']} | Expiradas: {stats_ia['expiradas']} | Removidas (LRU): {stats_ia['removidas_lru']}")
+    if st.button("🗑️ Limpar cache da IA"):
+        ia.obter_cache().limpar()
+        st.success("Cache limpo!")
+
+    st.divider()
+    st.write("### 📮 Fila offline")
+    fila = get_fila()
+    pendentes = fila.pendentes()
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Refeições pendentes", pendentes['consumo'])
+    c2.metric("Pesagens pendentes", pendentes['peso'])
+    c3.metric("Rejeitadas", pendentes['rejeitados'])
+    if fila.ultimo_envio:
+        st.caption(f"Último envio: {datetime.fromtimestamp(fila.ultimo_envio, pytz.timezone('America/Sao_Paulo')).strftime('%d/%m %H:%M:%S')}")
+    if fila.ultimo_erro:
+        st.caption(f"Última falha de envio: {fila.ultimo_erro}")
+    if st.button("🔄 Enviar agora"):
+        try:
+            st.success(f"{fila.drenar(get_pool())} registro(s) enviado(s).")
+        except Exception as e:
+            st.error(f"Banco indisponível, os registros continuam na fila: {e}")
+    if pendentes['rejeitados']:
+        st.warning("Registros recusados pelo banco (erro de dados); não são reenviados.")
+        st.dataframe(pd.DataFrame(fila.rejeitados()), hide_index=True)
+        if st.button("🗑️ Descartar rejeitados"):
+            st.toast(f"{fila.descartar_rejeitados()} registro(s) descartado(s).")
+            st.rerun()
+
+    st.divider()
+    st.write("### 📦 Backup (Parquet)")
+    if st.button("📤 Gerar exportação"):
+        arquivos = {}
+        try:
+            with st.spinner("Exportando..."):
+                for tabela in exportacao.ESQUEMAS:
+                    buffer = io.BytesIO()
+                    linhas, segundos = exportacao.exportar(get_pool(), tabela, buffer, USER_ID)
+                    arquivos[tabela] = (buffer.getvalue(), linhas)
+            st.session_state["exportacao"] = arquivos
+        except Exception as e:
+            st.error(f"Erro no Banco de Dados: {e}")
+    if "exportacao" in st.session_state:
+        colunas_exp = st.columns(len(st.session_state["exportacao"]))
+        for col, (tabela, (dados, linhas)) in zip(colunas_exp, st.session_state["exportacao"].items()):
+            col.download_button(f"⬇️ {tabela}.parquet ({linhas} linhas)", data=dados, file_name=f"{tabela}.parquet", mime="application/vnd.apache.parquet")
+    with st.expander("📥 Importar Parquet"):
+        arquivo_pq = st.file_uploader("Arquivo .parquet:", type=["parquet"])
+        c1, c2 = st.columns(2)
+        tabela_imp = c1.selectbox("Tabela:", list(exportacao.ESQUEMAS))
+        substituir = c2.checkbox("Substituir os meus registros atuais")
+        if st.button("Importar", disabled=arquivo_pq is None):
+            try:
+                with st.spinner("Importando..."):
+                    linhas, segundos = exportacao.importar(get_pool(), tabela_imp, arquivo_pq, USER_ID, substituir=substituir)
+                st.success(f"✅ {linhas} linha(s) importada(s) em public.{tabela_imp} ({segundos:.1f}s).")
+            except Exception as e:
+                st.error(f"Erro na importação (nada foi gravado): {e}")
+
+    st.divider()
+    st.write("### ⏱️ Diagnóstico de Desempenho")
+    registro = metricas.obter_registro()
+    resumo = registro.resumo()
+    if resumo.empty:
+        st.info("Nenhuma métrica registrada ainda neste processo.")
+    else:
+        total_tipo = resumo.groupby('tipo')['total_ms'].sum()
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Seções (ms)", f"{total_tipo.get('secao', 0):.0f}")
+        c2.metric("Banco (ms)", f"{total_tipo.get('sql', 0):.0f}")
+        c3.metric("IA (ms)", f"{total_tipo.get('ia', 0):.0f}")
+        c4.metric("Round trips", int(resumo.loc[resumo['tipo'] == 'secao', 'idas'].sum()) if 'idas' in resumo else 0)
+        st.caption("Tempos por chamada (p50/p95) desde o início do processo ou da última limpeza; 'idas' = round trips ao banco.")
+        st.dataframe(resumo, hide_index=True)
+    c1, c2, c3 = st.columns(3)
+    if c1.button("💾 Exportar para .cache/metricas.jsonl"):
+        st.success(f"{registro.exportar()} evento(s) gravado(s) em {metricas.CAMINHO_EXPORTACAO}")
+    c2.download_button(
+        "⬇️ Baixar eventos (JSONL)",
+        data="\n".join(json.dumps(e, ensure_ascii=False, default=str) for e in registro.eventos()),
+        file_name="metricas.jsonl", mime="application/x-ndjson",
+    )
+    if c3.button("🗑️ Limpar métricas"):
+        registro.limpar()
+        st.rerun()
+
+# --- MÉTRICA DA SEÇÃO (st.rerun no meio da seção pula o registro deste rerun) ---
+metricas.obter_registro().registrar('secao', secao, time.perf_counter() - inicio_secao, idas=banco.idas_ao_banco() - idas_secao)
@@ -0,0 +1,422 @@
+"""Camada de acesso ao Postgres (Neon) compartilhada por app.py e dashboard.py.
+
+Mantém um pool limitado e thread-safe de conexões por DSN. O fuso horário é
+fixado uma única vez por conexão (parâmetro de startup ``options``), então cada
+consulta custa um único round trip.
+"""
+import os
+import re
+import threading
+import time
+import weakref
+import tomllib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2.extensions import make_dsn, parse_dsn
+from psycopg2.extras import execute_values
+
+FUSO_HORARIO = 'America/Sao_Paulo'
+
+# Erros que indicam conexão morta (ex: Neon suspendeu o compute por ociosidade)
+ERROS_CONEXAO = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+def _dsn_com_fuso(dsn, fuso):
+    """Acrescenta '-c timezone=...' às options do DSN, preservando as existentes (ex: endpoint do Neon).
+
+    Sem ``connect_timeout`` no DSN, usa 10 s.
+    """
+    params = parse_dsn(dsn)
+    opcoes = params.get('options', '')
+    params['options'] = f"{opcoes} -c timezone={fuso}".strip()
+    # Banco fora do ar não pode prender o rerun (a escrita cai na fila offline)
+    params.setdefault('connect_timeout', '10')
+    return make_dsn(**params)
+
+
+def _rotulo_sql(sql):
+    """Normaliza o SQL (espaços) para servir de chave dos contadores."""
+    return re.sub(r'\s+', ' ', str(sql)).strip()
+
+
+# --- CONTADORES DE TEMPO POR CONSULTA ---
+class EstatisticasConsultas:
+    """Acumula chamadas, tempo total/máximo e linhas por consulta (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dados = {}
+
+    def registrar(self, sql, duracao, linhas=0):
+        rotulo = _rotulo_sql(sql)
+        with self._lock:
+            d = self._dados.setdefault(rotulo, {'chamadas': 0, 'tempo_total_s': 0.0, 'tempo_max_s': 0.0, 'linhas': 0})
+            d['chamadas'] += 1
+            d['tempo_total_s'] += duracao
+            d['tempo_max_s'] = max(d['tempo_max_s'], duracao)
+            d['linhas'] += max(linhas, 0)
+
+    def resumo(self):
+        """Retorna um DataFrame com os contadores, ordenado pelo tempo total."""
+        with self._lock:
+            linhas = [{'sql': sql, **d} for sql, d in self._dados.items()]
+        df = pd.DataFrame(linhas, columns=['sql', 'chamadas', 'tempo_total_s', 'tempo_max_s', 'linhas'])
+        if not df.empty:
+            df['tempo_medio_ms'] = df['tempo_total_s'] / df['chamadas'] * 1000
+            df = df.sort_values('tempo_total_s', ascending=False, ignore_index=True)
+        return df
+
+    def limpar(self):
+        with self._lock:
+            self._dados.clear()
+
+
+# --- ROUND TRIPS POR THREAD (cada sessão do Streamlit roda na sua thread) ---
+_idas = threading.local()
+
+
+def idas_ao_banco():
+    """Quantos comandos esta thread já mandou ao servidor (compare antes/depois de um trecho)."""
+    return getattr(_idas, 'total', 0)
+
+
+def _contar_ida():
+    _idas.total = getattr(_idas, 'total', 0) + 1
+
+
+class _CursorContado(psycopg2.extensions.cursor):
+    """Cursor que conta cada execute/COPY como um round trip da thread atual."""
+
+    def execute(self, *args, **kwargs):
+        _contar_ida()
+        return super().execute(*args, **kwargs)
+
+    def copy_expert(self, *args, **kwargs):
+        _contar_ida()
+        return super().copy_expert(*args, **kwargs)
+
+
+# --- CACHE DE RESULTADOS INVALIDADO POR ESCRITA ---
+class CacheResultados:
+    """LRU de DataFrames por (sql, params), descartado inteiro a cada escrita.
+
+    Cada escrita feita pelo pool incrementa ``versao``; entradas de versões
+    anteriores deixam de valer. O TTL cobre escritas feitas por outros processos.
+    """
+
+    def __init__(self, max_itens=128, ttl_s=300):
+        self.max_itens = max_itens
+        self.ttl_s = ttl_s
+        self.versao = 0
+        self.hits = 0
+        self.misses = 0
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def chave(sql, params):
+        if isinstance(params, dict):
+            params = tuple(sorted(params.items()))
+        elif isinstance(params, list):
+            params = tuple(params)
+        return (_rotulo_sql(sql), repr(params))
+
+    def obter(self, chave):
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None or item[0] != self.versao or time.monotonic() - item[1] > self.ttl_s:
+                self.misses += 1
+                return None
+            self._dados.move_to_end(chave)
+            self.hits += 1
+            return item[2].copy()
+
+    def gravar(self, chave, df, versao):
+        with self._lock:
+            # Uma escrita durante a consulta torna o resultado velho: não guarda
+            if versao != self.versao:
+                return
+            self._dados[chave] = (versao, time.monotonic(), df.copy())
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_itens:
+                self._dados.popitem(last=False)
+
+    def invalidar(self):
+        with self._lock:
+            self.versao += 1
+            self._dados.clear()
+
+
+# --- POOL DE CONEXÕES ---
+class PoolBanco:
+    """Pool limitado de conexões psycopg2 com health check e reconexão automática.
+
+    - No máximo ``max_conexoes`` abertas; chamadas excedentes aguardam uma livre.
+    - Conexões ociosas há mais de ``ociosidade_max_s`` recebem um ``SELECT 1``
+      antes de serem reutilizadas (o Neon derruba conexões ao suspender).
+    - Erros de conexão descartam a conexão e repetem a operação em uma nova.
+    """
+
+    def __init__(self, dsn, min_conexoes=1, max_conexoes=8, fuso=FUSO_HORARIO,
+                 ociosidade_max_s=240, tentativas=2, espera_max_s=30):
+        self.fuso = fuso
+        self.ociosidade_max_s = ociosidade_max_s
+        self.tentativas = max(1, tentativas)
+        self.espera_max_s = espera_max_s
+        self.estatisticas = EstatisticasConsultas()
+        self.cache = CacheResultados()
+        self._pool = pg_pool.ThreadedConnectionPool(min_conexoes, max_conexoes, _dsn_com_fuso(dsn, fuso))
+        self._vagas = threading.BoundedSemaphore(max_conexoes)
+        # Chave é a própria conexão (não o id): o ThreadedConnectionPool fecha as excedentes
+        # a min_conexoes e uma conexão nova pode reaproveitar o endereço de uma fechada
+        self._ultimo_uso = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    # Ciclo de vida das conexões
+    def _preparar(self, conn):
+        """Configura uma conexão recém-aberta (autocommit e fuso de fallback)."""
+        conn.autocommit = True
+        conn.cursor_factory = _CursorContado
+        # Poolers (PgBouncer) podem ignorar as options de startup: aí o SET roda uma vez só
+        if conn.info.parameter_status('TimeZone') != self.fuso:
+            with conn.cursor() as cur:
+                cur.execute("SET timezone TO %s", (self.fuso,))
+
+    def _saudavel(self, conn):
+        if conn.closed:
+            return False
+        with self._lock:
+            ultimo = self._ultimo_uso.get(conn)
+        if ultimo is None or time.monotonic() - ultimo < self.ociosidade_max_s:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except ERROS_CONEXAO:
+            return False
+
+    def _obter(self):
+        if not self._vagas.acquire(timeout=self.espera_max_s):
+            raise pg_pool.PoolError("Tempo esgotado aguardando uma conexão livre no pool.")
+        try:
+            for _ in range(self.tentativas + 1):
+                conn = self._pool.getconn()
+                with self._lock:
+                    nova = conn not in self._ultimo_uso
+                if nova:
+                    try:
+                        self._preparar(conn)
+                    except Exception:
+                        self._descartar(conn, liberar_vaga=False)
+                        raise
+                    return conn
+                if self._saudavel(conn):
+                    # Garantia independente do controle acima: escrita sem autocommit seria desfeita no _devolver
+                    conn.autocommit = True
+                    return conn
+                self._descartar(conn, liberar_vaga=False)
+            raise psycopg2.OperationalError("Não foi possível obter uma conexão saudável com o banco.")
+        except Exception:
+            self._vagas.release()
+            raise
+
+    def _devolver(self, conn):
+        if not conn.closed and conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+        with self._lock:
+            self._ultimo_uso[conn] = time.monotonic()
+        self._pool.putconn(conn)
+        if conn.closed:
+            # O pool fecha as conexões excedentes a min_conexoes em vez de guardá-las
+            with self._lock:
+                self._ultimo_uso.pop(conn, None)
+        self._vagas.release()
+
+    def _descartar(self, conn, liberar_vaga=True):
+        with self._lock:
+            self._ultimo_uso.pop(conn, None)
+        try:
+            self._pool.putconn(conn, close=True)
+        finally:
+            if liberar_vaga:
+                self._vagas.release()
+
+    @contextmanager
+    def conexao(self):
+        """Empresta uma conexão do pool (autocommit) e a devolve ao final."""
+        conn = self._obter()
+        try:
+            yield conn
+        except BaseException:
+            if conn.closed:
+                self._descartar(conn)
+            else:
+                self._devolver(conn)
+            raise
+        else:
+            self._devolver(conn)
+
+    def _com_retentativa(self, operacao, repetir=True):
+        """Executa ``operacao(conn)``, repetindo em conexão nova se a atual caiu.
+
+        Com ``repetir=False`` tenta uma vez só: a conexão pode cair depois do COMMIT
+        no servidor, e repetir uma escrita não idempotente a aplicaria duas vezes.
+        """
+        tentativas = self.tentativas if repetir else 1
+        for tentativa in range(tentativas):
+            try:
+                with self.conexao() as conn:
+                    return operacao(conn)
+            except ERROS_CONEXAO as e:
+                # Erros com pgcode vieram do servidor (ex: timeout); só conexão caída é repetida
+                if getattr(e, 'pgcode', None) or tentativa + 1 >= tentativas:
+                    raise
+
+    # API pública
+    def consultar(self, sql, params=None, cache=False):
+        """Executa um SELECT e retorna um DataFrame.
+
+        Com ``cache=True`` reaproveita o resultado enquanto nenhuma escrita passar pelo pool.
+        """
+        if cache:
+            chave = CacheResultados.chave(sql, params)
+            df = self.cache.obter(chave)
+            if df is not None:
+                return df
+            versao = self.cache.versao
+            df = self.consultar(sql, params)
+            self.cache.gravar(chave, df, versao)
+            return df
+
+        def operacao(conn):
+            inicio = time.perf_counter()
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                colunas = [c.name for c in cur.description]
+                df = pd.DataFrame.from_records(cur.fetchall(), columns=colunas)
+            self.estatisticas.registrar(sql, time.perf_counter() - inicio, len(df))
+            return df
+        return self._com_retentativa(operacao)
+
+    def consultar_em_lotes(self, sql, params=None, tamanho=50_000):
+        """Lê um SELECT grande por um cursor do lado do servidor, ``tamanho`` linhas por vez.
+
+        Gerador de ``(colunas, linhas)``: a memória fica limitada a um lote, qualquer
+        que seja o tamanho do resultado. Sem retentativa (uma queda no meio sobe o erro).
+        """
+        with self.conexao() as conn:
+            # Cursor nomeado (DECLARE) só existe dentro de uma transação
+            conn.autocommit = False
+            try:
+                with conn.cursor(name="consultar_em_lotes") as cur:
+                    inicio = time.perf_counter()
+                    cur.execute(sql, params)
+                    total = 0
+                    while linhas := cur.fetchmany(tamanho):
+                        total += len(linhas)
+                        yield [c.name for c in cur.description], linhas
+                    self.estatisticas.registrar(sql, time.perf_counter() - inicio, total)
+            finally:
+                if not conn.closed:
+                    conn.rollback()
+                    conn.autocommit = True
+
+    def executar(self, sql, params=None, repetir=False):
+        """Executa um comando (INSERT/UPDATE/DELETE/DDL) e retorna o rowcount.
+
+        ``repetir=True`` só para comandos idempotentes (repetidos após queda de conexão).
+        """
+        def operacao(conn):
+            inicio = time.perf_counter()
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                linhas = cur.rowcount
+            self.estatisticas.registrar(sql, time.perf_counter() - inicio, linhas)
+            return linhas
+        try:
+            return self._com_retentativa(operacao, repetir)
+        finally:
+            self.cache.invalidar()
+
+    def executar_lote(self, sql, linhas, template=None, repetir=False):
+        """Insere várias linhas num único comando multi-VALUES (um round trip, atômico).
+
+        ``repetir=True`` só com chave de idempotência (ex: ``ON CONFLICT ... DO NOTHING``).
+        """
+        linhas = list(linhas)
+        if not linhas:
+            return 0
+
+        def operacao(conn):
+            inicio = time.perf_counter()
+            with conn.cursor() as cur:
+                execute_values(cur, sql, linhas, template=template, page_size=len(linhas))
+                total = cur.rowcount
+            self.estatisticas.registrar(sql, time.perf_counter() - inicio, total)
+            return total
+        try:
+            return self._com_retentativa(operacao, repetir)
+        finally:
+            self.cache.invalidar()
+
+    @contextmanager
+    def transacao(self):
+        """Abre uma transação explícita e entrega um cursor; commit ao sair, rollback em erro."""
+        with self.conexao() as conn:
+            conn.autocommit = False
+            try:
+                with conn.cursor() as cur:
+                    yield cur
+                _contar_ida()
+                conn.commit()
+            except BaseException:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                self.cache.invalidar()
+                if not conn.closed:
+                    conn.autocommit = True
+
+    def fechar(self):
+        self._pool.closeall()
+
+
+def dsn_padrao():
+    """DSN para scripts de linha de comando: $DATABASE_URL ou o DATABASE_URL de .streamlit/secrets.toml."""
+    if os.environ.get('DATABASE_URL'):
+        return os.environ['DATABASE_URL']
+    caminho = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.streamlit', 'secrets.toml')
+    try:
+        with open(caminho, 'rb') as f:
+            return tomllib.load(f)['DATABASE_URL']
+    except (OSError, KeyError):
+        raise SystemExit("Defina DATABASE_URL no ambiente ou em .streamlit/secrets.toml.")
+
+
+def argumento_dsn(parser):
+    """Acrescenta ``--dsn`` a um parser de linha de comando (o padrão é o de ``dsn_padrao``)."""
+    parser.add_argument('--dsn', help="DSN do Postgres (padrão: DATABASE_URL do ambiente ou de .streamlit/secrets.toml)")
+
+
+def pool_cli(args):
+    """Pool de uma conexão para scripts: ``args.dsn`` ou, sem ele, ``dsn_padrao()``."""
+    return PoolBanco(args.dsn or dsn_padrao(), max_conexoes=1)
+
+
+# --- REGISTRO DE POOLS POR PROCESSO ---
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def obter_pool(dsn, **kwargs):
+    """Retorna o pool do processo para o DSN, criando-o na primeira chamada."""
+    with _pools_lock:
+        if dsn not in _pools:
+            _pools[dsn] = PoolBanco(dsn, **kwargs)
+        return _pools[dsn]
@@ -0,0 +1,216 @@
+"""Benchmark dos caminhos quentes de banco e de renderização (app.py e dashboard.py).
+
+Popula o banco com refeições sintéticas (por padrão 1, 5 e 20 anos) e mede as
+mesmas consultas e transformações de DataFrame que as duas páginas executam,
+sem o cache de resultados do pool (invalidado antes de cada medição, fora do
+tempo medido). A saída é um JSON com p50/p95 por cenário, para comparar uma
+otimização com a medição anterior (``--comparar``).
+
+ATENÇÃO: apaga public.consumo e public.peso do banco indicado. Use um banco
+descartável; por isso o DSN é obrigatório e não vem do secrets.toml.
+
+    python benchmark.py --dsn postgresql://localhost/leo_bench --apagar-dados
+    python benchmark.py --dsn ... --apagar-dados --anos 1 5 --saida depois.json --comparar antes.json
+"""
+import argparse
+import io
+import json
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytz
+
+import banco
+import migracoes
+import projecao
+import repositorio
+
+# O histórico sintético fica no usuário 1 (default de user_id no COPY); metas padrão dele
+USER_ID = 1
+META_KCAL = 1650
+META_PROTEINA = 110
+META_PESO = 120.0
+PERDA_SEMANAL_KG = 0.8
+
+ALIMENTOS = [
+    ('Arroz branco', 'Não contém'), ('Feijão carioca', 'Não contém'), ('Frango grelhado', 'Não contém'),
+    ('Pão francês', 'Contém glúten'), ('Ovo cozido', 'Não'), ('Banana', 'Não'),
+    ('Macarrão', 'Sim'), ('Whey protein', 'NI'), ('Iogurte natural', 'Não contém'),
+    ('Bolo de chocolate', 'Contém'),
+]
+
+
+# --- DADOS SINTÉTICOS ---
+def semear(pool, anos, hoje, semente=42):
+    """Troca o conteúdo de consumo/peso por ``anos`` de histórico sintético. Retorna o nº de refeições."""
+    rng = np.random.default_rng(semente)
+    dias = pd.date_range(end=hoje, periods=int(anos * 365), freq='D').date
+    por_dia = rng.integers(3, 8, size=len(dias))
+    n = int(por_dia.sum())
+    escolha = rng.integers(0, len(ALIMENTOS), size=n)
+    quantidade = rng.uniform(30, 400, size=n).round(1)
+    consumo = pd.DataFrame({
+        'data': np.repeat(dias, por_dia),
+        'alimento': [ALIMENTOS[i][0] for i in escolha],
+        'quantidade': quantidade,
+        'kcal': (quantidade * rng.uniform(0.5, 3.5, size=n)).round(1),
+        'proteina': (quantidade * rng.uniform(0, 0.3, size=n)).round(1),
+        'carbo': (quantidade * rng.uniform(0, 0.6, size=n)).round(1),
+        'gordura': (quantidade * rng.uniform(0, 0.2, size=n)).round(1),
+        'gluten': [ALIMENTOS[i][1] for i in escolha],
+    })
+    # Pesagem a cada 3 dias, descendo ~0,1 kg/dia com ruído
+    dias_peso = dias[::3]
+    peso = pd.DataFrame({
+        'data': dias_peso,
+        'peso_kg': (140 - 0.1 * np.arange(len(dias_peso)) * 3 / 7 + rng.normal(0, 0.4, len(dias_peso))).clip(60).round(1),
+    })
+
+    with pool.transacao() as cur:
+        cur.execute("TRUNCATE public.consumo, public.peso RESTART IDENTITY")
+        for tabela, df in (('consumo', consumo), ('peso', peso)):
+            buffer = io.StringIO()
+            df.to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            cur.copy_expert(f"COPY public.{tabela} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cur.execute("ANALYZE public.consumo")
+        cur.execute("ANALYZE public.consumo_diario")
+        cur.execute("ANALYZE public.peso")
+    return n
+
+
+# --- TRANSFORMAÇÕES DAS PÁGINAS (mesma lógica de app.py/dashboard.py) ---
+def projecao_peso(df_p):
+    """Aba de peso do app.py e gráfico do dashboard.py: plano, tendência e previsão."""
+    return projecao.projetar(df_p, META_PESO, PERDA_SEMANAL_KG)[0]
+
+
+def filtro_gluten(df_hoje):
+    """Banner de glúten do dashboard.py (coluna booleana classificada na escrita)."""
+    return df_hoje.loc[df_hoje['contem_gluten'].eq(True), 'alimento'].unique().tolist()
+
+
+def grafico_14_dias(df_chart):
+    """Aba de histórico do app.py: prepara o DataFrame dos gráficos de linha."""
+    df_chart = df_chart.sort_values(by='data')
+    df_chart['Meta Kcal'] = META_KCAL
+    df_chart['Meta Proteína'] = META_PROTEINA
+    return df_chart.set_index('data')
+
+
+# --- CENÁRIOS ---
+def cenarios(pool, hoje):
+    """``{nome: função}``; cada função faz o trabalho de um trecho das páginas e devolve o nº de linhas."""
+    def consultar(sql, params=None):
+        return pool.consultar(sql, params)
+
+    def diario_profundo():
+        # Cursor no meio do histórico: mede o custo de uma página "lá atrás"
+        meio = consultar("SELECT data, id FROM public.consumo ORDER BY data DESC, id DESC OFFSET (SELECT COUNT(*) / 2 FROM public.consumo) LIMIT 1")
+        cursor = (meio['data'].iloc[0], int(meio['id'].iloc[0]))
+        return len(repositorio.listar_consumo_pagina(pool, USER_ID, date(1900, 1, 1), hoje, 50, cursor)[0])
+
+    df_peso = consultar("SELECT * FROM public.peso WHERE user_id = %s ORDER BY data ASC", (USER_ID,))
+    df_hoje = consultar("SELECT * FROM public.consumo WHERE user_id = %s AND data = %s", (USER_ID, hoje))
+    return {
+        'app_resumo_hoje': lambda: len(consultar("SELECT kcal, proteina FROM public.consumo_diario WHERE user_id = %s AND data = %s", (USER_ID, hoje))),
+        'app_agregado_14d': lambda: len(grafico_14_dias(consultar(
+            "SELECT data, kcal, proteina FROM public.consumo_diario WHERE user_id = %s AND data >= %s ORDER BY data ASC",
+            (USER_ID, hoje - timedelta(days=14))))),
+        'app_diario_pagina': lambda: len(repositorio.listar_consumo_pagina(pool, USER_ID, hoje - timedelta(days=30), hoje, 50)[0]),
+        'app_diario_pagina_profunda': diario_profundo,
+        'app_diario_contagem': lambda: repositorio.contar_consumo(pool, USER_ID, hoje - timedelta(days=30), hoje),
+        'app_peso_lista': lambda: len(consultar("SELECT * FROM public.peso WHERE user_id = %s ORDER BY data ASC", (USER_ID,))),
+        'app_projecao_peso': lambda: len(projecao_peso(df_peso)),
+        'dash_hoje_detalhe': lambda: len(consultar("SELECT * FROM public.consumo WHERE user_id = %s AND data = %s", (USER_ID, hoje))),
+        'dash_agregado_30d': lambda: len(consultar(
+            "SELECT data, kcal as tkcal, proteina as tprot, carbo as tcarb, gordura as tgord "
+            "FROM public.consumo_diario WHERE user_id = %s AND data >= %s ORDER BY data ASC", (USER_ID, hoje - timedelta(days=30)))),
+        'dash_filtro_gluten': lambda: len(filtro_gluten(df_hoje)),
+    }
+
+
+def medir(funcao, repeticoes, aquecimento=2, antes=None):
+    """p50/p95/mín de ``funcao``; ``antes`` roda antes de cada chamada, fora do tempo medido."""
+    for _ in range(aquecimento):
+        funcao()
+    tempos = []
+    linhas = 0
+    for _ in range(repeticoes):
+        if antes is not None:
+            antes()
+        inicio = time.perf_counter()
+        linhas = funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos = np.array(tempos)
+    return {
+        'p50_ms': round(float(np.percentile(tempos, 50)), 3),
+        'p95_ms': round(float(np.percentile(tempos, 95)), 3),
+        'min_ms': round(float(tempos.min()), 3),
+        'linhas': int(linhas),
+    }
+
+
+def comparar(atual, anterior):
+    """Linhas de texto com a razão do p50 atual/anterior por cenário (< 1 = mais rápido)."""
+    saida = []
+    for anos, resultados in atual['resultados'].items():
+        base = anterior.get('resultados', {}).get(anos, {})
+        for nome, r in resultados.items():
+            if nome in base and base[nome]['p50_ms'] > 0:
+                razao = r['p50_ms'] / base[nome]['p50_ms']
+                saida.append(f"{anos:>3} anos  {nome:<28} {base[nome]['p50_ms']:>9.3f} -> {r['p50_ms']:>9.3f} ms  x{razao:.2f}")
+    return saida
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark das consultas e transformações do Leo Tracker.")
+    parser.add_argument('--dsn', required=True, help="DSN de um Postgres descartável (os dados de consumo/peso são apagados)")
+    parser.add_argument('--apagar-dados', action='store_true', help="Confirma que consumo/peso do banco podem ser apagados")
+    parser.add_argument('--anos', type=float, nargs='+', default=[1, 5, 20], help="Tamanhos de histórico a medir (padrão: 1 5 20)")
+    parser.add_argument('--repeticoes', type=int, default=30)
+    parser.add_argument('--saida', help="Grava o JSON neste arquivo (padrão: só imprime)")
+    parser.add_argument('--comparar', help="JSON de uma execução anterior para comparar os p50")
+    args = parser.parse_args(argv)
+
+    if not args.apagar_dados:
+        parser.error("o benchmark apaga public.consumo e public.peso; confirme com --apagar-dados")
+
+    pool = banco.PoolBanco(args.dsn, max_conexoes=1)
+    migracoes.aplicar_migracoes(pool)
+    # O "hoje" do app (relógio de Brasília), não o do servidor
+    hoje = datetime.now(pytz.timezone(banco.FUSO_HORARIO)).date()
+
+    relatorio = {
+        'executado_em': datetime.now().isoformat(timespec='seconds'),
+        'repeticoes': args.repeticoes,
+        'resultados': {},
+        'refeicoes': {},
+    }
+    for anos in sorted(args.anos):
+        chave = f"{anos:g}"
+        relatorio['refeicoes'][chave] = semear(pool, anos, hoje)
+        relatorio['resultados'][chave] = {
+            # Listagem e contagem do diário passam pelo cache do pool (cache=True): sem invalidar,
+            # toda repetição depois do aquecimento seria um acerto no LRU, não uma ida ao banco
+            nome: medir(funcao, args.repeticoes, antes=pool.cache.invalidar) for nome, funcao in cenarios(pool, hoje).items()
+        }
+        print(f"{chave} ano(s): {relatorio['refeicoes'][chave]} refeições medidas.", file=sys.stderr)
+
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    print(texto)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            print("\n".join(comparar(relatorio, json.load(f))), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
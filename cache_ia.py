@@ -0,0 +1,149 @@
+"""Cache persistente (SQLite) das respostas já interpretadas da IA.
+
+Chave = texto normalizado + data de referência. Entradas expiram após o TTL e,
+acima de ``max_itens``, as menos acessadas recentemente são removidas (LRU).
+Chamadas simultâneas com a mesma chave são deduplicadas: a segunda espera o
+resultado da primeira em vez de chamar a API de novo.
+"""
+import copy
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future
+
+CAMINHO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'ia_respostas.sqlite3')
+
+
+def normalizar_texto(texto):
+    """Minúsculas, Unicode NFC e espaços colapsados (acentos são preservados)."""
+    texto = unicodedata.normalize('NFC', str(texto)).lower()
+    return re.sub(r'\s+', ' ', texto).strip()
+
+
+def gerar_chave(texto, data_ref):
+    bruto = f"{data_ref}|{normalizar_texto(texto)}"
+    return hashlib.sha256(bruto.encode('utf-8')).hexdigest()
+
+
+class CacheRespostasIA:
+    def __init__(self, caminho=CAMINHO_PADRAO, ttl_s=7 * 24 * 3600, max_itens=500):
+        self.ttl_s = ttl_s
+        self.max_itens = max_itens
+        self._lock = threading.Lock()
+        self._em_andamento = {}
+        self._stats = {'hits': 0, 'misses': 0, 'deduplicadas': 0, 'expiradas': 0, 'removidas_lru': 0}
+
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._db = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS respostas (
+                chave TEXT PRIMARY KEY,
+                dados TEXT NOT NULL,
+                criado_em REAL NOT NULL,
+                acessado_em REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_respostas_acesso ON respostas (acessado_em)")
+
+    # Armazenamento
+    def _ler(self, chave, contar=True):
+        """JSON guardado ou None (ausente/expirado); quem chama detém o lock. Atualiza o acesso (LRU)."""
+        agora = time.time()
+        linha = self._db.execute("SELECT dados, criado_em FROM respostas WHERE chave = ?", (chave,)).fetchone()
+        if linha is None:
+            if contar:
+                self._stats['misses'] += 1
+            return None
+        dados, criado_em = linha
+        if agora - criado_em > self.ttl_s:
+            self._db.execute("DELETE FROM respostas WHERE chave = ?", (chave,))
+            self._stats['expiradas'] += 1
+            if contar:
+                self._stats['misses'] += 1
+            return None
+        self._db.execute("UPDATE respostas SET acessado_em = ? WHERE chave = ?", (agora, chave))
+        if contar:
+            self._stats['hits'] += 1
+        return dados
+
+    def obter(self, chave):
+        """Retorna os dados guardados ou None (ausente/expirado). Atualiza o acesso (LRU)."""
+        with self._lock:
+            dados = self._ler(chave)
+        return None if dados is None else json.loads(dados)
+
+    def gravar(self, chave, dados):
+        agora = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO respostas (chave, dados, criado_em, acessado_em) VALUES (?, ?, ?, ?)",
+                (chave, json.dumps(dados, ensure_ascii=False), agora, agora)
+            )
+            excesso = self._db.execute("SELECT COUNT(*) FROM respostas").fetchone()[0] - self.max_itens
+            if excesso > 0:
+                self._db.execute(
+                    "DELETE FROM respostas WHERE chave IN (SELECT chave FROM respostas ORDER BY acessado_em ASC LIMIT ?)",
+                    (excesso,)
+                )
+                self._stats['removidas_lru'] += excesso
+
+    def limpar(self):
+        with self._lock:
+            self._db.execute("DELETE FROM respostas")
+
+    # Deduplicação de chamadas em andamento
+    def obter_ou_calcular(self, chave, calcular):
+        """Retorna ``(sucesso, dados)`` do cache ou de ``calcular()``.
+
+        ``calcular`` deve retornar ``(sucesso, dados)``; só sucessos são guardados.
+        Se outra thread já está calculando a mesma chave, espera o resultado dela.
+        Cada chamador recebe a sua cópia dos dados (quem chama altera os itens).
+        """
+        dados = self.obter(chave)
+        if dados is not None:
+            return True, dados
+
+        with self._lock:
+            # Relê sob o lock: o dono anterior pode ter gravado e saído entre o obter() e aqui
+            gravado = self._ler(chave, contar=False)
+            if gravado is not None:
+                return True, json.loads(gravado)
+            futuro = self._em_andamento.get(chave)
+            dono = futuro is None
+            if dono:
+                futuro = Future()
+                self._em_andamento[chave] = futuro
+            else:
+                self._stats['deduplicadas'] += 1
+
+        if not dono:
+            return copy.deepcopy(futuro.result())
+
+        try:
+            resultado = calcular()
+            if resultado[0]:
+                self.gravar(chave, resultado[1])
+            futuro.set_result(resultado)
+            return copy.deepcopy(resultado)
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._em_andamento.pop(chave, None)
+
+    def estatisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['itens'] = self._db.execute("SELECT COUNT(*) FROM respostas").fetchone()[0]
+        consultas = stats['hits'] + stats['misses']
+        stats['taxa_acerto'] = stats['hits'] / consultas if consultas else 0.0
+        return stats
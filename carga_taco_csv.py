@@ -1,52 +1,156 @@
+"""Carga da tabela TACO (alimentos.csv) em public.tabela_taco.
+
+O CSV é limpo de uma vez com operações vetorizadas do pandas ('Tr' = traço
+vira 0; 'NA', '*' e vazio viram NULL; vírgula decimal vira ponto). O resultado
+vai por ``COPY`` para uma tabela temporária e, na mesma transação, é aplicado
+com upsert pelo número do alimento: quem consulta a TACO durante a carga
+continua vendo a versão anterior até o COMMIT, nunca uma tabela vazia.
+
+Uso:
+    streamlit run carga_taco_csv.py          # página com botão
+    python carga_taco_csv.py [--csv alimentos.csv] [--dsn ...]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
 import pandas as pd
-import psycopg2
-import streamlit as st
-
-# Conexão usando seus Secrets
-conn = psycopg2.connect(st.secrets["DATABASE_URL"])
-cur = conn.cursor()
-
-def limpar_valor(valor):
-    """Converte valores da TACO (NA, Tr, etc) para número"""
-    if pd.isna(valor) or str(valor).strip().upper() == 'NA' or str(valor).strip().upper() == 'TR':
-        return 0.0
-    try:
-        # Substitui vírgula por ponto se necessário
-        return float(str(valor).replace(',', '.'))
-    except:
-        return 0.0
-
-def carregar_taco_do_csv():
-    st.info("Lendo arquivo CSV...")
-    # Lendo o arquivo enviado (ajustado para o delimitador ';' da TACO)
-    df = pd.read_csv('alimentos.csv', encoding='latin-1', sep=';')
-    
-    st.info("Limpando dados...")
-    # Mapeando e limpando as colunas necessárias
-    tabela_limpa = []
-    for _, row in df.iterrows():
-        tabela_limpa.append((
-            str(row['Descrição dos alimentos']),
-            limpar_valor(row['Energia (kcal)']),
-            limpar_valor(row['Proteína (g)']),
-            limpar_valor(row['Carboidrato (g)']),
-            limpar_valor(row['Lipídeos (g)'])
-        ))
-
-    st.warning("Limpando banco de dados atual...")
-    cur.execute("TRUNCATE TABLE tabela_taco")
-    
-    st.info(f"Inserindo {len(tabela_limpa)} alimentos no Neon...")
-    cur.executemany(
-        "INSERT INTO tabela_taco (alimento, kcal, proteina, carbo, gordura) VALUES (%s, %s, %s, %s, %s)", 
-        tabela_limpa
-    )
-    
-    conn.commit()
-    cur.close()
-    conn.close()
-    st.success("✅ Sucesso! A tabela TACO completa foi carregada no seu banco de dados.")
-
-st.title("🚀 Carga de Dados TACO via CSV")
-if st.button("Iniciar Processamento do CSV"):
-    carregar_taco_do_csv()
+
+import banco
+import migracoes
+
+CAMINHO_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alimentos.csv')
+
+# Coluna do CSV -> coluna de public.tabela_taco
+COLUNAS_TEXTO = {
+    'Categoria do alimento': 'categoria',
+    'Descrição dos alimentos': 'alimento',
+}
+COLUNAS_NUMERICAS = {
+    'Umidade (%)': 'umidade',
+    'Energia (kcal)': 'kcal',
+    'Energia (kJ)': 'energia_kj',
+    'Proteína (g)': 'proteina',
+    'Lipídeos (g)': 'gordura',
+    'Colesterol (mg)': 'colesterol',
+    'Carboidrato (g)': 'carbo',
+    'Fibra Alimentar (g)': 'fibra',
+    'Cinzas (g)': 'cinzas',
+    'Cálcio (mg)': 'calcio',
+    'Magnésio (mg)': 'magnesio',
+    'Manganês (mg)': 'manganes',
+    'Fósforo (mg)': 'fosforo',
+    'Ferro (mg)': 'ferro',
+    'Sódio (mg)': 'sodio',
+    'Potássio (mg)': 'potassio',
+    'Cobre (mg)': 'cobre',
+    'Zinco (mg)': 'zinco',
+    'Retinol (mcg)': 'retinol',
+    'RE (mcg)': 're',
+    'RAE (mcg)': 'rae',
+    'Tiamina (mg)': 'tiamina',
+    'Riboflavina (mg)': 'riboflavina',
+    'Piridoxina (mg)': 'piridoxina',
+    'Niacina (mg)': 'niacina',
+    'Vitamina C (mg)': 'vitamina_c',
+}
+COLUNAS = ['numero', *COLUNAS_TEXTO.values(), *COLUNAS_NUMERICAS.values()]
+
+
+def limpar_serie(serie):
+    """Converte uma coluna numérica da TACO inteira: 'Tr' vira 0; 'NA', '*', vazio e lixo viram NaN."""
+    texto = serie.astype(str).str.strip()
+    texto = texto.mask(texto.str.upper() == 'TR', '0')
+    return pd.to_numeric(texto.str.replace(',', '.', regex=False), errors='coerce')
+
+
+def ler_csv(caminho=CAMINHO_CSV):
+    """Lê o CSV da TACO (UTF-8, separador ';') e devolve um DataFrame com as colunas de public.tabela_taco."""
+    bruto = pd.read_csv(caminho, sep=';', encoding='utf-8', dtype=str, keep_default_na=False)
+    df = pd.DataFrame({'numero': pd.to_numeric(bruto['Número do Alimento'], errors='coerce')})
+    for origem, destino in COLUNAS_TEXTO.items():
+        df[destino] = bruto[origem].str.strip()
+    for origem, destino in COLUNAS_NUMERICAS.items():
+        df[destino] = limpar_serie(bruto[origem])
+    df = df.dropna(subset=['numero']).drop_duplicates('numero', keep='last')
+    df['numero'] = df['numero'].astype(int)
+    return df[COLUNAS]
+
+
+def _sql_upsert():
+    colunas = ', '.join(COLUNAS)
+    atualizacoes = ', '.join(f"{c} = EXCLUDED.{c}" for c in COLUNAS if c != 'numero')
+    return f"""
+        INSERT INTO public.tabela_taco ({colunas})
+        SELECT {colunas} FROM taco_carga
+        ON CONFLICT (numero) DO UPDATE SET {atualizacoes}
+    """
+
+
+def carregar_taco(pool, caminho=CAMINHO_CSV):
+    """Carrega o CSV em public.tabela_taco numa única transação. Retorna ``(linhas, segundos)``."""
+    inicio = time.perf_counter()
+    df = ler_csv(caminho)
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    with pool.transacao() as cur:
+        cur.execute(
+            "CREATE TEMP TABLE taco_carga ON COMMIT DROP AS "
+            f"SELECT {', '.join(COLUNAS)} FROM public.tabela_taco WITH NO DATA"
+        )
+        cur.copy_expert(f"COPY taco_carga ({', '.join(COLUNAS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        # Linhas da carga antiga (sem número) mantêm o id: ganham o número casando pela descrição
+        cur.execute("""
+            UPDATE public.tabela_taco t SET numero = c.numero
+            FROM taco_carga c
+            WHERE t.numero IS NULL AND t.alimento = c.alimento
+              AND NOT EXISTS (SELECT 1 FROM public.tabela_taco o WHERE o.numero = c.numero)
+        """)
+        cur.execute(_sql_upsert())
+        # A tabela espelha o CSV: o que saiu dele (ou ficou sem número) é removido
+        cur.execute("""
+            DELETE FROM public.tabela_taco t
+            WHERE t.numero IS NULL OR NOT EXISTS (SELECT 1 FROM taco_carga c WHERE c.numero = t.numero)
+        """)
+    return len(df), time.perf_counter() - inicio
+
+
+def pagina_streamlit():
+    import streamlit as st
+
+    import taco
+
+    st.title("🚀 Carga de Dados TACO via CSV")
+    if st.button("Iniciar Processamento do CSV"):
+        pool = banco.obter_pool(st.secrets["DATABASE_URL"])
+        migracoes.garantir_esquema(pool)
+        with st.spinner("Carregando alimentos.csv..."):
+            linhas, segundos = carregar_taco(pool)
+        taco.invalidar_indice()
+        st.success(f"✅ Sucesso! {linhas} alimentos da TACO carregados em {segundos:.2f}s.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Carrega alimentos.csv (TACO) em public.tabela_taco.")
+    parser.add_argument('--csv', default=CAMINHO_CSV, help="Caminho do CSV (padrão: alimentos.csv ao lado do script)")
+    banco.argumento_dsn(parser)
+    args = parser.parse_args(argv)
+
+    pool = banco.pool_cli(args)
+    migracoes.aplicar_migracoes(pool)
+    linhas, segundos = carregar_taco(pool, args.csv)
+    print(f"{linhas} alimentos carregados em {segundos:.2f}s.")
+    return 0
+
+
+if __name__ == '__main__':
+    from streamlit import runtime
+
+    if runtime.exists():
+        pagina_streamlit()
+    else:
+        sys.exit(main())
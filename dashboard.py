@@ -1,11 +1,19 @@
 import streamlit as st
 import pandas as pd
-import psycopg2
 from datetime import datetime, timedelta
+import hmac
 import pytz
 import plotly.express as px
 import plotly.graph_objects as go
 
+import ao_vivo
+import banco
+import metricas
+import migracoes
+import projecao
+import repositorio
+import usuarios
+
 # 1. CONFIGURAÇÃO VISUAL
 st.set_page_config(page_title="Leo's Nutrition Dash", page_icon="🦁", layout="wide", initial_sidebar_state="collapsed")
 
@@ -31,59 +39,124 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
-# --- 2. METAS REAIS (Baseadas no PDF Marcela Mello) ---
-META_KCAL = 1650
-META_PROTEINA = 110  
-META_CARBO = 200     
-META_GORDURA = 50    
-META_PESO = 120.0
-PERDA_SEMANAL_KG = 0.8
-
-# --- 3. CONEXÃO E DADOS ---
-@st.cache_resource(ttl=300)
-def get_connection():
-    return psycopg2.connect(st.secrets["DATABASE_URL"])
+# --- 2. CONEXÃO E DADOS ---
+def get_pool():
+    return banco.obter_pool(st.secrets["DATABASE_URL"])
 
 def get_now_br():
     return datetime.now(pytz.timezone('America/Sao_Paulo'))
 
-def run_query(query, params=None):
-    try:
-        conn = get_connection()
-        with conn.cursor() as cur:
-            cur.execute("SET timezone TO 'America/Sao_Paulo';")
-            if params: return pd.read_sql(query, conn, params=params)
-            else: return pd.read_sql(query, conn)
-    except Exception as e:
-        st.error(f"Erro DB: {e}"); return pd.DataFrame()
+# Resultados guardados por (consulta, parâmetros, versão das tabelas lidas):
+# enquanto o app não escrever em consumo/peso, recarregar o painel não vai ao banco
+@st.cache_data(max_entries=64, show_spinner=False)
+def _consulta_versionada(query, params, versao):
+    return get_pool().consultar(query, params)
+
+# Modo ao vivo (?ao_vivo=1&intervalo=10): os blocos do painel se atualizam sozinhos.
+# Fica desligado por padrão para não manter uma conexão LISTEN acordando o banco.
+AO_VIVO = st.query_params.get("ao_vivo", "0").lower() in ("1", "true", "sim")
+try:
+    INTERVALO_S = max(2, int(st.query_params.get("intervalo", 10)))
+except ValueError:
+    INTERVALO_S = 10
+fragmento = st.fragment(run_every=INTERVALO_S if AO_VIVO else None)
+
+def ler_versoes():
+    # Ao vivo: versões em memória do ouvinte (LISTEN/NOTIFY), sem ir ao banco a cada tick
+    if AO_VIVO:
+        return ao_vivo.obter_ouvinte(st.secrets["DATABASE_URL"], get_pool()).versoes()
+    return repositorio.ler_versoes_dados(get_pool())
+
+def run_query(query, params=None, tabelas=('consumo',)):
+    idas_antes = banco.idas_ao_banco()
+    with metricas.obter_registro().medir('sql', query) as m:
+        try:
+            versoes = ler_versoes() if AO_VIVO else VERSOES
+            if versoes is None:
+                df = get_pool().consultar(query, params)
+            else:
+                versao = tuple(versoes.get(t, 0) for t in tabelas)
+                df = _consulta_versionada(query, params, versao)
+            m['linhas'] = len(df)
+            return df
+        except Exception as e:
+            m['erros'] = 1
+            st.error(f"Erro DB: {e}"); return pd.DataFrame()
+        finally:
+            m['idas'] = banco.idas_ao_banco() - idas_antes
+
+# Com DASH_ACCESS_TOKEN nos secrets, o painel só abre com ?token=<o mesmo valor>
+_TOKEN = st.secrets.get("DASH_ACCESS_TOKEN")
+if _TOKEN and not hmac.compare_digest(str(st.query_params.get("token", "")).encode(), str(_TOKEN).encode()):
+    st.error("Acesso negado.")
+    st.stop()
 
 # Carga de Dados
-hoje = get_now_br().date()
-if st.query_params.get("token") != st.secrets.get("DASH_ACCESS_TOKEN", st.query_params.get("token")): pass 
-
-df_hoje = run_query("SELECT * FROM public.consumo WHERE data = %s", (hoje,))
-df_hist = run_query("""
-    SELECT data, 
-           SUM(kcal) as tkcal, SUM(proteina) as tprot, 
-           SUM(carbo) as tcarb, SUM(gordura) as tgord 
-    FROM public.consumo 
-    WHERE data >= %s 
-    GROUP BY data ORDER BY data ASC
-""", (hoje - timedelta(days=30),))
-df_peso = run_query("SELECT * FROM public.peso ORDER BY data ASC")
+try:
+    migracoes.garantir_esquema(get_pool())
+    # Uma leitura minúscula por carga: as versões que os triggers incrementam a cada escrita
+    VERSOES = None if AO_VIVO else ler_versoes()
+except Exception as e:
+    st.error(f"Erro DB: {e}")
+    VERSOES = None
+
+# --- 3. USUÁRIO E METAS (?usuario=login&token=...; sem o parâmetro, o usuário 1) ---
+# Lido sem cache a cada carga: metas alteradas no app aparecem no próximo refresh
+try:
+    _login = st.query_params.get("usuario")
+    USUARIO = usuarios.obter_por_login(get_pool(), _login, cache=False) if _login else usuarios.obter_usuario(get_pool(), usuarios.USUARIO_PADRAO, cache=False)
+except Exception as e:
+    st.error(f"Erro DB: {e}")
+    USUARIO = None
+if USUARIO is None:
+    st.error("Usuário não encontrado.")
+    st.stop()
+USUARIO.pop('senha_hash', None)
+# O painel do usuário 1 abre só com o token; o de qualquer outro pede a senha dele (uma vez por sessão)
+if USUARIO['id'] != usuarios.USUARIO_PADRAO and st.session_state.get("usuario_painel") != USUARIO['id']:
+    st.title(f"🦁 Painel de {USUARIO['nome']}")
+    senha = st.text_input("Senha:", type="password")
+    if st.button("Entrar"):
+        try:
+            autenticado = usuarios.autenticar(get_pool(), USUARIO['login'], senha, st.secrets.get("PASSWORD", "admin"))
+        except Exception as e:
+            st.error(f"Erro DB: {e}")
+            st.stop()
+        if autenticado:
+            st.session_state["usuario_painel"] = USUARIO['id']
+            st.rerun()
+        st.error("Senha incorreta!")
+    st.stop()
+USER_ID = USUARIO['id']
+META_KCAL = USUARIO['meta_kcal']
+META_PROTEINA = USUARIO['meta_proteina']
+META_CARBO = USUARIO['meta_carbo']
+META_GORDURA = USUARIO['meta_gordura']
+META_PESO = USUARIO['meta_peso']
+PERDA_SEMANAL_KG = USUARIO['perda_semanal_kg']
+
+def carregar_hoje(hoje):
+    return run_query("SELECT * FROM public.consumo WHERE user_id = %s AND data = %s", (USER_ID, hoje))
+
+def carregar_hist(hoje):
+    return run_query("""
+        SELECT data, 
+               kcal as tkcal, proteina as tprot, 
+               carbo as tcarb, gordura as tgord 
+        FROM public.consumo_diario 
+        WHERE user_id = %s AND data >= %s 
+        ORDER BY data ASC
+    """, (USER_ID, hoje - timedelta(days=30)))
+
+def carregar_peso():
+    return run_query("SELECT * FROM public.peso WHERE user_id = %s ORDER BY data ASC", (USER_ID,), tabelas=('peso',))
 
 # --- 4. INDICADOR DE GLÚTEN ---
-tem_gluten = False
-itens_gluten = []
-if not df_hoje.empty:
-    col_gluten = df_hoje['gluten'].astype(str).str.lower()
-    filtro = df_hoje[
-        (col_gluten.str.contains('contém', na=False) & ~col_gluten.str.contains('não', na=False)) | 
-        (col_gluten == 'sim')
-    ]
-    if not filtro.empty:
-        tem_gluten = True
-        itens_gluten = filtro['alimento'].unique().tolist()
+# contem_gluten é classificado pelo banco na escrita (migração 6): aqui é só um filtro booleano
+def itens_com_gluten(df_hoje):
+    if df_hoje.empty:
+        return []
+    return df_hoje.loc[df_hoje['contem_gluten'].eq(True), 'alimento'].unique().tolist()
 
 # --- HELPER: FUNÇÃO PARA GERAR GRÁFICOS ---
 def create_macro_chart(df, date_col, val_col, meta_val, title, color):
@@ -112,122 +185,145 @@ def create_macro_chart(df, date_col, val_col, meta_val, title, color):
     )
     return fig
 
+def metric_card(col, label, actual, target, suffix=""):
+    delta = actual - target
+    color = "inverse" if (label in ["🔥 Calorias", "🥑 Gordura"] and delta > 0) else "normal"
+    col.metric(label, f"{int(actual)}{suffix}", f"Meta: {target:g}{suffix}", delta_color="off")
+    percent = min(actual / target, 1.0) if target > 0 else 0
+    col.progress(percent)
+
+def totais_hoje(df_hoje):
+    if df_hoje.empty:
+        return 0, 0, 0, 0
+    return df_hoje['kcal'].sum(), df_hoje['proteina'].sum(), df_hoje['carbo'].sum(), df_hoje['gordura'].sum()
+
 # --- 5. INTERFACE DO DASHBOARD ---
+# Cada bloco é um fragment: no modo ao vivo ele roda de novo a cada INTERVALO_S,
+# mas só consulta o banco quando a versão das tabelas que lê mudou.
 
-# Header
-c1, c2 = st.columns([3, 1])
-c1.markdown("# 🦁 Leo's Performance")
-c2.markdown(f"### {hoje.strftime('%d/%m')}")
+@fragmento
+def secao_resumo():
+    hoje = get_now_br().date()
+    df_hoje = carregar_hoje(hoje)
+    itens_gluten = itens_com_gluten(df_hoje)
 
-if tem_gluten:
-    st.error(f"⚠️ **GLÚTEN DETECTADO:** {', '.join(itens_gluten)}")
-else:
-    st.success("✅ **Dieta Limpa (Glúten-Free)**")
+    # Header
+    c1, c2 = st.columns([3, 1])
+    c1.markdown("# 🦁 Leo's Performance")
+    c2.markdown(f"### {hoje.strftime('%d/%m')}")
+    if AO_VIVO:
+        ouvinte = ao_vivo.obter_ouvinte(st.secrets["DATABASE_URL"], get_pool())
+        modo = "LISTEN" if ouvinte.escutando else "poll"
+        c2.caption(f"🔴 Ao vivo ({modo}) · atualizado {get_now_br().strftime('%H:%M:%S')}")
 
-st.markdown("---")
+    if itens_gluten:
+        st.error(f"⚠️ **GLÚTEN DETECTADO:** {', '.join(itens_gluten)}")
+    else:
+        st.success("✅ **Dieta Limpa (Glúten-Free)**")
 
-# --- SEÇÃO 1: KPI MACROS ---
-k_act = df_hoje['kcal'].sum() if not df_hoje.empty else 0
-p_act = df_hoje['proteina'].sum() if not df_hoje.empty else 0
-c_act = df_hoje['carbo'].sum() if not df_hoje.empty else 0
-g_act = df_hoje['gordura'].sum() if not df_hoje.empty else 0
+    st.markdown("---")
 
-cols = st.columns(4)
+    # --- SEÇÃO 1: KPI MACROS ---
+    k_act, p_act, c_act, g_act = totais_hoje(df_hoje)
+    cols = st.columns(4)
+    metric_card(cols[0], "🔥 Calorias", k_act, META_KCAL)
+    metric_card(cols[1], "🥩 Proteína", p_act, META_PROTEINA, "g")
+    metric_card(cols[2], "🍞 Carbo", c_act, META_CARBO, "g")
+    metric_card(cols[3], "🥑 Gordura", g_act, META_GORDURA, "g")
 
-def metric_card(col, label, actual, target, suffix=""):
-    delta = actual - target
-    color = "inverse" if (label in ["🔥 Calorias", "🥑 Gordura"] and delta > 0) else "normal"
-    col.metric(label, f"{int(actual)}{suffix}", f"Meta: {target}{suffix}", delta_color="off")
-    percent = min(actual / target, 1.0) if target > 0 else 0
-    col.progress(percent)
+@fragmento
+def secao_principal():
+    hoje = get_now_br().date()
+    df_hist = carregar_hist(hoje)
+    k_act, p_act, c_act, g_act = totais_hoje(carregar_hoje(hoje))
 
-metric_card(cols[0], "🔥 Calorias", k_act, META_KCAL)
-metric_card(cols[1], "🥩 Proteína", p_act, META_PROTEINA, "g")
-metric_card(cols[2], "🍞 Carbo", c_act, META_CARBO, "g")
-metric_card(cols[3], "🥑 Gordura", g_act, META_GORDURA, "g")
+    # --- SEÇÃO 2: PRINCIPAL (Calorias e Distribuição) ---
+    g1, g2 = st.columns([2, 1])
 
-st.markdown("---")
+    with g1:
+        st.subheader("📊 Calorias vs Meta (30 dias)")
+        if not df_hist.empty:
+            fig = go.Figure()
+            fig.add_trace(go.Bar(x=df_hist['data'], y=df_hist['tkcal'], name='Kcal', marker_color='#4CAF50'))
+            fig.add_trace(go.Scatter(x=df_hist['data'], y=[META_KCAL]*len(df_hist), mode='lines', name='Meta', line=dict(color='red', width=3, dash='dot')))
+            fig.update_layout(height=320, margin=dict(l=20, r=20, t=20, b=20), legend=dict(orientation="h", y=1.1))
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("Sem dados históricos.")
 
-# --- SEÇÃO 2: PRINCIPAL (Calorias e Distribuição) ---
-g1, g2 = st.columns([2, 1])
+    with g2:
+        st.subheader("🎯 Distribuição Hoje")
+        if k_act > 0:
+            labels = ['Proteína', 'Carbo', 'Gordura']
+            values = [p_act * 4, c_act * 4, g_act * 9]
+            colors = ['#3366CC', '#FF9900', '#DC3912']
+            fig_pie = go.Figure(data=[go.Pie(labels=labels, values=values, hole=.5, marker=dict(colors=colors))])
+            fig_pie.update_layout(height=320, margin=dict(l=20, r=20, t=20, b=20), showlegend=True)
+            st.plotly_chart(fig_pie, use_container_width=True)
+        else:
+            st.info("Registre para ver.")
 
-with g1:
-    st.subheader("📊 Calorias vs Meta (30 dias)")
+    # --- SEÇÃO 3: CONTROLE DE MACROS (NOVOS GRÁFICOS) ---
+    st.subheader("🔍 Controle Semanal de Macros")
     if not df_hist.empty:
-        fig = go.Figure()
-        fig.add_trace(go.Bar(x=df_hist['data'], y=df_hist['tkcal'], name='Kcal', marker_color='#4CAF50'))
-        fig.add_trace(go.Scatter(x=df_hist['data'], y=[META_KCAL]*len(df_hist), mode='lines', name='Meta', line=dict(color='red', width=3, dash='dot')))
-        fig.update_layout(height=320, margin=dict(l=20, r=20, t=20, b=20), legend=dict(orientation="h", y=1.1))
-        st.plotly_chart(fig, use_container_width=True)
-    else:
-        st.info("Sem dados históricos.")
-
-with g2:
-    st.subheader("🎯 Distribuição Hoje")
-    if k_act > 0:
-        labels = ['Proteína', 'Carbo', 'Gordura']
-        values = [p_act * 4, c_act * 4, g_act * 9]
-        colors = ['#3366CC', '#FF9900', '#DC3912']
-        fig_pie = go.Figure(data=[go.Pie(labels=labels, values=values, hole=.5, marker=dict(colors=colors))])
-        fig_pie.update_layout(height=320, margin=dict(l=20, r=20, t=20, b=20), showlegend=True)
-        st.plotly_chart(fig_pie, use_container_width=True)
-    else:
-        st.info("Registre para ver.")
-
-# --- SEÇÃO 3: CONTROLE DE MACROS (NOVOS GRÁFICOS) ---
-st.subheader("🔍 Controle Semanal de Macros")
-if not df_hist.empty:
-    m1, m2, m3 = st.columns(3)
-    
-    with m1:
-        fig_p = create_macro_chart(df_hist, 'data', 'tprot', META_PROTEINA, "🥩 Proteína (Meta: 110g)", "#3366CC")
-        st.plotly_chart(fig_p, use_container_width=True)
+        m1, m2, m3 = st.columns(3)
         
-    with m2:
-        fig_c = create_macro_chart(df_hist, 'data', 'tcarb', META_CARBO, "🍞 Carbo (Meta: 200g)", "#FF9900")
-        st.plotly_chart(fig_c, use_container_width=True)
-        
-    with m3:
-        fig_g = create_macro_chart(df_hist, 'data', 'tgord', META_GORDURA, "🥑 Gordura (Meta: 50g)", "#DC3912")
-        st.plotly_chart(fig_g, use_container_width=True)
-else:
-    st.info("Sem dados para exibir gráficos de macros.")
+        with m1:
+            fig_p = create_macro_chart(df_hist, 'data', 'tprot', META_PROTEINA, f"🥩 Proteína (Meta: {META_PROTEINA:g}g)", "#3366CC")
+            st.plotly_chart(fig_p, use_container_width=True)
+            
+        with m2:
+            fig_c = create_macro_chart(df_hist, 'data', 'tcarb', META_CARBO, f"🍞 Carbo (Meta: {META_CARBO:g}g)", "#FF9900")
+            st.plotly_chart(fig_c, use_container_width=True)
+            
+        with m3:
+            fig_g = create_macro_chart(df_hist, 'data', 'tgord', META_GORDURA, f"🥑 Gordura (Meta: {META_GORDURA:g}g)", "#DC3912")
+            st.plotly_chart(fig_g, use_container_width=True)
+    else:
+        st.info("Sem dados para exibir gráficos de macros.")
 
-st.markdown("---")
+@fragmento
+def secao_peso_hoje():
+    hoje = get_now_br().date()
+    df_hoje = carregar_hoje(hoje)
+    df_peso = carregar_peso()
 
-# --- SEÇÃO 4: PESO E HOJE ---
-g3, g4 = st.columns([2, 1])
-
-with g3:
-    st.subheader("⚖️ Rumo aos 120kg")
-    if not df_peso.empty and len(df_peso) > 1:
-        df_peso['data'] = pd.to_datetime(df_peso['data'])
-        p_ini = df_peso.iloc[0]['peso_kg']; d_ini = df_peso.iloc[0]['data']
-        ultimo_dia_reg = df_peso.iloc[-1]['data']
-        dias_totais = (ultimo_dia_reg - d_ini).days + 30
-        dates_proj = [d_ini + timedelta(days=i) for i in range(dias_totais)]
-        vals_proj = [max(META_PESO, p_ini - (i * (PERDA_SEMANAL_KG/7))) for i in range(dias_totais)]
-        
-        fig_p = go.Figure()
-        fig_p.add_trace(go.Scatter(x=dates_proj, y=vals_proj, name='Meta Ideal', line=dict(color='gray', dash='dot')))
-        fig_p.add_trace(go.Scatter(x=df_peso['data'], y=df_peso['peso_kg'], name='Real', mode='lines+markers', line=dict(color='blue', width=4)))
-        fig_p.update_layout(height=300, margin=dict(l=20, r=20, t=20, b=20))
-        st.plotly_chart(fig_p, use_container_width=True)
-    else:
-        st.warning("Adicione mais registros de peso.")
-
-with g4:
-    st.subheader("🍽️ Hoje")
-    if not df_hoje.empty:
-        for i, row in df_hoje.iterrows():
-            st.markdown(f"**{row['alimento']}**")
-            c1, c2, c3 = st.columns(3)
-            c1.caption(f"🔥 {int(row['kcal'])}")
-            c2.caption(f"🥩 {int(row['proteina'])}g")
-            # Verifica glúten com lógica segura
-            g_txt = str(row['gluten']).lower()
-            if ('contém' in g_txt or 'sim' in g_txt) and 'não' not in g_txt:
-                c3.error("Glúten!")
-            st.divider()
-    else:
-        st.write("Nada registrado.")
+    # --- SEÇÃO 4: PESO E HOJE ---
+    g3, g4 = st.columns([2, 1])
+
+    with g3:
+        st.subheader(f"⚖️ Rumo aos {META_PESO:g}kg")
+        if not df_peso.empty and len(df_peso) > 1:
+            df_proj, resumo = projecao.projetar(df_peso, META_PESO, PERDA_SEMANAL_KG)
+            real = df_proj['peso_kg'].dropna()
+            tend = df_proj['tendencia'].dropna()
+            
+            fig_p = go.Figure()
+            fig_p.add_trace(go.Scatter(x=df_proj.index, y=df_proj['plano'], name='Meta Ideal', line=dict(color='gray', dash='dot')))
+            fig_p.add_trace(go.Scatter(x=real.index, y=real, name='Real', mode='lines+markers', line=dict(color='blue', width=4)))
+            fig_p.add_trace(go.Scatter(x=tend.index, y=tend, name='Tendência', line=dict(color='#00AAFF', width=2, dash='dash')))
+            fig_p.update_layout(height=300, margin=dict(l=20, r=20, t=20, b=20))
+            st.plotly_chart(fig_p, use_container_width=True)
+            st.caption(projecao.texto_previsao(resumo, META_PESO))
+        else:
+            st.warning("Adicione mais registros de peso.")
+
+    with g4:
+        st.subheader("🍽️ Hoje")
+        if not df_hoje.empty:
+            for i, row in df_hoje.iterrows():
+                st.markdown(f"**{row['alimento']}**")
+                c1, c2, c3 = st.columns(3)
+                c1.caption(f"🔥 {int(row['kcal'])}")
+                c2.caption(f"🥩 {int(row['proteina'])}g")
+                if row['contem_gluten'] is True:
+                    c3.error("Glúten!")
+                st.divider()
+        else:
+            st.write("Nada registrado.")
+
+secao_resumo()
+st.markdown("---")
+secao_principal()
+st.markdown("---")
+secao_peso_hoje()
@@ -0,0 +1,166 @@
+"""Exportação e importação do histórico de um usuário (public.consumo e public.peso) em Parquet.
+
+A exportação lê o Postgres por um cursor do lado do servidor, em lotes, e grava
+cada lote como um row group: a memória fica limitada a um lote qualquer que
+seja o histórico. Tipos colunares: data como date32, macros como float32 (o
+REAL do banco, sem perda) e alimento/glúten como strings de dicionário.
+
+A importação lê o arquivo lote a lote e manda cada um por ``COPY`` numa única
+transação: ou o arquivo inteiro entra, ou nada. Os triggers de rollup, versão e
+resumos rodam uma vez por lote. O arquivo não guarda o dono: as linhas entram
+no usuário indicado na importação.
+
+Uso:
+    python exportacao.py exportar [--usuario leo] [--pasta backups] [--tabelas consumo peso]
+    python exportacao.py importar backups/consumo.parquet [--usuario leo] [--tabela consumo] [--substituir]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+import alimentos
+import banco
+import migracoes
+import usuarios
+
+TAMANHO_LOTE = 50_000
+
+_TEXTO = pa.dictionary(pa.int32(), pa.string())
+
+# Colunas portáveis (sem id, user_id, colunas geradas nem chaves da fila offline)
+ESQUEMAS = {
+    'consumo': pa.schema([
+        ('data', pa.date32()),
+        ('alimento', _TEXTO),
+        ('quantidade', pa.float32()),
+        ('kcal', pa.float32()),
+        ('proteina', pa.float32()),
+        ('carbo', pa.float32()),
+        ('gordura', pa.float32()),
+        ('gluten', _TEXTO),
+    ]),
+    'peso': pa.schema([
+        ('data', pa.date32()),
+        ('peso_kg', pa.float32()),
+    ]),
+}
+OBRIGATORIAS = {'consumo': {'data', 'alimento'}, 'peso': {'data', 'peso_kg'}}
+
+
+def _tabela_valida(tabela):
+    if tabela not in ESQUEMAS:
+        raise ValueError(f"Tabela sem esquema de exportação: {tabela}")
+    return ESQUEMAS[tabela]
+
+
+def exportar(pool, tabela, destino, user_id, tamanho_lote=TAMANHO_LOTE):
+    """Grava as linhas do usuário em public.<tabela> em Parquet (``destino``: caminho ou arquivo binário).
+
+    Retorna ``(linhas, segundos)``.
+    """
+    esquema = _tabela_valida(tabela)
+    inicio = time.perf_counter()
+    sql = f"SELECT {', '.join(esquema.names)} FROM public.{tabela} WHERE user_id = %s ORDER BY data, id"
+    total = 0
+    with pq.ParquetWriter(destino, esquema, compression='zstd') as escritor:
+        for _, linhas in pool.consultar_em_lotes(sql, (int(user_id),), tamanho=tamanho_lote):
+            colunas = list(zip(*linhas))
+            lote = pa.Table.from_arrays(
+                [
+                    pa.array(valores, type=pa.string()).dictionary_encode() if campo.type == _TEXTO
+                    else pa.array(valores, type=campo.type)
+                    for campo, valores in zip(esquema, colunas)
+                ],
+                schema=esquema,
+            )
+            escritor.write_table(lote)
+            total += len(linhas)
+    return total, time.perf_counter() - inicio
+
+
+def importar(pool, tabela, origem, user_id, substituir=False, tamanho_lote=TAMANHO_LOTE):
+    """Carrega um Parquet em public.<tabela> por COPY, numa transação, como linhas do usuário.
+
+    O arquivo precisa ter as colunas de ``OBRIGATORIAS``; colunas desconhecidas
+    são ignoradas. Com ``substituir``, as linhas atuais do usuário são apagadas
+    antes (na mesma transação). Retorna ``(linhas, segundos)``.
+    """
+    esquema = _tabela_valida(tabela)
+    inicio = time.perf_counter()
+    arquivo = pq.ParquetFile(origem)
+    colunas = [c for c in esquema.names if c in arquivo.schema_arrow.names]
+    faltando = OBRIGATORIAS[tabela] - set(colunas)
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias ausentes no arquivo: {', '.join(sorted(faltando))}")
+    # Dicionários viram texto e os demais tipos são normalizados (float64, timestamp...) antes do CSV
+    alvo = pa.schema([esquema.field(c).with_type(pa.string() if esquema.field(c).type == _TEXTO else esquema.field(c).type) for c in colunas])
+
+    alvo = alvo.append(pa.field('user_id', pa.int32()))
+    dono = pa.scalar(int(user_id), pa.int32())
+
+    total = 0
+    with pool.transacao() as cur:
+        if substituir:
+            cur.execute(f"DELETE FROM public.{tabela} WHERE user_id = %s", (int(user_id),))
+        for lote in arquivo.iter_batches(batch_size=tamanho_lote, columns=colunas):
+            lote = pa.RecordBatch.from_arrays(
+                [pc.cast(lote.column(c), alvo.field(c).type) for c in colunas]
+                + [pa.repeat(dono, lote.num_rows)],
+                schema=alvo
+            )
+            buffer = io.BytesIO()
+            pa_csv.write_csv(lote, buffer, pa_csv.WriteOptions(include_header=False))
+            buffer.seek(0)
+            cur.copy_expert(f"COPY public.{tabela} ({', '.join(alvo.names)}) FROM STDIN WITH (FORMAT csv)", buffer)
+            total += lote.num_rows
+    if tabela == 'consumo':
+        # O COPY não passa pelo dicionário: vincula os nomes importados de uma vez
+        alimentos.preencher(pool)
+    return total, time.perf_counter() - inicio
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta/importa public.consumo e public.peso em Parquet.")
+    sub = parser.add_subparsers(dest='comando', required=True)
+    p_exp = sub.add_parser('exportar')
+    p_exp.add_argument('--pasta', default='.', help="Pasta de saída (um <tabela>.parquet por tabela)")
+    p_exp.add_argument('--tabelas', nargs='+', choices=list(ESQUEMAS), default=list(ESQUEMAS))
+    p_imp = sub.add_parser('importar')
+    p_imp.add_argument('arquivo')
+    p_imp.add_argument('--tabela', choices=list(ESQUEMAS), help="Padrão: o nome do arquivo (consumo.parquet -> consumo)")
+    p_imp.add_argument('--substituir', action='store_true', help="Apaga as linhas atuais do usuário antes de importar")
+    for p in (p_exp, p_imp):
+        p.add_argument('--usuario', help="Login do dono das linhas (padrão: o usuário 1)")
+        banco.argumento_dsn(p)
+    args = parser.parse_args(argv)
+
+    pool = banco.pool_cli(args)
+    migracoes.aplicar_migracoes(pool)
+    usuario = usuarios.obter_por_login(pool, args.usuario) if args.usuario else usuarios.obter_usuario(pool, usuarios.USUARIO_PADRAO)
+    if usuario is None:
+        parser.error(f"usuário inexistente: {args.usuario}")
+    if args.comando == 'exportar':
+        os.makedirs(args.pasta, exist_ok=True)
+        for tabela in args.tabelas:
+            caminho = os.path.join(args.pasta, f"{tabela}.parquet")
+            linhas, segundos = exportar(pool, tabela, caminho, usuario['id'])
+            print(f"{tabela}: {linhas} linha(s) em {caminho} ({segundos:.2f}s).")
+        return 0
+
+    tabela = args.tabela or os.path.splitext(os.path.basename(args.arquivo))[0]
+    if tabela not in ESQUEMAS:
+        parser.error(f"não deu para deduzir a tabela de {args.arquivo}; use --tabela")
+    linhas, segundos = importar(pool, tabela, args.arquivo, usuario['id'], substituir=args.substituir)
+    print(f"{tabela}: {linhas} linha(s) importada(s) em {segundos:.2f}s.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,288 @@
+"""Fila local (SQLite) das escritas em public.consumo e public.peso.
+
+``gravar`` tenta primeiro o Postgres (um INSERT, atômico, visível no rerun
+seguinte), esperando no máximo ``ESPERA_DIRETA_S``; com o banco inacessível ou
+lento, as linhas vão para um commit em disco local. Uma thread por processo
+drena a fila para o Postgres em lotes (um INSERT por tabela). Cada linha leva
+uma chave de idempotência (UUID), a mesma na gravação direta e na fila:
+reenviar um lote cuja confirmação se perdeu não duplica nada. Linhas que o banco recusa por erro de dados ficam marcadas como
+rejeitadas, em vez de travar a fila.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import date
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+import alimentos
+import banco
+import repositorio
+import usuarios
+
+CAMINHO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'fila_offline.sqlite3')
+
+# Tabela -> (INSERT idempotente, preparo das linhas no envio). Cada linha termina com a chave.
+# O alimento_id é resolvido só no envio: ao enfileirar, o banco pode estar fora do ar
+DESTINOS = {
+    'consumo': (repositorio.SQL_INSERIR_CONSUMO_IDEMPOTENTE, alimentos.vincular_linhas),
+    'peso': (repositorio.SQL_INSERIR_PESO_IDEMPOTENTE, None),
+}
+
+# Quanto o rerun espera pela gravação direta antes de deixar as linhas na fila
+ESPERA_DIRETA_S = 3
+
+# Linhas enfileiradas antes de existirem usuários não têm o user_id (última coluna): vão para o usuário 1
+_COLUNAS_SEM_USUARIO = {'consumo': 8, 'peso': 2}
+
+
+def _erro_de_dados(erro):
+    """Erros de dados/restrição (classes 22 e 23): reenviar a mesma linha nunca vai dar certo."""
+    return (getattr(erro, 'pgcode', None) or '')[:2] in ('22', '23')
+
+
+def _serializar(valor):
+    if isinstance(valor, date):
+        return valor.isoformat()
+    raise TypeError(f"Valor não serializável na fila: {valor!r}")
+
+
+def _desserializar(texto):
+    # A data é sempre a primeira coluna (consumo e peso)
+    linha = json.loads(texto)
+    return (date.fromisoformat(linha[0]), *linha[1:])
+
+
+def _montar(pool, tabela, registros):
+    """Linhas prontas para o INSERT: colunas da tabela (+ preparo) e a chave de idempotência no fim."""
+    _, preparar = DESTINOS[tabela]
+    linhas = [_desserializar(linha) for _, _, linha in registros]
+    linhas = [
+        (*linha, usuarios.USUARIO_PADRAO) if len(linha) == _COLUNAS_SEM_USUARIO[tabela] else linha for linha in linhas
+    ]
+    if preparar is not None:
+        linhas = preparar(pool, linhas)
+    return [(*linha, chave) for linha, (_, chave, _) in zip(linhas, registros)]
+
+
+class FilaOffline:
+    def __init__(self, caminho=CAMINHO_PADRAO):
+        self.ultimo_erro = None
+        self.ultimo_envio = None
+        self._lock = threading.Lock()
+        self._drenando = threading.Lock()
+        self._acordar = threading.Event()
+        self._thread = None
+
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._db = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # FULL: uma refeição confirmada na tela sobrevive até a queda de energia
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS pendentes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chave TEXT NOT NULL UNIQUE,
+                tabela TEXT NOT NULL,
+                linha TEXT NOT NULL,
+                criado_em REAL NOT NULL,
+                tentativas INTEGER NOT NULL DEFAULT 0,
+                rejeitado INTEGER NOT NULL DEFAULT 0,
+                erro TEXT
+            )
+        """)
+
+    # Entrada
+    def enfileirar(self, tabela, linhas, chaves=None):
+        """Grava as linhas (tuplas na ordem das colunas do INSERT) numa transação local. Retorna quantas entraram.
+
+        ``chaves``: as chaves de idempotência já usadas numa tentativa direta (senão, novas).
+        """
+        if tabela not in DESTINOS:
+            raise ValueError(f"Tabela sem destino na fila: {tabela}")
+        linhas = list(linhas)
+        if chaves is None:
+            chaves = [str(uuid.uuid4()) for _ in linhas]
+        agora = time.time()
+        registros = [
+            (chave, tabela, json.dumps(list(linha), default=_serializar), agora) for chave, linha in zip(chaves, linhas)
+        ]
+        if not registros:
+            return 0
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO pendentes (chave, tabela, linha, criado_em) VALUES (?, ?, ?, ?)", registros
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        self._acordar.set()
+        return len(registros)
+
+    def gravar(self, obter_pool, tabela, linhas, espera_s=ESPERA_DIRETA_S):
+        """Grava direto no banco num único INSERT; se o banco estiver inacessível ou lento, enfileira.
+
+        Retorna ``(quantidade, enfileirado)``. Erros de dados sobem sem gravar
+        nada (o INSERT é atômico). ``obter_pool`` como em ``iniciar_drenagem``.
+        A gravação direta e a fila usam as mesmas chaves: se o INSERT chegar ao
+        banco depois do prazo (ou sem confirmação), o envio da fila não duplica.
+        """
+        if tabela not in DESTINOS:
+            raise ValueError(f"Tabela sem destino na fila: {tabela}")
+        linhas = list(linhas)
+        if not linhas:
+            return 0, False
+        sql, preparar = DESTINOS[tabela]
+        chaves = [str(uuid.uuid4()) for _ in linhas]
+        erros = []
+
+        def direto():
+            try:
+                pool = obter_pool()
+                prontas = preparar(pool, linhas) if preparar is not None else linhas
+                pool.executar_lote(sql, [(*linha, chave) for linha, chave in zip(prontas, chaves)], repetir=True)
+            except BaseException as e:
+                erros.append(e)
+
+        # Em thread: conectar a um banco fora do ar pode levar o connect_timeout inteiro (por tentativa)
+        gravacao = threading.Thread(target=direto, name="fila-gravacao", daemon=True)
+        gravacao.start()
+        gravacao.join(espera_s)
+        if gravacao.is_alive():
+            self.ultimo_erro = f"Sem resposta do banco em {espera_s} s"
+            return self.enfileirar(tabela, linhas, chaves), True
+        if erros:
+            e = erros[0]
+            if not isinstance(e, (*banco.ERROS_CONEXAO, pg_pool.PoolError)) or getattr(e, 'pgcode', None):
+                raise e
+            self.ultimo_erro = f"{type(e).__name__}: {e}"
+            return self.enfileirar(tabela, linhas, chaves), True
+        # Banco acessível: o que tiver ficado na fila de antes segue agora, em segundo plano
+        if self._thread is not None:
+            self._acordar.set()
+        return len(linhas), False
+
+    # Situação
+    def pendentes(self):
+        """``{'consumo': n, 'peso': n, 'rejeitados': n}``."""
+        contagem = dict.fromkeys([*DESTINOS, 'rejeitados'], 0)
+        with self._lock:
+            for tabela, rejeitado, n in self._db.execute("SELECT tabela, rejeitado, COUNT(*) FROM pendentes GROUP BY 1, 2"):
+                contagem['rejeitados' if rejeitado else tabela] += n
+        return contagem
+
+    def rejeitados(self):
+        with self._lock:
+            linhas = self._db.execute("SELECT id, tabela, linha, erro, criado_em FROM pendentes WHERE rejeitado = 1 ORDER BY id").fetchall()
+        return [{'id': i, 'tabela': t, 'linha': l, 'erro': e, 'criado_em': c} for i, t, l, e, c in linhas]
+
+    def descartar_rejeitados(self):
+        with self._lock:
+            return self._db.execute("DELETE FROM pendentes WHERE rejeitado = 1").rowcount
+
+    # Envio ao Postgres
+    def _proximos(self, tabela, lote):
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, chave, linha FROM pendentes WHERE tabela = ? AND rejeitado = 0 ORDER BY id LIMIT ?",
+                (tabela, lote)
+            ).fetchall()
+
+    def _remover(self, ids):
+        with self._lock:
+            self._db.executemany("DELETE FROM pendentes WHERE id = ?", [(i,) for i in ids])
+
+    def _anotar(self, ids, erro, rejeitar=False):
+        with self._lock:
+            self._db.executemany(
+                "UPDATE pendentes SET tentativas = tentativas + 1, erro = ?, rejeitado = ? WHERE id = ?",
+                [(str(erro)[:500], int(rejeitar), i) for i in ids]
+            )
+
+    def _enviar_um_a_um(self, pool, tabela, registros):
+        """Isola as linhas recusadas de um lote com erro de dados; as demais são gravadas."""
+        sql, _ = DESTINOS[tabela]
+        for registro in registros:
+            id_ = registro[0]
+            try:
+                pool.executar_lote(sql, _montar(pool, tabela, [registro]), repetir=True)
+            except psycopg2.Error as e:
+                if not _erro_de_dados(e):
+                    self._anotar([id_], e)
+                    raise
+                self._anotar([id_], e, rejeitar=True)
+            else:
+                self._remover([id_])
+
+    def drenar(self, pool, lote=500):
+        """Envia tudo o que está pendente, um INSERT por lote. Retorna quantas linhas foram processadas.
+
+        Erros de conexão sobem e as linhas continuam na fila para a próxima tentativa.
+        Com a fila vazia, não vai ao banco (não acorda o Neon).
+        """
+        processadas = 0
+        with self._drenando:
+            for tabela, (sql, _) in DESTINOS.items():
+                while registros := self._proximos(tabela, lote):
+                    try:
+                        pool.executar_lote(sql, _montar(pool, tabela, registros), repetir=True)
+                    except psycopg2.Error as e:
+                        if not _erro_de_dados(e):
+                            self._anotar([r[0] for r in registros], e)
+                            raise
+                        self._enviar_um_a_um(pool, tabela, registros)
+                    else:
+                        self._remover([r[0] for r in registros])
+                    processadas += len(registros)
+        if processadas:
+            self.ultimo_envio = time.time()
+        self.ultimo_erro = None
+        return processadas
+
+    def iniciar_drenagem(self, obter_pool, intervalo_s=15, espera_max_s=120):
+        """Sobe (uma vez) a thread que drena a fila logo após cada enfileiramento e a cada ``intervalo_s``.
+
+        ``obter_pool`` é chamado a cada tentativa: com o banco fora do ar nem o pool
+        consegue ser criado, e a fila precisa aceitar registros mesmo assim.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._laco, args=(obter_pool, intervalo_s, espera_max_s), name="fila-offline", daemon=True
+            )
+            self._thread.start()
+
+    def _laco(self, obter_pool, intervalo_s, espera_max_s):
+        espera = 0
+        while True:
+            self._acordar.wait(espera)
+            self._acordar.clear()
+            try:
+                self.drenar(obter_pool())
+                espera = intervalo_s
+            except Exception as e:
+                # Banco fora do ar ou acordando: tenta de novo com backoff (um novo registro acorda antes)
+                self.ultimo_erro = f"{type(e).__name__}: {e}"
+                espera = min(max(espera, 1) * 2, espera_max_s)
+
+
+# --- UMA FILA POR PROCESSO E ARQUIVO ---
+_filas = {}
+_filas_lock = threading.Lock()
+
+
+def obter_fila(caminho=CAMINHO_PADRAO):
+    with _filas_lock:
+        if caminho not in _filas:
+            _filas[caminho] = FilaOffline(caminho)
+        return _filas[caminho]
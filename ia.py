@@ -0,0 +1,369 @@
+"""Integração com a IA (Groq): interpretação de texto livre em alimentos e macros."""
+import json
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+
+import groq
+import pytz
+from groq import Groq
+
+import metricas
+from cache_ia import CacheRespostasIA, gerar_chave
+
+MODELO = "llama-3.3-70b-versatile"
+
+# --- LIMITE DE TAXA DA GROQ (compartilhado entre as threads do lote) ---
+TENTATIVAS_LIMITE = 4
+_pausa_ate = 0.0
+_pausa_lock = threading.Lock()
+
+def _aguardar_pausa():
+    """Bloqueia enquanto a Groq pediu para esperar (um 429 pausa todas as threads, não só a que o recebeu)."""
+    while True:
+        with _pausa_lock:
+            espera = _pausa_ate - time.monotonic()
+        if espera <= 0:
+            return
+        time.sleep(espera)
+
+def _pausar(erro, tentativa):
+    global _pausa_ate
+    try:
+        espera = float(erro.response.headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        # Sem Retry-After: backoff exponencial com jitter para as threads não voltarem juntas
+        espera = min(2 ** tentativa, 30) + random.uniform(0, 1)
+    with _pausa_lock:
+        _pausa_ate = max(_pausa_ate, time.monotonic() + espera)
+
+# --- TEXTO -> GROQ (JSON + ANÁLISE) ---
+def _chamar_groq(texto_usuario, api_key, data_hoje, ao_receber=None):
+    """Envia texto para Groq e retorna JSON com 'analise' e 'alimentos'.
+
+    Com ``ao_receber(analise_parcial, itens)`` a resposta vem em streaming e o
+    callback é chamado a cada trecho novo da análise ou item completo.
+    """
+    # Sem retentativas do SDK: o 429 é tratado abaixo, com pausa compartilhada
+    client = Groq(api_key=api_key, max_retries=0)
+    
+    prompt_system = f"""
+    Aja como um nutricionista focado em:
+    1. Dieta Sem Glúten (Restrição severa).
+    2. Controle de Ansiedade (Alimentos anti-inflamatórios).
+    3. Hipertrofia (Meta proteica).
+    
+    Hoje é: {data_hoje.strftime('%Y-%m-%d')}.
+    
+    Sua tarefa:
+    1. Analisar o texto do usuário.
+    2. Gerar uma breve "analise" (máx 3 frases): Destaque pontos positivos ou negativos (ex: alertar sobre glúten ou excesso de gordura/açúcar, elogiar proteína).
+    3. Gerar a lista técnica "alimentos" com macros estimados.
+    
+    SAÍDA OBRIGATÓRIA: Um JSON com duas chaves ("analise" e "alimentos").
+    Exemplo:
+    {{
+        "analise": "Cuidado! O pastel é frito e a massa tem glúten, o que pode aumentar a inflamação. Tente evitar.",
+        "alimentos": [
+            {{
+                "data": "AAAA-MM-DD",
+                "alimento": "Pastel de Carne Frito",
+                "quantidade_g": 100,
+                "kcal": 350,
+                "p": 10,
+                "c": 35,
+                "g": 20,
+                "gluten": "Contém"
+            }}
+        ]
+    }}
+    """
+
+    try:
+        for tentativa in range(TENTATIVAS_LIMITE):
+            _aguardar_pausa()
+            try:
+                with metricas.obter_registro().medir('ia', f"groq {MODELO}") as m:
+                    parametros = dict(
+                        messages=[
+                            {"role": "system", "content": prompt_system},
+                            {"role": "user", "content": texto_usuario}
+                        ],
+                        model=MODELO,
+                        temperature=0.3, # Um pouco de criatividade para a análise
+                    )
+                    if ao_receber is None:
+                        completion = client.chat.completions.create(**parametros, response_format={"type": "json_object"})
+                        resposta_json, uso = completion.choices[0].message.content, completion.usage
+                    else:
+                        # O modo JSON da Groq não aceita streaming: o formato vem só do prompt
+                        stream = client.chat.completions.create(**parametros, stream=True)
+                        resposta_json, uso = _ler_stream(stream, ao_receber)
+                    if uso:
+                        m['tokens_entrada'] = uso.prompt_tokens
+                        m['tokens_saida'] = uso.completion_tokens
+                break
+            except groq.RateLimitError as e:
+                if tentativa + 1 >= TENTATIVAS_LIMITE:
+                    return False, "Limite de requisições da IA atingido. Tente de novo em alguns instantes."
+                _pausar(e, tentativa)
+        
+        dados = json.loads(resposta_json)
+        
+        # Garante estrutura
+        if "alimentos" not in dados:
+             # Fallback caso a IA esqueça a estrutura (raro)
+             return False, "Erro na estrutura do JSON da IA."
+            
+        return True, dados
+    except Exception as e:
+        return False, f"Erro na IA: {e}"
+
+
+# --- STREAMING: JSON LIDO CONFORME CHEGA ---
+def _decodificar_parcial(bruto):
+    """Decodifica o miolo de uma string JSON ainda aberta (ignora um escape cortado no fim)."""
+    for corte in range(0, 7):
+        try:
+            return json.loads('"' + bruto[:len(bruto) - corte] + '"')
+        except ValueError:
+            continue
+    return ''
+
+class LeitorJsonIncremental:
+    """Lê o JSON da IA em pedaços, sem esperar o fim da resposta.
+
+    Mantém em ``analise`` o texto (parcial) da chave "analise" e em ``itens`` cada
+    objeto de "alimentos" assim que ele fecha. Texto antes do primeiro '{' (ex:
+    cerca de markdown) é ignorado.
+    """
+
+    def __init__(self):
+        self.texto = ''
+        self.analise = ''
+        self.itens = []
+        self._pos = 0
+        self._pilha = []          # (tipo, chave do contêiner no objeto pai)
+        self._chave = None        # última chave lida
+        self._esperando_chave = False
+        self._em_string = False
+        self._escape = False
+        self._inicio_string = None
+        self._na_analise = False
+        self._inicio_item = None
+
+    def alimentar(self, pedaco):
+        """Processa mais um trecho da resposta. Retorna os itens que acabaram de fechar."""
+        self.texto += pedaco
+        t, novos = self.texto, []
+        for i in range(self._pos, len(t)):
+            ch = t[i]
+            if self._em_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._em_string = False
+                    if self._esperando_chave:
+                        self._chave = json.loads(t[self._inicio_string:i + 1])
+                    elif self._na_analise:
+                        self.analise = json.loads(t[self._inicio_string:i + 1])
+                        self._na_analise = False
+                continue
+            if not self._pilha and ch != '{':
+                continue
+            if ch == '"':
+                self._em_string, self._inicio_string = True, i
+                self._na_analise = not self._esperando_chave and len(self._pilha) == 1 and self._chave == 'analise'
+            elif ch in '{[':
+                if ch == '{' and self._pilha == [('obj', None), ('arr', 'alimentos')]:
+                    self._inicio_item = i
+                chave = self._chave if self._pilha and self._pilha[-1][0] == 'obj' else None
+                self._pilha.append(('obj' if ch == '{' else 'arr', chave))
+                self._esperando_chave = ch == '{'
+            elif ch in '}]':
+                self._pilha.pop()
+                if ch == '}' and self._inicio_item is not None and len(self._pilha) == 2:
+                    try:
+                        novos.append(json.loads(t[self._inicio_item:i + 1]))
+                    except ValueError:
+                        pass
+                    self._inicio_item = None
+                self._esperando_chave = False
+            elif ch == ':':
+                self._esperando_chave = False
+            elif ch == ',':
+                self._esperando_chave = self._pilha[-1][0] == 'obj'
+        self._pos = len(t)
+        if self._em_string and self._na_analise:
+            self.analise = _decodificar_parcial(t[self._inicio_string + 1:])
+        self.itens.extend(novos)
+        return novos
+
+    def json_completo(self):
+        """O objeto JSON inteiro recebido (do primeiro '{' ao último '}')."""
+        return self.texto[self.texto.find('{'):self.texto.rfind('}') + 1]
+
+def _ler_stream(stream, ao_receber):
+    """Consome o stream da Groq chamando ``ao_receber`` a cada novidade. Retorna (json, uso de tokens)."""
+    leitor, uso = LeitorJsonIncremental(), None
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            antes = leitor.analise
+            if leitor.alimentar(chunk.choices[0].delta.content) or leitor.analise != antes:
+                ao_receber(leitor.analise, list(leitor.itens))
+        # A Groq manda o uso de tokens no último chunk, em x_groq
+        extra = getattr(chunk, 'x_groq', None)
+        if extra is not None and getattr(extra, 'usage', None):
+            uso = extra.usage
+    return leitor.json_completo(), uso
+
+
+# --- CACHE DE RESPOSTAS (vive no processo, entre reruns e sessões) ---
+_cache = None
+_cache_lock = threading.Lock()
+
+def obter_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CacheRespostasIA()
+        return _cache
+
+def _hoje():
+    return datetime.now(pytz.timezone('America/Sao_Paulo')).date()
+
+def processar_texto_ia(texto_usuario, api_key, data_hoje=None, usar_cache=True, ao_receber=None):
+    """Retorna (sucesso, dados) para o texto, consultando o cache antes da API.
+
+    Cliques repetidos com o mesmo texto (mesmo dia) aguardam a chamada em andamento.
+    Com ``ao_receber`` a resposta chega em streaming (ver ``_chamar_groq``); vinda
+    do cache, o callback recebe o resultado completo de uma vez.
+    """
+    data_hoje = data_hoje or _hoje()
+    if not usar_cache:
+        return _chamar_groq(texto_usuario, api_key, data_hoje, ao_receber)
+    chave = gerar_chave(texto_usuario, data_hoje)
+    chamou_api = []
+
+    def calcular():
+        chamou_api.append(True)
+        return _chamar_groq(texto_usuario, api_key, data_hoje, ao_receber)
+
+    with metricas.obter_registro().medir('ia', 'processar_texto_ia') as m:
+        resultado = obter_cache().obter_ou_calcular(chave, calcular)
+        m['acertos_cache'] = 0 if chamou_api else 1
+    sucesso, dados = resultado
+    if ao_receber and sucesso and not chamou_api:
+        ao_receber(dados.get("analise", ""), dados.get("alimentos", []))
+    return resultado
+
+
+# --- TACO PRIMEIRO, IA SÓ PARA O QUE SOBRAR ---
+def _analise_local(itens):
+    nomes_gluten = [i['alimento'] for i in itens if i['gluten'] == 'Contém']
+    texto = "Macros calculados localmente pela tabela TACO (sem IA)."
+    if nomes_gluten:
+        texto += f" Cuidado! Contém glúten: {', '.join(nomes_gluten)}."
+    return texto
+
+def processar_refeicao(texto_usuario, api_key, indice=None, data_hoje=None, ao_receber=None):
+    """Resolve pela TACO os itens com quantidade e alimento conhecidos; o restante vai para a IA.
+
+    Retorna (sucesso, dados) no mesmo formato de processar_texto_ia. ``ao_receber``
+    recebe a análise parcial da IA e os itens já prontos (TACO primeiro).
+    """
+    data_hoje = data_hoje or _hoje()
+    itens, pendentes = indice.resolver(texto_usuario, data_hoje) if indice else ([], [texto_usuario])
+    if not pendentes:
+        return True, {"analise": _analise_local(itens), "alimentos": itens}
+    if not api_key:
+        return False, "⚠️ Configure a GROQ_API_KEY nos secrets! (itens não reconhecidos pela TACO: " + ", ".join(pendentes) + ")"
+
+    repassar = (lambda analise, itens_ia: ao_receber(analise, itens + itens_ia)) if ao_receber else None
+    sucesso, dados = processar_texto_ia(" + ".join(pendentes), api_key, data_hoje, ao_receber=repassar)
+    if not sucesso:
+        return False, dados
+    analise = dados.get("analise", "Sem análise.")
+    if itens:
+        analise = f"{analise}\n\n{_analise_local(itens)}"
+    return True, {"analise": analise, "alimentos": itens + dados.get("alimentos", [])}
+
+
+# --- LOTE: VÁRIAS REFEIÇÕES/DIAS EM PARALELO ---
+# "12/10: almoço ..." ou uma linha só com a data ("12/10", "2026-10-12:") muda o dia das linhas seguintes
+RE_DATA_BR = re.compile(r'^\s*(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?\s*(?::\s*(.*))?$')
+RE_DATA_ISO = re.compile(r'^\s*(\d{4})-(\d{1,2})-(\d{1,2})\s*(?::\s*(.*))?$')
+
+def _data_da_linha(linha, hoje):
+    """Retorna ``(data, resto)`` se a linha começa com uma data de cabeçalho; senão None."""
+    m = RE_DATA_ISO.match(linha)
+    if m:
+        ano, mes, dia, resto, ano_informado = int(m[1]), int(m[2]), int(m[3]), m[4], True
+    else:
+        m = RE_DATA_BR.match(linha)
+        if not m:
+            return None
+        dia, mes, resto, ano_informado = int(m[1]), int(m[2]), m[4], bool(m[3])
+        ano = int(m[3]) if m[3] else hoje.year
+        if ano < 100:
+            ano += 2000
+    try:
+        data = date(ano, mes, dia)
+        # Sem ano é um dia passado (atraso sendo posto em dia): dezembro digitado em janeiro é do ano anterior
+        if not ano_informado and data > hoje:
+            data = data.replace(year=ano - 1)
+    except ValueError:
+        return None
+    return data, (resto or '').strip()
+
+def separar_refeicoes(texto, hoje=None):
+    """Quebra o texto em refeições (uma por linha), cada uma com sua data.
+
+    Retorna ``[(data ou None, texto)]``; None = sem cabeçalho de data (a IA decide, como no modo normal).
+    """
+    hoje = hoje or _hoje()
+    refeicoes, data_atual = [], None
+    for linha in texto.splitlines():
+        linha = linha.strip(' \t-•*')
+        if not linha:
+            continue
+        cabecalho = _data_da_linha(linha, hoje)
+        if cabecalho:
+            data_atual, linha = cabecalho
+            if not linha:
+                continue
+        refeicoes.append((data_atual, linha))
+    return refeicoes
+
+def _processar_refeicao_lote(texto, api_key, indice, data, hoje):
+    sucesso, dados = processar_refeicao(texto, api_key, indice, data or hoje)
+    if sucesso and data:
+        # Dia explícito no cabeçalho vale mais que a data que a IA deduziu
+        for item in dados.get("alimentos", []):
+            if isinstance(item, dict):
+                item["data"] = data.isoformat()
+    return sucesso, dados
+
+def processar_lote(refeicoes, api_key, indice=None, max_concorrencia=4, hoje=None):
+    """Processa várias refeições em paralelo, com no máximo ``max_concorrencia`` chamadas à Groq por vez.
+
+    ``refeicoes`` vem de ``separar_refeicoes``. Gera ``(posicao, sucesso, dados)`` na ordem em que
+    cada uma termina, para a interface mostrar os resultados conforme chegam. Nada é gravado aqui.
+    """
+    hoje = hoje or _hoje()
+    with ThreadPoolExecutor(max_workers=max_concorrencia, thread_name_prefix="ia-lote") as executor:
+        futuros = {
+            executor.submit(_processar_refeicao_lote, texto, api_key, indice, data, hoje): i
+            for i, (data, texto) in enumerate(refeicoes)
+        }
+        for futuro in as_completed(futuros):
+            try:
+                sucesso, dados = futuro.result()
+            except Exception as e:
+                sucesso, dados = False, f"Erro na IA: {e}"
+            yield futuros[futuro], sucesso, dados
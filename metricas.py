@@ -0,0 +1,100 @@
+"""Métricas de tempo dos caminhos quentes (banco, IA e renderização das seções).
+
+Cada evento vai para um ring buffer em memória do processo (os mais antigos
+saem quando ele enche), então instrumentar não custa I/O. A aba Admin mostra o
+resumo por p50/p95 e pode exportar os eventos para um arquivo JSONL local.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+CAMINHO_EXPORTACAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'metricas.jsonl')
+
+
+def _rotulo(nome):
+    """SQL ou nome com espaços normalizados, para agrupar chamadas iguais."""
+    return re.sub(r'\s+', ' ', str(nome)).strip()
+
+
+class RegistroMetricas:
+    def __init__(self, capacidade=5000):
+        self._eventos = deque(maxlen=capacidade)
+        self._lock = threading.Lock()
+        # Contadores de eventos desde o início: quantos entraram e quantos já foram exportados
+        self._registrados = 0
+        self._exportados = 0
+
+    def registrar(self, tipo, nome, duracao_s, **dados):
+        """Guarda um evento ``{ts, tipo, nome, duracao_ms, **dados}`` (ex: linhas, idas, tokens)."""
+        evento = {'ts': time.time(), 'tipo': tipo, 'nome': _rotulo(nome), 'duracao_ms': round(duracao_s * 1000, 3), **dados}
+        with self._lock:
+            self._eventos.append(evento)
+            self._registrados += 1
+
+    @contextmanager
+    def medir(self, tipo, nome, **dados):
+        """Mede o bloco; o dict entregue pode ser preenchido com dados extras (ex: ``d['linhas'] = n``)."""
+        dados = dict(dados)
+        inicio = time.perf_counter()
+        try:
+            yield dados
+        finally:
+            self.registrar(tipo, nome, time.perf_counter() - inicio, **dados)
+
+    def eventos(self):
+        with self._lock:
+            return list(self._eventos)
+
+    def resumo(self):
+        """DataFrame por (tipo, nome): chamadas, p50/p95/máx/total em ms e a soma dos dados numéricos."""
+        df = pd.DataFrame(self.eventos())
+        if df.empty:
+            return pd.DataFrame(columns=['tipo', 'nome', 'chamadas', 'p50_ms', 'p95_ms', 'max_ms', 'total_ms'])
+        grupos = df.groupby(['tipo', 'nome'], sort=False)
+        resumo = grupos['duracao_ms'].agg(
+            chamadas='count',
+            p50_ms=lambda s: s.quantile(0.5),
+            p95_ms=lambda s: s.quantile(0.95),
+            max_ms='max',
+            total_ms='sum',
+        )
+        extras = [c for c in df.columns if c not in ('ts', 'tipo', 'nome', 'duracao_ms') and pd.api.types.is_numeric_dtype(df[c])]
+        if extras:
+            resumo = resumo.join(grupos[extras].sum(min_count=1))
+        return resumo.reset_index().sort_values('total_ms', ascending=False, ignore_index=True).round(3)
+
+    def exportar(self, caminho=CAMINHO_EXPORTACAO):
+        """Acrescenta ao arquivo JSONL só os eventos novos desde a última exportação. Retorna quantos foram gravados.
+
+        O buffer não é esvaziado (o resumo da aba Admin continua com todos). Eventos
+        que saíram do buffer antes de serem exportados se perdem.
+        """
+        with self._lock:
+            novos = min(self._registrados - self._exportados, len(self._eventos))
+            eventos = list(self._eventos)[len(self._eventos) - novos:]
+            marca = self._registrados
+        os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+        with open(caminho, 'a', encoding='utf-8') as f:
+            for evento in eventos:
+                f.write(json.dumps(evento, ensure_ascii=False, default=str) + '\n')
+        with self._lock:
+            self._exportados = max(self._exportados, marca)
+        return len(eventos)
+
+    def limpar(self):
+        with self._lock:
+            self._eventos.clear()
+
+
+# --- UM REGISTRO POR PROCESSO ---
+_registro = RegistroMetricas()
+
+
+def obter_registro():
+    return _registro
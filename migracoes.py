@@ -0,0 +1,206 @@
+"""Migrações versionadas do esquema do banco.
+
+Cada migração é aplicada uma única vez, numa transação, e registrada em
+public.schema_versao. O app chama ``garantir_esquema`` a cada rerun, mas só a
+primeira chamada do processo vai ao banco (e, com o esquema em dia, faz apenas
+um SELECT): reruns seguintes não fazem nenhum round trip de DDL.
+
+Uso pela linha de comando:
+    python migracoes.py            # aplica as pendentes
+    python migracoes.py --status   # mostra a versão atual
+"""
+import argparse
+import sys
+import threading
+import weakref
+
+import psycopg2
+
+import agregados
+import alimentos
+import analises
+import banco
+import usuarios
+
+# Chave do advisory lock que serializa migrações concorrentes (vários processos do Streamlit)
+CHAVE_LOCK = 7_202_601
+
+# (versão, descrição, comandos SQL) — nunca editar uma migração já publicada; crie outra
+MIGRACOES = [
+    (1, "Tabelas iniciais", [
+        "CREATE TABLE IF NOT EXISTS public.consumo (id SERIAL PRIMARY KEY, data DATE, alimento TEXT, quantidade REAL, kcal REAL, proteina REAL, carbo REAL, gordura REAL, gluten TEXT DEFAULT 'Não informado');",
+        "CREATE TABLE IF NOT EXISTS public.peso (id SERIAL PRIMARY KEY, data DATE, peso_kg REAL);",
+        "CREATE TABLE IF NOT EXISTS public.tabela_taco (id SERIAL PRIMARY KEY, alimento TEXT, kcal REAL, proteina REAL, carbo REAL, gordura REAL);",
+    ]),
+    (2, "Rollup diário public.consumo_diario", agregados.SQL_CONSUMO_DIARIO + agregados.SQL_RECONSTRUIR),
+    (3, "Índices de data e restrições de consumo/peso", [
+        "CREATE INDEX IF NOT EXISTS idx_consumo_data_id ON public.consumo (data, id);",
+        "CREATE INDEX IF NOT EXISTS idx_peso_data ON public.peso (data);",
+        # Macros nulos somam como zero em todo o app: vira NOT NULL DEFAULT 0
+        "UPDATE public.consumo SET kcal = COALESCE(kcal, 0), proteina = COALESCE(proteina, 0), carbo = COALESCE(carbo, 0), gordura = COALESCE(gordura, 0), alimento = COALESCE(NULLIF(btrim(alimento), ''), '?') WHERE kcal IS NULL OR proteina IS NULL OR carbo IS NULL OR gordura IS NULL OR alimento IS NULL OR btrim(alimento) = '';",
+        """ALTER TABLE public.consumo
+            ALTER COLUMN data SET DEFAULT CURRENT_DATE,
+            ALTER COLUMN alimento SET NOT NULL,
+            ALTER COLUMN kcal SET DEFAULT 0, ALTER COLUMN kcal SET NOT NULL,
+            ALTER COLUMN proteina SET DEFAULT 0, ALTER COLUMN proteina SET NOT NULL,
+            ALTER COLUMN carbo SET DEFAULT 0, ALTER COLUMN carbo SET NOT NULL,
+            ALTER COLUMN gordura SET DEFAULT 0, ALTER COLUMN gordura SET NOT NULL;""",
+        # NOT VALID: valem para linhas novas sem reprovar o histórico legado (ex: data nula)
+        """ALTER TABLE public.consumo
+            ADD CONSTRAINT consumo_data_obrigatoria CHECK (data IS NOT NULL) NOT VALID,
+            ADD CONSTRAINT consumo_valores_positivos CHECK (quantidade >= 0 AND kcal >= 0 AND proteina >= 0 AND carbo >= 0 AND gordura >= 0) NOT VALID;""",
+        """ALTER TABLE public.peso
+            ALTER COLUMN data SET DEFAULT CURRENT_DATE,
+            ADD CONSTRAINT peso_data_obrigatoria CHECK (data IS NOT NULL) NOT VALID,
+            ADD CONSTRAINT peso_valor_valido CHECK (peso_kg > 0 AND peso_kg < 500) NOT VALID;""",
+    ]),
+    (4, "Contador de versão por tabela (invalidação de cache) com NOTIFY", [
+        """CREATE TABLE IF NOT EXISTS public.versao_dados (
+            tabela TEXT PRIMARY KEY,
+            versao BIGINT NOT NULL DEFAULT 0,
+            alterado_em TIMESTAMPTZ NOT NULL DEFAULT now()
+        );""",
+        "INSERT INTO public.versao_dados (tabela) VALUES ('consumo'), ('peso') ON CONFLICT DO NOTHING;",
+        """CREATE OR REPLACE FUNCTION public.versao_dados_incrementar() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            UPDATE public.versao_dados SET versao = versao + 1, alterado_em = now() WHERE tabela = TG_TABLE_NAME;
+            PERFORM pg_notify('dados_alterados', TG_TABLE_NAME);
+            RETURN NULL;
+        END $$;""",
+        """CREATE TRIGGER trg_versao_consumo AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.consumo
+           FOR EACH STATEMENT EXECUTE FUNCTION public.versao_dados_incrementar();""",
+        """CREATE TRIGGER trg_versao_peso AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.peso
+           FOR EACH STATEMENT EXECUTE FUNCTION public.versao_dados_incrementar();""",
+    ]),
+    (5, "Todas as colunas da TACO, com o número do alimento como chave de carga", [
+        """ALTER TABLE public.tabela_taco
+            ADD COLUMN IF NOT EXISTS numero INTEGER,
+            ADD COLUMN IF NOT EXISTS categoria TEXT,
+            ADD COLUMN IF NOT EXISTS umidade REAL,
+            ADD COLUMN IF NOT EXISTS energia_kj REAL,
+            ADD COLUMN IF NOT EXISTS colesterol REAL,
+            ADD COLUMN IF NOT EXISTS fibra REAL,
+            ADD COLUMN IF NOT EXISTS cinzas REAL,
+            ADD COLUMN IF NOT EXISTS calcio REAL,
+            ADD COLUMN IF NOT EXISTS magnesio REAL,
+            ADD COLUMN IF NOT EXISTS manganes REAL,
+            ADD COLUMN IF NOT EXISTS fosforo REAL,
+            ADD COLUMN IF NOT EXISTS ferro REAL,
+            ADD COLUMN IF NOT EXISTS sodio REAL,
+            ADD COLUMN IF NOT EXISTS potassio REAL,
+            ADD COLUMN IF NOT EXISTS cobre REAL,
+            ADD COLUMN IF NOT EXISTS zinco REAL,
+            ADD COLUMN IF NOT EXISTS retinol REAL,
+            ADD COLUMN IF NOT EXISTS re REAL,
+            ADD COLUMN IF NOT EXISTS rae REAL,
+            ADD COLUMN IF NOT EXISTS tiamina REAL,
+            ADD COLUMN IF NOT EXISTS riboflavina REAL,
+            ADD COLUMN IF NOT EXISTS piridoxina REAL,
+            ADD COLUMN IF NOT EXISTS niacina REAL,
+            ADD COLUMN IF NOT EXISTS vitamina_c REAL;""",
+        # Linhas da carga antiga ficam com numero NULL até a próxima carga casá-las pela descrição
+        "ALTER TABLE public.tabela_taco ADD CONSTRAINT tabela_taco_numero_unico UNIQUE (numero);",
+    ]),
+    (6, "Glúten normalizado em consumo.contem_gluten (calculado na escrita) com índice parcial", [
+        # true = contém, false = não contém, NULL = não informado. Coluna gerada: o Postgres
+        # classifica em todo INSERT/UPDATE (qualquer origem) e o ADD COLUMN já faz o backfill
+        r"""ALTER TABLE public.consumo ADD COLUMN contem_gluten BOOLEAN GENERATED ALWAYS AS (
+            CASE
+                WHEN lower(btrim(COALESCE(gluten, ''))) IN ('', '?', 'ni', 'n/i', 'não informado', 'nao informado', 'desconhecido') THEN NULL
+                WHEN lower(gluten) ~ '(não|nao|\msem\M|isento|free)' THEN false
+                WHEN lower(gluten) ~ '(contém|contem|conter|traço|traco|^\s*sim\s*$|^\s*s\s*$)' THEN true
+            END
+        ) STORED;""",
+        "CREATE INDEX IF NOT EXISTS idx_consumo_com_gluten ON public.consumo (data) WHERE contem_gluten;",
+    ]),
+    (7, "Chave de idempotência para as escritas vindas da fila offline", [
+        # NULL para escritas diretas; a fila reenvia com a mesma chave e o ON CONFLICT descarta a repetição
+        "ALTER TABLE public.consumo ADD COLUMN IF NOT EXISTS chave_idempotencia UUID;",
+        "ALTER TABLE public.consumo ADD CONSTRAINT consumo_chave_idempotencia_unica UNIQUE (chave_idempotencia);",
+        "ALTER TABLE public.peso ADD COLUMN IF NOT EXISTS chave_idempotencia UUID;",
+        "ALTER TABLE public.peso ADD CONSTRAINT peso_chave_idempotencia_unica UNIQUE (chave_idempotencia);",
+    ]),
+    (8, "Resumos semanais/mensais incrementais (public.analise_periodo)", analises.SQL_ESQUEMA),
+    # O vínculo do histórico é feito em Python (mesma normalização da ingestão): alimentos.preencher
+    (9, "Dicionário de alimentos public.alimento e consumo.alimento_id", alimentos.SQL_ESQUEMA),
+    (10, "Usuários com metas próprias; consumo, peso, rollup e resumos por user_id",
+        usuarios.SQL_ESQUEMA + agregados.SQL_CONSUMO_DIARIO_POR_USUARIO + analises.SQL_ESQUEMA_POR_USUARIO),
+]
+
+VERSAO_ATUAL = MIGRACOES[-1][0]
+
+SQL_TABELA_VERSAO = """
+    CREATE TABLE IF NOT EXISTS public.schema_versao (
+        versao INTEGER PRIMARY KEY,
+        descricao TEXT NOT NULL,
+        aplicada_em TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+"""
+
+
+def versao_do_banco(pool):
+    """Versão registrada em public.schema_versao (0 se a tabela ainda não existe)."""
+    try:
+        df = pool.consultar("SELECT COALESCE(MAX(versao), 0) AS versao FROM public.schema_versao")
+    except psycopg2.errors.UndefinedTable:
+        return 0
+    return int(df['versao'].iloc[0])
+
+
+def aplicar_migracoes(pool):
+    """Aplica as migrações pendentes numa transação. Retorna a lista de versões aplicadas."""
+    if versao_do_banco(pool) >= VERSAO_ATUAL:
+        return []
+
+    aplicadas = []
+    with pool.transacao() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (CHAVE_LOCK,))
+        cur.execute(SQL_TABELA_VERSAO)
+        # Relê dentro do lock: outro processo pode ter migrado enquanto esperávamos
+        cur.execute("SELECT COALESCE(MAX(versao), 0) FROM public.schema_versao")
+        versao = cur.fetchone()[0]
+        for numero, descricao, comandos in MIGRACOES:
+            if numero <= versao:
+                continue
+            for sql in comandos:
+                cur.execute(sql)
+            cur.execute("INSERT INTO public.schema_versao (versao, descricao) VALUES (%s, %s)", (numero, descricao))
+            aplicadas.append(numero)
+    return aplicadas
+
+
+# --- UMA VEZ POR PROCESSO ---
+# Pelo próprio pool (não o id): um pool novo pode reaproveitar o endereço de um já fechado
+_verificados = weakref.WeakSet()
+_lock = threading.Lock()
+
+
+def garantir_esquema(pool):
+    """Aplica as migrações na primeira chamada do processo para este pool; depois não faz nada."""
+    if pool in _verificados:
+        return []
+    with _lock:
+        if pool in _verificados:
+            return []
+        aplicadas = aplicar_migracoes(pool)
+        _verificados.add(pool)
+        return aplicadas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrações do esquema do Leo Tracker.")
+    parser.add_argument('--status', action='store_true', help="Só mostra a versão atual do banco.")
+    banco.argumento_dsn(parser)
+    args = parser.parse_args(argv)
+
+    pool = banco.pool_cli(args)
+    if not args.status:
+        aplicadas = aplicar_migracoes(pool)
+        print(f"Migrações aplicadas: {aplicadas}" if aplicadas else "Nenhuma migração pendente.")
+    print(f"Versão do banco: {versao_do_banco(pool)} (código: {VERSAO_ATUAL})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
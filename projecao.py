@@ -0,0 +1,97 @@
+"""Projeção do peso compartilhada por app.py e dashboard.py.
+
+Tudo vetorizado com NumPy/pandas: a curva do plano sai de um ``date_range``, a
+tendência é uma média móvel exponencial no tempo (pesagens irregulares) e a
+previsão de chegada à meta vem de uma regressão linear das últimas semanas.
+Históricos longos são reamostrados para no máximo ``PONTOS_MAX`` linhas, então
+o gráfico não cresce com os anos de pesagens.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+PONTOS_MAX = 400
+MEIA_VIDA_TENDENCIA = '7D'
+JANELA_REGRESSAO_DIAS = 28
+
+
+def _serie_diaria(df_peso):
+    """Pesagens como Series indexada por dia (média se houver mais de uma no mesmo dia)."""
+    datas = pd.to_datetime(df_peso['data']).dt.normalize()
+    return df_peso['peso_kg'].astype(float).groupby(datas).mean().sort_index()
+
+
+def tendencia(serie, meia_vida=MEIA_VIDA_TENDENCIA):
+    """EWMA ponderada pelo tempo entre pesagens (um buraco de semanas pesa como semanas)."""
+    return serie.ewm(halflife=meia_vida, times=serie.index).mean()
+
+
+def previsao_meta(serie, meta, janela_dias=JANELA_REGRESSAO_DIAS):
+    """Regressão linear das pesagens da janela final.
+
+    Retorna ``(kg_por_semana, data_prevista)``; ``data_prevista`` é None se a meta
+    já foi atingida, se não há pesagens suficientes ou se o peso não está caindo.
+    """
+    recente = serie[serie.index >= serie.index[-1] - pd.Timedelta(days=janela_dias)]
+    if len(recente) < 2 or recente.index[0] == recente.index[-1]:
+        return None, None
+    dias = ((recente.index - recente.index[0]) / pd.Timedelta(days=1)).to_numpy()
+    inclinacao, intercepto = np.polyfit(dias, recente.to_numpy(), 1)
+    kg_por_semana = float(inclinacao * 7)
+    atual = intercepto + inclinacao * dias[-1]
+    if inclinacao >= 0 or atual <= meta:
+        return kg_por_semana, None
+    faltam = math.ceil((atual - meta) / -inclinacao)
+    return kg_por_semana, (recente.index[-1] + pd.Timedelta(days=faltam)).date()
+
+
+def projetar(df_peso, meta, perda_semanal, dias_futuros=30, pontos_max=PONTOS_MAX):
+    """Monta o gráfico do peso e o resumo da projeção.
+
+    Retorna ``(df_grafico, resumo)``. ``df_grafico`` tem índice de datas e as colunas
+    'peso_kg' (real, NaN nos dias sem pesagem), 'tendencia' e 'plano' (perda de
+    ``perda_semanal`` kg/semana desde a primeira pesagem, até ``meta``), do primeiro
+    dia até ``dias_futuros`` após a última pesagem, com no máximo ~``pontos_max`` linhas.
+    ``resumo`` traz 'peso_atual', 'tendencia_atual', 'kg_por_semana' e 'previsao_meta'.
+    """
+    serie = _serie_diaria(df_peso)
+    inicio, ultimo = serie.index[0], serie.index[-1]
+    fim = ultimo + pd.Timedelta(days=dias_futuros)
+    total_dias = (fim - inicio).days + 1
+    passo = max(1, math.ceil(total_dias / pontos_max))
+
+    grade = pd.date_range(inicio, fim, freq=f'{passo}D')
+    dias = ((grade - inicio) / pd.Timedelta(days=1)).to_numpy()
+    plano = np.maximum(meta, serie.iloc[0] - dias * perda_semanal / 7)
+
+    suavizada = tendencia(serie)
+    # Média das pesagens de cada faixa de ``passo`` dias, rotulada pelo início da faixa
+    faixa = ((serie.index - inicio) / pd.Timedelta(days=1)).to_numpy().astype(int) // passo
+    real = serie.groupby(faixa).mean().reindex(range(len(grade)))
+    # Tendência só até a última pesagem (não extrapola)
+    tend = suavizada.reindex(grade, method='ffill').where(grade <= ultimo)
+
+    df_grafico = pd.DataFrame({'peso_kg': real.to_numpy(), 'tendencia': tend.to_numpy(), 'plano': plano}, index=grade)
+    df_grafico.index.name = 'data'
+
+    kg_por_semana, data_prevista = previsao_meta(serie, meta)
+    resumo = {
+        'peso_atual': float(serie.iloc[-1]),
+        'tendencia_atual': float(suavizada.iloc[-1]),
+        'kg_por_semana': kg_por_semana,
+        'previsao_meta': data_prevista,
+    }
+    return df_grafico, resumo
+
+
+def texto_previsao(resumo, meta):
+    """Frase curta com o ritmo atual e a previsão de chegada à meta."""
+    if resumo['tendencia_atual'] <= meta:
+        return f"🎉 Meta de {meta:g} kg atingida (tendência: {resumo['tendencia_atual']:.1f} kg)."
+    if resumo['kg_por_semana'] is None:
+        return "Registre mais pesagens para calcular a previsão."
+    ritmo = f"Ritmo atual: {resumo['kg_por_semana']:+.2f} kg/semana"
+    if resumo['previsao_meta'] is None:
+        return f"{ritmo} — nesse ritmo a meta de {meta:g} kg não é atingida."
+    return f"{ritmo} — previsão de chegar a {meta:g} kg em {resumo['previsao_meta'].strftime('%d/%m/%Y')}."
@@ -0,0 +1,213 @@
+"""Operações sobre public.consumo: importações (Groq e JSON), histórico paginado e edição/exclusão em lote."""
+import math
+from datetime import date, datetime
+
+import alimentos
+
+SQL_INSERIR_CONSUMO = """
+    INSERT INTO public.consumo (data, alimento, quantidade, kcal, proteina, carbo, gordura, gluten, user_id, alimento_id)
+    VALUES %s
+"""
+
+# Mesma gravação, vinda da fila offline: reenviar um lote já gravado não duplica linhas
+SQL_INSERIR_CONSUMO_IDEMPOTENTE = """
+    INSERT INTO public.consumo (data, alimento, quantidade, kcal, proteina, carbo, gordura, gluten, user_id, alimento_id, chave_idempotencia)
+    VALUES %s
+    ON CONFLICT (user_id, chave_idempotencia) DO NOTHING
+"""
+
+SQL_INSERIR_PESO_IDEMPOTENTE = """
+    INSERT INTO public.peso (data, peso_kg, user_id, chave_idempotencia)
+    VALUES %s
+    ON CONFLICT (user_id, chave_idempotencia) DO NOTHING
+"""
+
+# Campo do JSON -> (coluna, valor padrão)
+CAMPOS_NUMERICOS = {
+    'quantidade_g': ('quantidade', 1.0),
+    'kcal': ('kcal', 0.0),
+    'p': ('proteina', 0.0),
+    'c': ('carbo', 0.0),
+    'g': ('gordura', 0.0),
+}
+
+
+def _converter_data(valor, data_padrao):
+    if valor in (None, ''):
+        return data_padrao
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return date.fromisoformat(str(valor).strip()[:10])
+
+
+def validar_item(item, data_padrao):
+    """Converte um item do JSON (formato da IA) na tupla de colunas de public.consumo.
+
+    Levanta ValueError com a descrição do problema se o item for inválido.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("item não é um objeto JSON")
+
+    alimento = str(item.get('alimento') or '').strip()
+    if not alimento:
+        raise ValueError("campo 'alimento' vazio")
+
+    try:
+        data = _converter_data(item.get('data'), data_padrao)
+    except ValueError:
+        raise ValueError(f"data inválida: {item.get('data')!r}")
+
+    valores = []
+    for campo, (_, padrao) in CAMPOS_NUMERICOS.items():
+        bruto = item.get(campo)
+        try:
+            valor = padrao if bruto in (None, '') else float(str(bruto).replace(',', '.'))
+        except ValueError:
+            raise ValueError(f"'{campo}' não é numérico: {bruto!r}")
+        if not math.isfinite(valor):
+            raise ValueError(f"'{campo}' não é um número finito: {bruto!r}")
+        if valor < 0:
+            raise ValueError(f"'{campo}' negativo: {valor}")
+        valores.append(valor)
+
+    gluten = str(item.get('gluten') or 'NI').strip()
+    return (data, alimento, *valores, gluten)
+
+
+def validar_itens(itens, data_padrao):
+    """Valida a lista inteira antes de qualquer escrita.
+
+    Retorna ``(linhas, erros)``: as tuplas prontas para o INSERT e uma lista de
+    dicts ``{'linha', 'alimento', 'erro'}`` (linha começando em 1).
+    """
+    linhas, erros = [], []
+    for i, item in enumerate(itens, start=1):
+        try:
+            linhas.append(validar_item(item, data_padrao))
+        except ValueError as e:
+            nome = item.get('alimento', '?') if isinstance(item, dict) else '?'
+            erros.append({'linha': i, 'alimento': nome, 'erro': str(e)})
+    return linhas, erros
+
+
+def importar_consumo(pool, user_id, itens, data_padrao, parcial=False, fila=None):
+    """Valida e grava os itens do usuário em public.consumo num único INSERT multi-linha.
+
+    Sem ``parcial``, qualquer erro de validação cancela a importação inteira.
+    Com ``fila`` (FilaOffline), ``pool`` pode ser a função que o retorna: a
+    gravação continua direta e atômica, e só com o banco inacessível as linhas
+    válidas vão para a fila local (enviadas depois pela drenagem em segundo plano).
+    Retorna ``(quantidade_gravada, erros)``.
+    """
+    linhas, erros = validar_itens(itens, data_padrao)
+    if erros and not parcial:
+        return 0, erros
+    linhas = [(*linha, int(user_id)) for linha in linhas]
+    if fila is not None:
+        obter_pool = pool if callable(pool) else (lambda: pool)
+        return fila.gravar(obter_pool, 'consumo', linhas)[0], erros
+    return pool.executar_lote(SQL_INSERIR_CONSUMO, alimentos.vincular_linhas(pool, linhas)), erros
+
+
+# --- HISTÓRICO PAGINADO (keyset) ---
+SQL_PAGINA_CONSUMO = """
+    SELECT id, data, alimento, quantidade, kcal, proteina, carbo, gordura, gluten, contem_gluten
+    FROM public.consumo
+    WHERE user_id = %(user_id)s AND data BETWEEN %(inicio)s AND %(fim)s
+      AND (%(cursor_data)s::date IS NULL OR (data, id) < (%(cursor_data)s::date, %(cursor_id)s::int))
+    ORDER BY data DESC, id DESC
+    LIMIT %(limite)s
+"""
+
+
+def listar_consumo_pagina(pool, user_id, inicio, fim, tamanho, cursor=None):
+    """Uma página do histórico do usuário entre ``inicio`` e ``fim`` (mais recentes primeiro).
+
+    ``cursor`` é o ``(data, id)`` da última linha da página anterior. A consulta
+    usa o índice (user_id, data, id) e custa o mesmo em qualquer página, por mais longo
+    que seja o histórico. Retorna ``(df, proximo_cursor)``; ``proximo_cursor`` é
+    None na última página.
+    """
+    cursor_data, cursor_id = cursor if cursor else (None, None)
+    df = pool.consultar(SQL_PAGINA_CONSUMO, {
+        'user_id': int(user_id), 'inicio': inicio, 'fim': fim, 'cursor_data': cursor_data, 'cursor_id': cursor_id, 'limite': tamanho + 1,
+    }, cache=True)
+    if len(df) <= tamanho:
+        return df, None
+    df = df.iloc[:tamanho]
+    ultima = df.iloc[-1]
+    return df, (ultima['data'], int(ultima['id']))
+
+
+def contar_consumo(pool, user_id, inicio, fim):
+    """Total de itens do usuário no período, lido do rollup diário (uma linha por dia)."""
+    df = pool.consultar(
+        "SELECT COALESCE(SUM(itens), 0) AS total FROM public.consumo_diario WHERE user_id = %s AND data BETWEEN %s AND %s",
+        (int(user_id), inicio, fim), cache=True
+    )
+    return int(df['total'].iloc[0])
+
+
+SQL_TOP_ALIMENTOS = """
+    SELECT a.nome AS alimento, t.vezes, t.quantidade_g, t.kcal, t.proteina, t.dias_com_gluten
+    FROM (
+        SELECT alimento_id, COUNT(*) AS vezes, SUM(quantidade) AS quantidade_g, SUM(kcal) AS kcal,
+               SUM(proteina) AS proteina, COUNT(DISTINCT data) FILTER (WHERE contem_gluten) AS dias_com_gluten
+        FROM public.consumo
+        WHERE user_id = %(user_id)s AND data BETWEEN %(inicio)s AND %(fim)s AND alimento_id IS NOT NULL
+        GROUP BY alimento_id
+        ORDER BY vezes DESC, kcal DESC
+        LIMIT %(limite)s
+    ) t
+    JOIN public.alimento a ON a.id = t.alimento_id
+    ORDER BY t.vezes DESC, t.kcal DESC
+"""
+
+
+def top_alimentos(pool, user_id, inicio, fim, limite=10):
+    """Alimentos mais frequentes do usuário no período, agrupados pelo dicionário (variações de grafia somam juntas)."""
+    return pool.consultar(SQL_TOP_ALIMENTOS, {'user_id': int(user_id), 'inicio': inicio, 'fim': fim, 'limite': limite}, cache=True)
+
+
+def excluir_consumo(pool, user_id, ids):
+    """Exclui vários itens do usuário num único DELETE (ids de outro usuário são ignorados). Retorna quantos saíram."""
+    ids = [int(i) for i in ids]
+    if not ids:
+        return 0
+    return pool.executar("DELETE FROM public.consumo WHERE user_id = %s AND id = ANY(%s)", (int(user_id), ids))
+
+
+SQL_EDITAR_LOTE = """
+    UPDATE public.consumo SET
+        data = COALESCE(%(data)s::date, data),
+        quantidade = quantidade * %(fator)s,
+        kcal = kcal * %(fator)s,
+        proteina = proteina * %(fator)s,
+        carbo = carbo * %(fator)s,
+        gordura = gordura * %(fator)s
+    WHERE user_id = %(user_id)s AND id = ANY(%(ids)s)
+"""
+
+
+def editar_consumo_lote(pool, user_id, ids, nova_data=None, fator=1.0):
+    """Move os itens para ``nova_data`` e/ou escala a quantidade por ``fator``.
+
+    Kcal e macros são recalculados na mesma proporção da quantidade. Tudo num
+    único UPDATE (atômico, um round trip). Retorna quantos itens mudaram.
+    """
+    ids = [int(i) for i in ids]
+    fator = float(fator)
+    if fator <= 0:
+        raise ValueError("O fator de escala deve ser positivo.")
+    if not ids or (nova_data is None and fator == 1.0):
+        return 0
+    return pool.executar(SQL_EDITAR_LOTE, {'user_id': int(user_id), 'data': nova_data, 'fator': fator, 'ids': ids})
+
+
+# --- VERSÃO DOS DADOS (invalidação de cache entre processos) ---
+def ler_versoes_dados(pool):
+    """Retorna ``{tabela: versao}``; os triggers incrementam a cada escrita em consumo/peso."""
+    df = pool.consultar("SELECT tabela, versao FROM public.versao_dados")
+    return dict(zip(df['tabela'], df['versao'].astype(int)))
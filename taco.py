@@ -0,0 +1,324 @@
+"""Resolvedor local de macros e busca fuzzy sobre a tabela TACO (public.tabela_taco).
+
+Interpreta texto livre como "200g arroz integral cozido + 2 ovos", casa cada
+trecho com um índice em memória da TACO e escala os valores por 100 g. Só os
+trechos que não puderem ser resolvidos com segurança seguem para a IA. O mesmo
+índice guarda trigramas das descrições para o autocomplete de alimentos.
+"""
+import heapq
+import re
+import threading
+import time
+import unicodedata
+
+# Palavras ignoradas ao casar descrições
+STOPWORDS = {'de', 'do', 'da', 'dos', 'das', 'e', 'em', 'no', 'na', 'o', 'a', 'os', 'as', 'um', 'uma', 'tipo'}
+
+NUMEROS_EXTENSO = {
+    'meio': 0.5, 'meia': 0.5, 'um': 1, 'uma': 1, 'dois': 2, 'duas': 2, 'tres': 3, 'quatro': 4,
+    'cinco': 5, 'seis': 6, 'sete': 7, 'oito': 8, 'nove': 9, 'dez': 10,
+}
+
+# Medidas caseiras -> gramas (estimativas padrão)
+MEDIDAS_G = {
+    'kg': 1000, 'g': 1, 'gr': 1, 'grama': 1, 'gramas': 1, 'ml': 1, 'l': 1000, 'litro': 1000, 'litros': 1000,
+    'colher de sopa': 15, 'colheres de sopa': 15, 'colher de cha': 5, 'colheres de cha': 5,
+    'colher': 15, 'colheres': 15, 'xicara': 160, 'xicaras': 160, 'copo': 200, 'copos': 200,
+    'concha': 140, 'conchas': 140, 'escumadeira': 90, 'escumadeiras': 90, 'fatia': 25, 'fatias': 25,
+}
+
+# Peso médio de uma unidade, pela primeira palavra do alimento
+UNIDADE_G = {
+    'ovo': 50, 'banana': 70, 'maca': 130, 'pera': 130, 'laranja': 180, 'tangerina': 135, 'kiwi': 75,
+    'pao': 50, 'tomate': 100, 'batata': 150, 'cenoura': 100, 'pessego': 110, 'goiaba': 170,
+    'caqui': 110, 'coxa': 100, 'sobrecoxa': 110, 'bife': 100, 'file': 120, 'sardinha': 25,
+}
+
+# Termo digitado (normalizado) -> descrição TACO preferida quando há várias opções
+ALIASES = {
+    'ovo': 'Ovo, de galinha, inteiro, cozido/10minutos',
+    'ovo cozido': 'Ovo, de galinha, inteiro, cozido/10minutos',
+    'ovo frito': 'Ovo, de galinha, inteiro, frito',
+    'clara': 'Ovo, de galinha, clara, cozida/10minutos',
+    'arroz': 'Arroz, tipo 1, cozido',
+    'arroz branco': 'Arroz, tipo 1, cozido',
+    'arroz integral': 'Arroz, integral, cozido',
+    'feijao': 'Feijão, carioca, cozido',
+    'banana': 'Banana, prata, crua',
+    'maca': 'Maçã, Fuji, com casca, crua',
+    'frango': 'Frango, peito, sem pele, grelhado',
+    'peito frango': 'Frango, peito, sem pele, grelhado',
+    'peito de frango': 'Frango, peito, sem pele, grelhado',
+    'batata doce': 'Batata, doce, cozida',
+    'batata': 'Batata, inglesa, cozida',
+    'leite': 'Leite, de vaca, integral',
+    'cafe': 'Café, infusão 10%',
+    'aveia': 'Aveia, flocos, crua',
+    'pao': 'Pão, trigo, francês',
+    'pao frances': 'Pão, trigo, francês',
+    'iogurte': 'Iogurte, natural',
+    'sardinha': 'Sardinha, conserva em óleo',
+    'queijo minas': 'Queijo, minas, frescal',
+    'tomate': 'Tomate, com semente, cru',
+}
+
+# Preparos preferidos quando a descrição não define (o usuário geralmente come cozido)
+PREPAROS_PREFERIDOS = {'cozido', 'cozida', 'grelhado', 'grelhada', 'assado', 'assada'}
+
+TERMOS_GLUTEN = ('trigo', 'pao', 'macarrao', 'biscoito', 'bolo', 'centeio', 'cevada', 'torrada',
+                 'pizza', 'lasanha', 'pastel', 'coxinha', 'quibe', 'esfiha', 'empada', 'torta',
+                 'bolacha', 'rosca', 'panetone', 'cerveja', 'gluten', 'milanesa', 'nhoque')
+EXCECOES_GLUTEN = ('pao de queijo', 'sem gluten')
+
+SEPARADORES = re.compile(r'\s*(?:\+|(?<!\d),|,(?!\d)|;|\n|\be\b)\s*', re.IGNORECASE)
+RE_QTD_MEDIDA = re.compile(
+    r'\b(?P<qtd>\d+(?:[.,]\d+)?|' + '|'.join(NUMEROS_EXTENSO) + r')\s*'
+    r'(?P<medida>' + '|'.join(sorted((re.escape(m) for m in MEDIDAS_G), key=len, reverse=True)) + r')\b'
+)
+RE_QTD_UNIDADE = re.compile(r'^(?P<qtd>\d+(?:[.,]\d+)?|' + '|'.join(NUMEROS_EXTENSO) + r')\b\s*(?:unidades?|und?\b)?')
+
+
+def remover_acentos(texto):
+    return ''.join(c for c in unicodedata.normalize('NFD', str(texto)) if unicodedata.category(c) != 'Mn')
+
+
+def normalizar(texto):
+    """Minúsculas, sem acentos e só com letras/dígitos separados por espaço."""
+    texto = remover_acentos(texto).lower()
+    return re.sub(r'[^a-z0-9%]+', ' ', texto).strip()
+
+
+def _singular(token):
+    if len(token) > 3 and token.endswith(('oes', 'aes')):
+        return token[:-3] + 'ao'
+    if len(token) > 5 and token.endswith('eses'):
+        return token[:-2]
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenizar(texto):
+    return [_singular(t) for t in normalizar(texto).split() if t not in STOPWORDS]
+
+
+def trigramas_texto(texto):
+    """Trigramas de cada palavra normalizada, com bordas (estilo pg_trgm)."""
+    tris = set()
+    for palavra in normalizar(texto).split():
+        p = f"  {palavra} "
+        tris.update(p[i:i + 3] for i in range(len(p) - 2))
+    return tris
+
+
+def classificar_gluten(descricao):
+    """Classifica um alimento TACO como 'Contém' ou 'Não contém' glúten pela descrição."""
+    texto = normalizar(descricao)
+    if any(e in texto for e in EXCECOES_GLUTEN):
+        return 'Não contém'
+    palavras = {_singular(p) for p in texto.split()}
+    return 'Contém' if any(t in palavras for t in TERMOS_GLUTEN) else 'Não contém'
+
+
+def _numero(valor):
+    """Converte o valor nutricional em float; None se ausente (NULL/NaN)."""
+    if valor is None:
+        return None
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        return None
+    return None if numero != numero else numero
+
+
+def _converter_qtd(bruto):
+    bruto = bruto.strip()
+    if bruto in NUMEROS_EXTENSO:
+        return float(NUMEROS_EXTENSO[bruto])
+    return float(bruto.replace(',', '.'))
+
+
+def separar_itens(texto):
+    """Quebra o texto da refeição em trechos ("200g arroz + 2 ovos" -> 2 trechos)."""
+    return [t.strip() for t in SEPARADORES.split(str(texto)) if t and t.strip()]
+
+
+class IndiceTaco:
+    """Índice invertido token -> alimentos TACO, com valores por 100 g."""
+
+    def __init__(self, registros):
+        # registros: iteráveis de (id, alimento, kcal, proteina, carbo, gordura)
+        self.alimentos = {}
+        self.tokens = {}
+        self.trigramas = {}
+        self._por_descricao = {}
+        for id_, nome, kcal, prot, carb, gord in registros:
+            valores = [_numero(v) for v in (kcal, prot, carb, gord)]
+            # Sem energia analisada (NA/* na TACO) não há como calcular: fica para a IA
+            if valores[0] is None or not any(valores):
+                continue
+            toks = tokenizar(nome)
+            self.alimentos[id_] = {
+                'id': id_, 'alimento': nome, 'tokens': toks,
+                'kcal': valores[0], 'p': valores[1] or 0.0, 'c': valores[2] or 0.0, 'g': valores[3] or 0.0,
+            }
+            self._por_descricao[normalizar(nome)] = id_
+            for t in set(toks):
+                self.tokens.setdefault(t, set()).add(id_)
+            # Busca fuzzy: trigramas e palavras da descrição normalizada
+            palavras = normalizar(nome).split()
+            self.alimentos[id_]['palavras'] = palavras
+            self.alimentos[id_]['n_trigramas'] = len(trigramas_texto(nome))
+            for tri in trigramas_texto(nome):
+                self.trigramas.setdefault(tri, []).append(id_)
+        # Alimento-base -> id preferido (ex: "frango" -> peito grelhado)
+        self._preferidos = {}
+        for termo, descricao in ALIASES.items():
+            id_ = self._por_descricao.get(normalizar(descricao))
+            if id_ is not None:
+                self._preferidos.setdefault(tokenizar(termo)[0], set()).add(id_)
+
+    def __len__(self):
+        return len(self.alimentos)
+
+    def casar(self, termo):
+        """Retorna o alimento TACO para o termo ou None se não houver casamento seguro."""
+        chave = normalizar(termo)
+        alias = ALIASES.get(chave) or ALIASES.get(' '.join(tokenizar(termo)))
+        if alias and normalizar(alias) in self._por_descricao:
+            return self.alimentos[self._por_descricao[normalizar(alias)]]
+
+        toks = tokenizar(termo)
+        if not toks:
+            return None
+        conjuntos = [self.tokens.get(t) for t in toks]
+        if any(c is None for c in conjuntos):
+            return None
+        candidatos = set.intersection(*conjuntos)
+        # A primeira palavra da descrição TACO é o alimento-base: precisa ter sido digitada
+        candidatos = [self.alimentos[i] for i in candidatos if self.alimentos[i]['tokens'][0] in toks]
+        if not candidatos:
+            return None
+
+        preferidos = self._preferidos.get(toks[0], set())
+        if len(toks) == 1 and len(candidatos) > 1 and not preferidos & {a['id'] for a in candidatos}:
+            # Só o alimento-base, sem preferência conhecida (ex: "leite"): ambíguo demais
+            return None
+
+        def ordem(a):
+            extras = [t for t in a['tokens'] if t not in toks]
+            preparado = any(t in PREPAROS_PREFERIDOS for t in extras)
+            return (a['id'] not in preferidos, len(extras) - (1 if preparado else 0), a['id'])
+        return min(candidatos, key=ordem)
+
+    def resolver_trecho(self, trecho):
+        """Converte um trecho em gramas + alimento TACO. Retorna (alimento, gramas) ou None."""
+        trecho = remover_acentos(trecho).lower().strip()
+        gramas, resto = None, trecho
+        m = RE_QTD_MEDIDA.search(trecho)
+        if m:
+            gramas = _converter_qtd(m.group('qtd')) * MEDIDAS_G[m.group('medida')]
+            resto = (trecho[:m.start()] + ' ' + trecho[m.end():]).strip()
+        else:
+            m = RE_QTD_UNIDADE.match(trecho)
+            if m:
+                resto = trecho[m.end():].strip()
+                alimento = self.casar(resto)
+                if alimento and alimento['tokens'][0] in UNIDADE_G:
+                    return alimento, _converter_qtd(m.group('qtd')) * UNIDADE_G[alimento['tokens'][0]]
+                return None
+
+        if gramas is None:
+            # Sem quantidade: deixa a IA estimar a porção
+            return None
+        alimento = self.casar(re.sub(r'^(de|do|da)\s+', '', resto))
+        return (alimento, gramas) if alimento else None
+
+    def resolver(self, texto, data_ref):
+        """Resolve o que for possível localmente.
+
+        Retorna ``(itens, pendentes)``: itens no mesmo formato da IA
+        (alimento, quantidade_g, kcal, p, c, g, gluten, data) e os trechos
+        originais que precisam ir para a IA.
+        """
+        itens, pendentes = [], []
+        for trecho in separar_itens(texto):
+            resolvido = self.resolver_trecho(trecho)
+            if not resolvido:
+                pendentes.append(trecho)
+                continue
+            itens.append(self.montar_item(*resolvido, data_ref))
+        return itens, pendentes
+
+    def montar_item(self, alimento, gramas, data_ref):
+        """Item no formato da IA com os valores por 100 g escalados para ``gramas``."""
+        fator = gramas / 100.0
+        return {
+            'data': str(data_ref),
+            'alimento': alimento['alimento'],
+            'quantidade_g': round(gramas, 1),
+            'kcal': round(alimento['kcal'] * fator, 1),
+            'p': round(alimento['p'] * fator, 1),
+            'c': round(alimento['c'] * fator, 1),
+            'g': round(alimento['g'] * fator, 1),
+            'gluten': classificar_gluten(alimento['alimento']),
+            'fonte': 'TACO',
+        }
+
+    def buscar(self, consulta, limite=10, cobertura_min=0.4):
+        """Busca fuzzy (sem acento, tolerante a erros de digitação) para autocomplete.
+
+        Pontua pela fração dos trigramas digitados presentes na descrição, mais a
+        similaridade de Jaccard, com bônus para palavras digitadas que são prefixo
+        de palavras da descrição e para os alimentos preferidos. Retorna a lista
+        de alimentos ordenada por relevância, cada um com a chave 'score'.
+        """
+        tris = trigramas_texto(consulta)
+        if not tris:
+            return []
+        comuns = {}
+        for tri in tris:
+            for id_ in self.trigramas.get(tri, ()):
+                comuns[id_] = comuns.get(id_, 0) + 1
+
+        termos = normalizar(consulta).split()
+        preferidos = self._preferidos.get(_singular(termos[0]), set())
+        resultados = []
+        for id_, n in comuns.items():
+            cobertura = n / len(tris)
+            if cobertura < cobertura_min:
+                continue
+            alimento = self.alimentos[id_]
+            score = cobertura + 0.5 * n / (len(tris) + alimento['n_trigramas'] - n)
+            prefixos = sum(1 for t in termos if any(p.startswith(t) for p in alimento['palavras']))
+            score += 0.5 * prefixos / len(termos)
+            if alimento['palavras'][0].startswith(termos[0]):
+                score += 0.25
+            if id_ in preferidos:
+                score += 0.2
+            resultados.append((score, -id_, alimento))
+        return [{**a, 'score': round(s, 3)} for s, _, a in heapq.nlargest(limite, resultados, key=lambda r: r[:2])]
+
+
+# --- ÍNDICE DO PROCESSO (recarregado após o TTL) ---
+_indice = None
+_carregado_em = 0.0
+_lock = threading.Lock()
+
+
+def obter_indice(pool, ttl_s=3600):
+    """Carrega public.tabela_taco em memória uma vez por processo (renovando após ``ttl_s``)."""
+    global _indice, _carregado_em
+    with _lock:
+        if _indice is None or time.monotonic() - _carregado_em > ttl_s:
+            df = pool.consultar("SELECT id, alimento, kcal, proteina, carbo, gordura FROM public.tabela_taco")
+            _indice = IndiceTaco(df.itertuples(index=False, name=None))
+            _carregado_em = time.monotonic()
+        return _indice
+
+
+def invalidar_indice():
+    """Força a releitura da tabela na próxima chamada (ex: depois de recarregar o CSV)."""
+    global _indice
+    with _lock:
+        _indice = None
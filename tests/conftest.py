@@ -0,0 +1,50 @@
+"""Fixtures dos testes de integração: cada teste ganha um banco Postgres descartável.
+
+Os testes precisam de um servidor Postgres. Informe em LEO_TESTE_DSN o DSN de
+um usuário que possa criar bancos (ex: postgresql://postgres@localhost/postgres);
+sem ele, os testes que usam o banco são pulados.
+"""
+import os
+import sys
+import uuid
+
+import psycopg2
+import pytest
+from psycopg2.extensions import make_dsn, parse_dsn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import banco  # noqa: E402
+
+
+@pytest.fixture
+def dsn():
+    """DSN de um banco vazio, criado para o teste e apagado no fim."""
+    admin = os.environ.get('LEO_TESTE_DSN')
+    if not admin:
+        pytest.skip("LEO_TESTE_DSN não definido (Postgres de teste)")
+    nome = f"leo_teste_{uuid.uuid4().hex[:12]}"
+    conn = psycopg2.connect(admin)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE DATABASE {nome}")
+        yield make_dsn(**{**parse_dsn(admin), 'dbname': nome})
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP DATABASE IF EXISTS {nome} WITH (FORCE)")
+        conn.close()
+
+
+@pytest.fixture
+def pool(dsn):
+    pool = banco.PoolBanco(dsn, max_conexoes=8)
+    yield pool
+    pool.fechar()
+
+
+@pytest.fixture
+def pool_migrado(pool):
+    import migracoes
+    migracoes.aplicar_migracoes(pool)
+    return pool
@@ -0,0 +1,55 @@
+from datetime import date
+
+import alimentos
+import banco
+
+
+def test_variacoes_de_grafia_tem_a_mesma_chave():
+    assert alimentos.chave("Ovos cozidos") == alimentos.chave("ovo  cozido.") == "ovo cozido"
+    assert alimentos.chave("de, e!") == ''
+
+
+def test_resolver_cria_uma_vez_por_chave(pool_migrado):
+    dicionario = alimentos.obter_dicionario(pool_migrado)
+    ids = dicionario.resolver(pool_migrado, ["Ovos cozidos", "ovo cozido", "Arroz branco", "de"])
+    assert ids["Ovos cozidos"] == ids["ovo cozido"] != ids["Arroz branco"]
+    assert "de" not in ids
+    nomes = pool_migrado.consultar("SELECT nome FROM public.alimento ORDER BY id")['nome'].tolist()
+    assert nomes == ["Ovos cozidos", "Arroz branco"]
+    assert dicionario.resolver(pool_migrado, ["OVO COZIDO"]) == {"OVO COZIDO": ids["ovo cozido"]}
+
+
+def test_preencher_vincula_o_historico(pool_migrado):
+    pool_migrado.executar_lote(
+        "INSERT INTO public.consumo (data, alimento, quantidade, kcal) VALUES %s",
+        [(date(2024, 1, d), nome, 100, 50) for d, nome in
+         [(1, 'ovo cozido'), (2, 'Ovos cozidos'), (3, 'ovo cozido'), (4, 'Banana prata'), (5, '...')]]
+    )
+    assert alimentos.preencher(pool_migrado) == (4, 2)
+    assert alimentos.preencher(pool_migrado) == (0, 0)
+    vinculos = pool_migrado.consultar("""
+        SELECT c.alimento, a.nome FROM public.consumo c LEFT JOIN public.alimento a ON a.id = c.alimento_id ORDER BY c.id
+    """)
+    # Nome canônico: a grafia mais frequente
+    assert vinculos['nome'].tolist()[:4] == ['ovo cozido', 'ovo cozido', 'ovo cozido', 'Banana prata']
+    assert vinculos['nome'].isna().tolist()[4]
+
+
+def test_garantir_vinculos_roda_uma_vez_por_pool(pool_migrado):
+    pool_migrado.executar("INSERT INTO public.consumo (data, alimento, kcal) VALUES (CURRENT_DATE, 'Maçã', 52)")
+    assert alimentos.garantir_vinculos(pool_migrado) == (1, 1)
+    pool_migrado.executar("INSERT INTO public.consumo (data, alimento, kcal) VALUES (CURRENT_DATE, 'Pera', 57)")
+    assert alimentos.garantir_vinculos(pool_migrado) == (0, 0)
+
+
+def test_cada_pool_tem_seu_dicionario(dsn, pool_migrado):
+    alimentos.obter_dicionario(pool_migrado).resolver(pool_migrado, ["Arroz"])
+    # Outro banco (aqui, o mesmo esvaziado) não pode receber ids do dicionário de outro pool
+    pool_migrado.executar("DELETE FROM public.alimento")
+    outro = banco.PoolBanco(dsn, max_conexoes=1)
+    try:
+        assert alimentos.obter_dicionario(outro) is not alimentos.obter_dicionario(pool_migrado)
+        id_ = alimentos.obter_dicionario(outro).resolver(outro, ["Arroz"])["Arroz"]
+        assert outro.consultar("SELECT id FROM public.alimento")['id'].tolist() == [id_]
+    finally:
+        outro.fechar()
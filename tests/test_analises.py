@@ -0,0 +1,87 @@
+from datetime import date
+
+import pytest
+
+import analises
+import repositorio
+import usuarios
+
+# Metas padrão do usuário 1: kcal <= 1650 e proteína >= 110
+DIAS = {
+    date(2024, 1, 1): (1500, 120),
+    date(2024, 1, 2): (1600, 115),
+    date(2024, 1, 3): (2000, 130),
+    date(2024, 1, 4): (1500, 120),
+    date(2024, 1, 8): (1500, 120),
+}
+
+
+def _registrar(pool, user_id, dias, gluten='Não contém'):
+    itens = [{'data': d.isoformat(), 'alimento': 'Refeição', 'kcal': kcal, 'p': proteina, 'gluten': gluten}
+             for d, (kcal, proteina) in dias.items()]
+    assert repositorio.importar_consumo(pool, user_id, itens, None) == (len(itens), [])
+
+
+def _periodo(pool, user_id, granularidade, inicio):
+    df = analises.ler_periodos(pool, user_id, granularidade, inicio, inicio)
+    return df.iloc[0] if not df.empty else None
+
+
+def test_resumo_da_semana_e_do_mes(pool_migrado):
+    _registrar(pool_migrado, 1, DIAS)
+    assert analises.atualizar(pool_migrado, 1) == len(DIAS)
+
+    semana = _periodo(pool_migrado, 1, 'semana', date(2024, 1, 1))
+    assert semana['fim'] == date(2024, 1, 7)
+    assert semana['dias_registrados'] == 4
+    assert semana['kcal_total'] == 6600
+    assert (semana['dias_meta_kcal'], semana['dias_meta_proteina'], semana['dias_meta_ambas']) == (3, 4, 3)
+    assert semana['maior_sequencia'] == 2
+    mes = _periodo(pool_migrado, 1, 'mes', date(2024, 1, 1))
+    assert (mes['fim'], mes['dias_registrados'], mes['dias_meta_ambas']) == (date(2024, 1, 31), 5, 4)
+    assert analises.ler_sequencias(pool_migrado, 1) == {
+        'maior_sequencia': 2, 'sequencia_recente': 1, 'sequencia_recente_fim': date(2024, 1, 8)
+    }
+    # Sem pendências nem metas novas, não recalcula nada
+    assert analises.atualizar(pool_migrado, 1) == 0
+
+
+def test_recalcula_so_os_dias_alterados(pool_migrado):
+    _registrar(pool_migrado, 1, DIAS)
+    analises.atualizar(pool_migrado, 1)
+    pool_migrado.executar("UPDATE public.consumo SET kcal = 1500 WHERE data = %s", (date(2024, 1, 3),))
+    assert analises.atualizar(pool_migrado, 1) == 1
+    assert _periodo(pool_migrado, 1, 'semana', date(2024, 1, 1))['maior_sequencia'] == 4
+
+    # Semana que fica sem nenhum dia some do resumo
+    pool_migrado.executar("DELETE FROM public.consumo WHERE data = %s", (date(2024, 1, 8),))
+    assert analises.atualizar(pool_migrado, 1) == 1
+    assert _periodo(pool_migrado, 1, 'semana', date(2024, 1, 8)) is None
+    assert _periodo(pool_migrado, 1, 'mes', date(2024, 1, 1))['dias_registrados'] == 4
+
+
+def test_metas_novas_recalculam_tudo(pool_migrado):
+    _registrar(pool_migrado, 1, DIAS)
+    analises.atualizar(pool_migrado, 1)
+    usuarios.atualizar_metas(pool_migrado, 1, meta_kcal=2500)
+    assert analises.atualizar(pool_migrado, 1) == len(DIAS)
+    assert _periodo(pool_migrado, 1, 'semana', date(2024, 1, 1))['dias_meta_ambas'] == 4
+
+
+def test_resumos_separados_por_usuario(pool_migrado):
+    bia = usuarios.criar_usuario(pool_migrado, 'bia', 'Bia', 'segredo1', meta_kcal=1400, meta_proteina=90)
+    _registrar(pool_migrado, 1, DIAS)
+    _registrar(pool_migrado, bia, {date(2024, 1, 2): (1300, 95)}, gluten='Contém')
+    analises.atualizar(pool_migrado, 1)
+    assert analises.atualizar(pool_migrado, bia) == 1
+
+    semana_bia = _periodo(pool_migrado, bia, 'semana', date(2024, 1, 1))
+    assert (semana_bia['dias_registrados'], semana_bia['dias_meta_ambas'], semana_bia['itens_com_gluten']) == (1, 1, 1)
+    semana_leo = _periodo(pool_migrado, 1, 'semana', date(2024, 1, 1))
+    assert (semana_leo['dias_registrados'], semana_leo['itens_com_gluten']) == (4, 0)
+    assert analises.ler_diario(pool_migrado, bia, date(2024, 1, 1), date(2024, 1, 31), 1400, 90)['kcal'].tolist() == [1300]
+
+
+def test_usuario_inexistente(pool_migrado):
+    with pytest.raises(ValueError):
+        analises.atualizar(pool_migrado, 999)
@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+import ao_vivo
+
+
+def _esperar(condicao, limite_s=5):
+    fim = time.monotonic() + limite_s
+    while time.monotonic() < fim:
+        if condicao():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.fixture
+def ouvintes():
+    criados = []
+    yield criados
+    for ouvinte in criados:
+        ouvinte.parar()
+
+
+def test_notify_atualiza_as_versoes_sem_esperar_o_poll(dsn, pool_migrado, ouvintes):
+    # Poll de 1 hora: só o NOTIFY explica a atualização dentro do teste
+    ouvinte = ao_vivo.OuvinteDados(dsn, pool_migrado, intervalo_poll_s=3600)
+    ouvintes.append(ouvinte)
+    assert ouvinte.versoes() == {'consumo': 0, 'peso': 0}
+    assert _esperar(lambda: ouvinte.escutando)
+
+    pool_migrado.executar("INSERT INTO public.consumo (data, alimento, kcal) VALUES (CURRENT_DATE, 'Arroz', 130)")
+    assert _esperar(lambda: ouvinte.versoes()['consumo'] == 1)
+
+    pool_migrado.executar("INSERT INTO public.peso (data, peso_kg) VALUES (CURRENT_DATE, 120.5)")
+    assert _esperar(lambda: ouvinte.versoes() == {'consumo': 1, 'peso': 1})
+
+
+def test_sem_listen_cai_para_o_poll(pool_migrado, ouvintes):
+    # A conexão do LISTEN falha (socket inexistente); o pool segue funcionando
+    ouvinte = ao_vivo.OuvinteDados("postgresql:///leo?host=/nao/existe", pool_migrado, intervalo_sem_listen_s=0.05)
+    ouvintes.append(ouvinte)
+
+    pool_migrado.executar("INSERT INTO public.consumo (data, alimento, kcal) VALUES (CURRENT_DATE, 'Arroz', 130)")
+    assert _esperar(lambda: ouvinte.versoes()['consumo'] == 1)
+    assert not ouvinte.escutando
+
+
+def test_versoes_devolve_uma_copia(pool_migrado, ouvintes):
+    ouvinte = ao_vivo.OuvinteDados("postgresql:///leo?host=/nao/existe", pool_migrado, intervalo_sem_listen_s=0.05)
+    ouvintes.append(ouvinte)
+
+    ouvinte.versoes()['consumo'] = 99
+    assert ouvinte.versoes()['consumo'] == 0
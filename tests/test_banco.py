@@ -0,0 +1,113 @@
+import threading
+from contextlib import ExitStack
+
+import psycopg2
+import pytest
+
+import banco
+
+
+def test_escritas_persistem_com_emprestimos_sobrepostos(pool):
+    # Mais empréstimos simultâneos que min_conexoes: o pool fecha as excedentes ao devolver,
+    # e as conexões novas (às vezes no endereço de memória de uma fechada) precisam vir em autocommit
+    pool.executar("CREATE TABLE t (n INTEGER)")
+    for rodada in range(5):
+        with ExitStack() as pilha:
+            conexoes = [pilha.enter_context(pool.conexao()) for _ in range(6)]
+            for i, conn in enumerate(conexoes):
+                with conn.cursor() as cur:
+                    cur.execute("INSERT INTO t VALUES (%s)", (rodada * 6 + i,))
+    assert int(pool.consultar("SELECT COUNT(*) AS n FROM t")['n'].iloc[0]) == 30
+
+
+def test_escritas_concorrentes_persistem(pool):
+    pool.executar("CREATE TABLE t (n INTEGER)")
+    barreira = threading.Barrier(8)
+
+    def escrever(inicio):
+        barreira.wait()
+        for n in range(inicio, inicio + 25):
+            pool.executar("INSERT INTO t VALUES (%s)", (n,))
+
+    threads = [threading.Thread(target=escrever, args=(i * 25,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert int(pool.consultar("SELECT COUNT(*) AS n FROM t")['n'].iloc[0]) == 200
+
+
+def test_conexoes_emprestadas_em_autocommit(pool):
+    conexoes = [pool._obter() for _ in range(4)]
+    try:
+        assert all(conn.autocommit for conn in conexoes)
+    finally:
+        for conn in conexoes:
+            pool._devolver(conn)
+    with pool.conexao() as conn:
+        assert conn.autocommit
+
+
+def test_cache_invalidado_por_escrita(pool):
+    pool.executar("CREATE TABLE t (n INTEGER)")
+    assert pool.consultar("SELECT COUNT(*) AS n FROM t", cache=True)['n'].iloc[0] == 0
+    pool.executar("INSERT INTO t VALUES (1)")
+    assert pool.consultar("SELECT COUNT(*) AS n FROM t", cache=True)['n'].iloc[0] == 1
+
+
+def test_transacao_desfeita_em_erro(pool):
+    pool.executar("CREATE TABLE t (n INTEGER)")
+    try:
+        with pool.transacao() as cur:
+            cur.execute("INSERT INTO t VALUES (1)")
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert pool.consultar("SELECT COUNT(*) AS n FROM t")['n'].iloc[0] == 0
+
+
+def test_fuso_fixado_na_conexao(pool):
+    assert pool.consultar("SHOW timezone")['TimeZone'].iloc[0] == banco.FUSO_HORARIO
+
+
+def _queda_apos_o_commit(monkeypatch, comando):
+    """Faz cada ``comando`` (prefixo do SQL) rodar no servidor e, em seguida, a conexão "cair"."""
+    execute = banco._CursorContado.execute
+
+    def executar_e_cair(self, sql, *args, **kwargs):
+        resultado = execute(self, sql, *args, **kwargs)
+        texto = sql.decode() if isinstance(sql, bytes) else str(sql)
+        if texto.lstrip().startswith(comando):
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        return resultado
+    monkeypatch.setattr(banco._CursorContado, 'execute', executar_e_cair)
+
+
+def test_escrita_nao_idempotente_nao_e_repetida(pool, monkeypatch):
+    pool.executar("CREATE TABLE t (n INTEGER)")
+    pool.executar("INSERT INTO t VALUES (10)")
+    _queda_apos_o_commit(monkeypatch, 'UPDATE')
+    with pytest.raises(psycopg2.OperationalError):
+        pool.executar("UPDATE t SET n = n * 2")
+    _queda_apos_o_commit(monkeypatch, 'INSERT')
+    with pytest.raises(psycopg2.OperationalError):
+        pool.executar_lote("INSERT INTO t VALUES %s", [(1,), (2,)])
+    monkeypatch.undo()
+    assert sorted(pool.consultar("SELECT n FROM t")['n']) == [1, 2, 20]
+
+
+def test_escrita_idempotente_e_repetida_em_conexao_nova(pool, monkeypatch):
+    pool.executar("CREATE TABLE t (n INTEGER PRIMARY KEY)")
+    chamadas = []
+    execute = banco._CursorContado.execute
+
+    def cair_na_primeira(self, sql, *args, **kwargs):
+        resultado = execute(self, sql, *args, **kwargs)
+        if (sql.decode() if isinstance(sql, bytes) else str(sql)).startswith('INSERT') and not chamadas:
+            chamadas.append(sql)
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        return resultado
+    monkeypatch.setattr(banco._CursorContado, 'execute', cair_na_primeira)
+    pool.executar_lote("INSERT INTO t VALUES %s ON CONFLICT DO NOTHING", [(1,), (2,)], repetir=True)
+    monkeypatch.undo()
+    assert sorted(pool.consultar("SELECT n FROM t")['n']) == [1, 2]
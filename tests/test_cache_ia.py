@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+from cache_ia import CacheRespostasIA, gerar_chave
+
+RESPOSTA = {'analise': 'ok', 'alimentos': [{'alimento': 'Arroz', 'kcal': 130}]}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CacheRespostasIA(str(tmp_path / 'ia.sqlite3'))
+
+
+def test_chave_ignora_caixa_e_espacos():
+    assert gerar_chave("  Arroz   e FEIJÃO ", '2026-10-17') == gerar_chave("arroz e feijão", '2026-10-17')
+    assert gerar_chave("arroz", '2026-10-17') != gerar_chave("arroz", '2026-10-18')
+
+
+def test_chamadas_simultaneas_chamam_a_api_uma_vez_e_recebem_copias(cache):
+    chamadas = []
+
+    def calcular():
+        chamadas.append(1)
+        time.sleep(0.2)
+        return True, {'analise': 'ok', 'alimentos': [{'alimento': 'Arroz', 'kcal': 130}]}
+
+    barreira = threading.Barrier(6)
+    resultados = []
+
+    def pedir():
+        barreira.wait()
+        resultados.append(cache.obter_ou_calcular('k', calcular))
+
+    threads = [threading.Thread(target=pedir) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(chamadas) == 1
+    assert all(r == (True, RESPOSTA) for r in resultados)
+    # Quem chama altera os itens (ex: data do lote): ninguém mais pode ver a alteração
+    resultados[0][1]['alimentos'][0]['data'] = '2026-10-01'
+    assert all('data' not in r[1]['alimentos'][0] for r in resultados[1:])
+    assert cache.obter('k') == RESPOSTA
+
+
+def test_quem_perdeu_a_leitura_nao_vira_segundo_dono(cache, monkeypatch):
+    cache.gravar('k', RESPOSTA)
+    # Leitura feita antes do dono anterior gravar: voltou vazia
+    monkeypatch.setattr(cache, 'obter', lambda chave: None)
+
+    def calcular():
+        raise AssertionError("a API não deveria ser chamada de novo")
+    assert cache.obter_ou_calcular('k', calcular) == (True, RESPOSTA)
+
+
+def test_falhas_nao_ficam_no_cache(cache):
+    assert cache.obter_ou_calcular('k', lambda: (False, "Erro na IA")) == (False, "Erro na IA")
+    assert cache.obter_ou_calcular('k', lambda: (True, RESPOSTA)) == (True, RESPOSTA)
+    assert cache.estatisticas()['itens'] == 1
+
+
+def test_expiradas_e_lru(tmp_path):
+    cache = CacheRespostasIA(str(tmp_path / 'ia.sqlite3'), ttl_s=0, max_itens=2)
+    cache.gravar('a', RESPOSTA)
+    time.sleep(0.01)
+    assert cache.obter('a') is None
+    cache = CacheRespostasIA(str(tmp_path / 'ia2.sqlite3'), max_itens=2)
+    for chave in 'abc':
+        cache.gravar(chave, RESPOSTA)
+        time.sleep(0.01)
+    assert cache.obter('a') is None and cache.obter('c') == RESPOSTA
@@ -0,0 +1,90 @@
+import math
+
+import carga_taco_csv
+
+CABECALHO = ['Número do Alimento', *carga_taco_csv.COLUNAS_TEXTO, *carga_taco_csv.COLUNAS_NUMERICAS]
+
+
+def _csv(tmp_path, linhas, nome='alimentos.csv'):
+    """Escreve um CSV no formato da TACO; ``linhas`` = [(numero, descricao, kcal, proteina)], o resto vazio."""
+    caminho = tmp_path / nome
+    texto = [';'.join(CABECALHO)]
+    for numero, descricao, kcal, proteina in linhas:
+        valores = {'Número do Alimento': numero, 'Categoria do alimento': 'Cereais e derivados',
+                   'Descrição dos alimentos': descricao, 'Energia (kcal)': kcal, 'Proteína (g)': proteina}
+        texto.append(';'.join(str(valores.get(c, '')) for c in CABECALHO))
+    caminho.write_text('\n'.join(texto) + '\n', encoding='utf-8')
+    return caminho
+
+
+def _tabela(pool):
+    df = pool.consultar("SELECT id, numero, alimento, kcal, proteina FROM public.tabela_taco ORDER BY numero")
+    return {r['numero']: r for r in df.to_dict('records')}
+
+
+def test_limpeza_dos_valores(tmp_path):
+    caminho = _csv(tmp_path, [
+        (1, ' Arroz, integral, cozido ', '124', '2,6'),
+        (2, 'Sal', 'Tr', 'NA'),
+        (3, 'Alho', '*', ''),
+        ('', 'Sem número', '10', '1'),
+        (1, 'Arroz, integral, cozido', '125', '2,6'),
+    ])
+
+    df = carga_taco_csv.ler_csv(caminho)
+
+    assert df.columns.tolist() == carga_taco_csv.COLUNAS
+    assert df['numero'].tolist() == [2, 3, 1]
+    linhas = df.set_index('numero')
+    # Descrição aparada; número repetido fica com a última linha
+    assert (linhas.loc[1, 'alimento'], linhas.loc[1, 'kcal'], linhas.loc[1, 'proteina']) == ('Arroz, integral, cozido', 125, 2.6)
+    assert linhas.loc[2, 'kcal'] == 0 and math.isnan(linhas.loc[2, 'proteina'])
+    assert math.isnan(linhas.loc[3, 'kcal']) and math.isnan(linhas.loc[3, 'proteina'])
+
+
+def test_csv_do_repositorio():
+    df = carga_taco_csv.ler_csv()
+    assert len(df) == 597
+    assert df['numero'].is_unique and df['alimento'].notna().all()
+
+
+def test_recarga_faz_upsert_e_remove_o_que_saiu(tmp_path, pool_migrado):
+    linhas, _ = carga_taco_csv.carregar_taco(pool_migrado, _csv(tmp_path, [
+        (1, 'Arroz, integral, cozido', '124', '2,6'), (2, 'Sal', 'Tr', 'NA'), (3, 'Alho', '113', '7'),
+    ]))
+    assert linhas == 3
+    antes = _tabela(pool_migrado)
+
+    carga_taco_csv.carregar_taco(pool_migrado, _csv(tmp_path, [
+        (1, 'Arroz, integral, cozido', '125', '2,7'), (3, 'Alho', '113', '7'), (4, 'Aveia, flocos, crua', '394', '13,9'),
+    ], nome='nova.csv'))
+
+    depois = _tabela(pool_migrado)
+    assert sorted(depois) == [1, 3, 4]
+    # Upsert mantém o id (referenciado por fora) e atualiza os valores
+    assert depois[1]['id'] == antes[1]['id'] and (depois[1]['kcal'], depois[1]['proteina']) == (125, 2.7)
+    assert depois[3]['id'] == antes[3]['id']
+    assert math.isnan(antes[2]['proteina']) and antes[2]['kcal'] == 0
+
+
+def test_linhas_da_carga_antiga_ganham_numero(tmp_path, pool_migrado):
+    pool_migrado.executar_lote(
+        "INSERT INTO public.tabela_taco (alimento, kcal, proteina) VALUES %s",
+        [('Arroz, integral, cozido', 100, 2), ('Descrição que saiu da TACO', 50, 1)])
+    id_antigo = int(pool_migrado.consultar(
+        "SELECT id FROM public.tabela_taco WHERE alimento = 'Arroz, integral, cozido'")['id'].iloc[0])
+
+    carga_taco_csv.carregar_taco(pool_migrado, _csv(tmp_path, [(1, 'Arroz, integral, cozido', '124', '2,6')]))
+
+    tabela = _tabela(pool_migrado)
+    assert list(tabela) == [1]
+    assert (tabela[1]['id'], tabela[1]['kcal']) == (id_antigo, 124)
+
+
+def test_linha_de_comando(tmp_path, dsn, pool_migrado, capsys):
+    caminho = _csv(tmp_path, [(1, 'Arroz, integral, cozido', '124', '2,6'), (2, 'Sal', 'Tr', 'NA')])
+
+    assert carga_taco_csv.main(['--csv', str(caminho), '--dsn', dsn]) == 0
+
+    assert capsys.readouterr().out.startswith("2 alimentos carregados")
+    assert sorted(_tabela(pool_migrado)) == [1, 2]
@@ -0,0 +1,78 @@
+from datetime import date
+
+import psycopg2
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+import agregados  # noqa: E402
+import exportacao  # noqa: E402
+import repositorio  # noqa: E402
+import usuarios  # noqa: E402
+
+ITENS = [
+    {'data': '2024-03-01', 'alimento': 'Pão de queijo', 'quantidade_g': 50, 'kcal': 181.5, 'p': 2.55, 'c': 17.1, 'g': 12.3, 'gluten': 'Não contém'},
+    {'data': '2024-03-01', 'alimento': 'Macarrão à bolonhesa', 'quantidade_g': 250, 'kcal': 390, 'p': 19, 'c': 55, 'g': 9.5, 'gluten': 'Contém'},
+    {'data': '2024-03-02', 'alimento': 'Açaí', 'quantidade_g': 200, 'kcal': 116, 'p': 1.6, 'c': 12.4, 'g': 7.8},
+]
+COLUNAS = "data, alimento, quantidade, kcal, proteina, carbo, gordura, gluten"
+
+
+def _linhas(pool, user_id):
+    return pool.consultar(f"SELECT {COLUNAS} FROM public.consumo WHERE user_id = %s ORDER BY data, id", (user_id,))
+
+
+def test_ida_e_volta_do_consumo(pool_migrado, tmp_path):
+    bia = usuarios.criar_usuario(pool_migrado, 'bia', 'Bia', 'segredo1')
+    repositorio.importar_consumo(pool_migrado, 1, ITENS, None)
+    destino = tmp_path / 'consumo.parquet'
+
+    assert exportacao.exportar(pool_migrado, 'consumo', str(destino), 1, tamanho_lote=2)[0] == 3
+    arquivo = pq.ParquetFile(destino)
+    assert arquivo.num_row_groups == 2
+    assert arquivo.schema_arrow == exportacao.ESQUEMAS['consumo']
+
+    assert exportacao.importar(pool_migrado, 'consumo', str(destino), bia, tamanho_lote=2)[0] == 3
+    assert _linhas(pool_migrado, bia).equals(_linhas(pool_migrado, 1))
+    assert pool_migrado.consultar("SELECT COUNT(*) AS n FROM public.consumo WHERE alimento_id IS NULL")['n'].iloc[0] == 0
+    assert agregados.verificar_consumo_diario(pool_migrado).empty
+
+    # Substituir troca o histórico em vez de somar
+    exportacao.importar(pool_migrado, 'consumo', str(destino), bia, substituir=True)
+    assert len(_linhas(pool_migrado, bia)) == 3
+
+
+def test_ida_e_volta_do_peso(pool_migrado, tmp_path):
+    pool_migrado.executar_lote(
+        "INSERT INTO public.peso (data, peso_kg, user_id) VALUES %s", [(date(2024, 3, 1), 130.4, 1), (date(2024, 3, 8), 129.25, 1)]
+    )
+    destino = tmp_path / 'peso.parquet'
+    exportacao.exportar(pool_migrado, 'peso', str(destino), 1)
+    pool_migrado.executar("DELETE FROM public.peso")
+    assert exportacao.importar(pool_migrado, 'peso', str(destino), 1)[0] == 2
+    peso = pool_migrado.consultar("SELECT data, peso_kg FROM public.peso ORDER BY data")
+    assert peso['peso_kg'].round(2).tolist() == [130.4, 129.25]
+
+
+def test_arquivo_sem_coluna_obrigatoria(pool_migrado, tmp_path):
+    destino = tmp_path / 'peso.parquet'
+    pq.write_table(pa.table({'data': pa.array([date(2024, 3, 1)])}), destino)
+    with pytest.raises(ValueError, match='peso_kg'):
+        exportacao.importar(pool_migrado, 'peso', str(destino), 1)
+
+
+def test_importacao_e_atomica(pool_migrado, tmp_path):
+    destino = tmp_path / 'peso.parquet'
+    pq.write_table(pa.table({
+        'data': pa.array([date(2024, 3, 1), date(2024, 3, 2), date(2024, 3, 3)]),
+        'peso_kg': pa.array([130.0, 900.0, 129.0]),
+    }), destino)
+    with pytest.raises(psycopg2.errors.CheckViolation):
+        exportacao.importar(pool_migrado, 'peso', str(destino), 1, tamanho_lote=1)
+    assert pool_migrado.consultar("SELECT COUNT(*) AS n FROM public.peso")['n'].iloc[0] == 0
+
+
+def test_tabela_sem_esquema(pool_migrado, tmp_path):
+    with pytest.raises(ValueError):
+        exportacao.exportar(pool_migrado, 'usuario', str(tmp_path / 'x.parquet'), 1)
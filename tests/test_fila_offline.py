@@ -0,0 +1,132 @@
+import time
+from datetime import date
+
+import psycopg2
+import pytest
+
+import fila_offline
+import repositorio
+
+HOJE = date(2026, 10, 17)
+
+
+@pytest.fixture
+def fila(tmp_path):
+    return fila_offline.FilaOffline(str(tmp_path / 'fila.sqlite3'))
+
+
+def _banco_fora():
+    raise psycopg2.OperationalError("could not connect to server")
+
+
+class PoolFora:
+    """Pool cuja conexão caiu no meio do envio."""
+
+    def executar_lote(self, *args, **kwargs):
+        raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+
+class PoolSemConfirmacao:
+    """O INSERT é gravado no banco, mas a conexão cai antes da confirmação chegar."""
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def __getattr__(self, nome):
+        return getattr(self._pool, nome)
+
+    def executar_lote(self, *args, **kwargs):
+        self._pool.executar_lote(*args, **kwargs)
+        raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+
+def _contar(pool, tabela):
+    return int(pool.consultar(f"SELECT COUNT(*) AS n FROM public.{tabela}")['n'].iloc[0])
+
+
+def test_gravar_com_banco_acessivel_vai_direto(pool_migrado, fila):
+    n, erros = repositorio.importar_consumo(
+        lambda: pool_migrado, 1, [{'alimento': 'Arroz', 'kcal': 130}, {'alimento': 'Feijão', 'kcal': 76}], HOJE, fila=fila
+    )
+    assert (n, erros) == (2, [])
+    assert _contar(pool_migrado, 'consumo') == 2
+    assert fila.pendentes() == {'consumo': 0, 'peso': 0, 'rejeitados': 0}
+    # O rollup lido pelo "Resumo do Dia" já reflete a gravação
+    assert pool_migrado.consultar("SELECT kcal FROM public.consumo_diario WHERE data = %s", (HOJE,))['kcal'].iloc[0] == 206
+
+
+def test_gravar_com_erro_de_dados_nao_grava_nada(pool_migrado, fila):
+    with pytest.raises(psycopg2.Error):
+        fila.gravar(lambda: pool_migrado, 'peso', [(HOJE, 80.0, 1), (HOJE, 900.0, 1)])
+    assert _contar(pool_migrado, 'peso') == 0
+    assert fila.pendentes()['peso'] == 0
+
+
+def test_banco_fora_enfileira_e_drenagem_envia(pool_migrado, fila):
+    assert fila.gravar(_banco_fora, 'peso', [(HOJE, 80.5, 1)]) == (1, True)
+    repositorio.importar_consumo(_banco_fora, 1, [{'alimento': 'Ovo cozido', 'kcal': 70}], HOJE, fila=fila)
+    assert fila.pendentes() == {'consumo': 1, 'peso': 1, 'rejeitados': 0}
+    assert fila.ultimo_erro
+
+    assert fila.drenar(pool_migrado) == 2
+    assert fila.pendentes() == {'consumo': 0, 'peso': 0, 'rejeitados': 0}
+    assert _contar(pool_migrado, 'consumo') == 1
+    assert pool_migrado.consultar("SELECT alimento_id FROM public.consumo")['alimento_id'].notna().all()
+
+
+def test_confirmacao_perdida_na_gravacao_direta_nao_duplica(pool_migrado, fila):
+    sem_confirmacao = PoolSemConfirmacao(pool_migrado)
+    assert fila.gravar(lambda: sem_confirmacao, 'peso', [(HOJE, 80.5, 1)]) == (1, True)
+    assert _contar(pool_migrado, 'peso') == 1
+    assert fila.drenar(pool_migrado) == 1
+    assert _contar(pool_migrado, 'peso') == 1
+
+
+def test_banco_lento_nao_prende_a_gravacao(pool_migrado, fila):
+    def pool_lento():
+        time.sleep(1)
+        return pool_migrado
+
+    inicio = time.monotonic()
+    assert fila.gravar(pool_lento, 'peso', [(HOJE, 80.5, 1)], espera_s=0.1) == (1, True)
+    assert time.monotonic() - inicio < 0.5
+    # A gravação direta termina depois do prazo; a cópia da fila tem a mesma chave
+    time.sleep(1.5)
+    assert fila.drenar(pool_migrado) == 1
+    assert _contar(pool_migrado, 'peso') == 1
+
+
+def test_reenvio_apos_confirmacao_perdida_nao_duplica(pool_migrado, fila):
+    fila.enfileirar('peso', [(HOJE, 80.0, 1), (HOJE, 79.5, 1)])
+    # O INSERT chegou ao banco, mas a confirmação não: as linhas continuam na fila
+    registros = fila._proximos('peso', 500)
+    sql, _ = fila_offline.DESTINOS['peso']
+    pool_migrado.executar_lote(sql, fila_offline._montar(pool_migrado, 'peso', registros))
+    assert fila.drenar(pool_migrado) == 2
+    assert _contar(pool_migrado, 'peso') == 2
+
+
+def test_linha_recusada_e_isolada(pool_migrado, fila):
+    fila.enfileirar('peso', [(HOJE, 80.0, 1), (HOJE, 'abc', 1), (HOJE, 79.0, 1)])
+    assert fila.drenar(pool_migrado) == 3
+    assert _contar(pool_migrado, 'peso') == 2
+    assert fila.pendentes() == {'consumo': 0, 'peso': 0, 'rejeitados': 1}
+    assert 'abc' in fila.rejeitados()[0]['linha']
+    assert fila.descartar_rejeitados() == 1
+
+
+def test_conexao_caida_na_drenagem_mantem_linhas(fila):
+    fila.enfileirar('peso', [(HOJE, 80.0, 1)])
+    with pytest.raises(psycopg2.OperationalError):
+        fila.drenar(PoolFora())
+    assert fila.pendentes()['peso'] == 1
+
+
+def test_linhas_antigas_sem_usuario_vao_para_o_usuario_1(pool_migrado, fila):
+    fila.enfileirar('peso', [(HOJE, 80.0)])
+    assert fila.drenar(pool_migrado) == 1
+    assert pool_migrado.consultar("SELECT user_id FROM public.peso")['user_id'].tolist() == [1]
+
+
+def test_fila_vazia_nao_vai_ao_banco(fila):
+    assert fila.drenar(PoolFora()) == 0
@@ -0,0 +1,186 @@
+import json
+import random
+import threading
+import time
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+groq = pytest.importorskip('groq')
+httpx = pytest.importorskip('httpx')
+
+import ia  # noqa: E402
+
+RESPOSTA = {
+    "analise": "Refeição equilibrada.\nAtenção ao \"pão\" (contém glúten) — e ao açúcar \\ doces.",
+    "alimentos": [
+        {"data": "2026-10-17", "alimento": "Pão francês {com manteiga}", "quantidade_g": 50, "kcal": 150, "p": 4.5, "c": 29, "g": 1.5, "gluten": "Contém"},
+        {"data": "2026-10-17", "alimento": "Café [sem açúcar]", "quantidade_g": 200, "kcal": 4, "p": 0.2, "c": 0, "g": 0, "gluten": "Não contém",
+         "detalhes": {"tags": ["bebida", "}"]}},
+        {"data": "2026-10-17", "alimento": "Ovo \"caipira\"", "quantidade_g": 50, "kcal": 70, "p": 6, "c": 0.5, "g": 5, "gluten": "Não contém"},
+    ],
+}
+
+
+def _pedacos(texto, tamanhos):
+    i = 0
+    while i < len(texto):
+        n = next(tamanhos)
+        yield texto[i:i + n]
+        i += n
+
+
+@pytest.mark.parametrize('semente', range(5))
+def test_itens_e_analise_em_qualquer_corte(semente):
+    texto = "```json\n" + json.dumps(RESPOSTA, ensure_ascii=False, indent=2) + "\n```"
+    sorteio = random.Random(semente)
+    leitor, analises = ia.LeitorJsonIncremental(), []
+    for pedaco in _pedacos(texto, iter(lambda: sorteio.randint(1, 12), None)):
+        leitor.alimentar(pedaco)
+        analises.append(leitor.analise)
+    assert leitor.itens == RESPOSTA['alimentos']
+    assert json.loads(leitor.json_completo()) == RESPOSTA
+    # A análise parcial só cresce, sempre como prefixo da final
+    assert analises[-1] == RESPOSTA['analise']
+    assert all(RESPOSTA['analise'].startswith(a) for a in analises)
+
+
+def test_cada_item_sai_assim_que_fecha():
+    texto = json.dumps(RESPOSTA, ensure_ascii=False)
+    leitor = ia.LeitorJsonIncremental()
+    fim_primeiro = texto.index('"gluten": "Contém"}') + len('"gluten": "Contém"}')
+    assert leitor.alimentar(texto[:fim_primeiro - 1]) == []
+    assert leitor.alimentar(texto[fim_primeiro - 1:fim_primeiro]) == [RESPOSTA['alimentos'][0]]
+    assert leitor.analise == RESPOSTA['analise']
+
+
+def test_chave_analise_aninhada_nao_conta():
+    leitor = ia.LeitorJsonIncremental()
+    leitor.alimentar('{"alimentos": [{"alimento": "x", "analise": "não é esta"}], "analise": "esta"}')
+    assert leitor.analise == "esta"
+    assert leitor.itens == [{"alimento": "x", "analise": "não é esta"}]
+
+
+# --- LIMITE DE TAXA (429) E LOTE CONCORRENTE ---
+def _erro_429(retry_after=None):
+    cabecalhos = {} if retry_after is None else {'retry-after': str(retry_after)}
+    resposta = httpx.Response(429, headers=cabecalhos, request=httpx.Request('POST', 'https://api.groq.com'))
+    return groq.RateLimitError("rate limit", response=resposta, body=None)
+
+
+def _completion(texto_usuario, data='2026-10-17'):
+    conteudo = json.dumps({"analise": f"ok: {texto_usuario}", "alimentos": [
+        {"data": data, "alimento": texto_usuario, "quantidade_g": 100, "kcal": 100, "p": 1, "c": 1, "g": 1, "gluten": "Não contém"}]})
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=conteudo))], usage=None)
+
+
+class GroqFalso:
+    """Substitui ``ia.Groq``: ``responder(texto)`` devolve a completion ou levanta o erro."""
+    chamadas = []
+
+    def __init__(self, responder):
+        self.responder = responder
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._criar))
+
+    def _criar(self, messages, **_):
+        texto = messages[-1]['content']
+        GroqFalso.chamadas.append((texto, time.monotonic()))
+        return self.responder(texto)
+
+
+@pytest.fixture
+def groq_falso(monkeypatch, tmp_path):
+    monkeypatch.setattr(ia, '_pausa_ate', 0.0)
+    # Cache de respostas descartável: o padrão persiste em .cache/ entre execuções
+    monkeypatch.setattr(ia, '_cache', ia.CacheRespostasIA(str(tmp_path / 'ia.sqlite3')))
+    monkeypatch.setattr(GroqFalso, 'chamadas', [])
+
+    def instalar(responder):
+        monkeypatch.setattr(ia, 'Groq', lambda api_key, max_retries: GroqFalso(responder))
+        return GroqFalso.chamadas
+    return instalar
+
+
+def test_429_pausa_todas_as_threads(groq_falso):
+    recebeu_429 = threading.Event()
+    erros = iter([_erro_429(retry_after=0.3)])
+
+    def responder(texto):
+        if texto == 'a':
+            erro = next(erros, None)
+            if erro:
+                recebeu_429.set()
+                raise erro
+        return _completion(texto)
+    chamadas = groq_falso(responder)
+
+    resultados = {}
+    threads = [threading.Thread(target=lambda: resultados.update(a=ia._chamar_groq('a', 'chave', date(2026, 10, 17))))]
+    threads[0].start()
+    assert recebeu_429.wait(2)
+    # A outra thread não recebeu o 429, mas respeita a pausa pedida pela Groq
+    threads.append(threading.Thread(target=lambda: resultados.update(b=ia._chamar_groq('b', 'chave', date(2026, 10, 17)))))
+    threads[1].start()
+    for t in threads:
+        t.join(5)
+
+    assert resultados['a'][0] and resultados['b'][0]
+    momentos = {texto: [m for t, m in chamadas if t == texto] for texto in 'ab'}
+    assert len(momentos['a']) == 2 and len(momentos['b']) == 1
+    assert momentos['b'][0] - momentos['a'][0] >= 0.25
+    assert momentos['a'][1] - momentos['a'][0] >= 0.25
+
+
+def test_429_desiste_depois_das_tentativas(groq_falso):
+    def responder(texto):
+        raise _erro_429(retry_after=0)
+    chamadas = groq_falso(responder)
+
+    sucesso, mensagem = ia._chamar_groq('a', 'chave', date(2026, 10, 17))
+
+    assert not sucesso and "Limite de requisições" in mensagem
+    assert len(chamadas) == ia.TENTATIVAS_LIMITE
+
+
+def test_429_sem_retry_after_usa_backoff(monkeypatch):
+    monkeypatch.setattr(ia, '_pausa_ate', 0.0)
+    monkeypatch.setattr(ia.random, 'uniform', lambda a, b: 0)
+
+    antes = time.monotonic()
+    ia._pausar(_erro_429(), tentativa=2)
+    assert ia._pausa_ate - antes == pytest.approx(4, abs=0.1)
+    # Uma pausa menor não encurta a que já está valendo
+    ia._pausar(_erro_429(retry_after=1), tentativa=0)
+    assert ia._pausa_ate - antes == pytest.approx(4, abs=0.1)
+
+
+def test_lote_respeita_a_concorrencia_e_a_data_do_cabecalho(groq_falso):
+    em_andamento, pico, lock = [0], [0], threading.Lock()
+
+    def responder(texto):
+        with lock:
+            em_andamento[0] += 1
+            pico[0] = max(pico[0], em_andamento[0])
+        time.sleep(0.05)
+        with lock:
+            em_andamento[0] -= 1
+        return _completion(texto)
+    groq_falso(responder)
+
+    texto = "12/10: lote teste café\nlote teste almoço\n13/10\nlote teste jantar\nlote teste ceia\nlote teste lanche"
+    refeicoes = ia.separar_refeicoes(texto, hoje=date(2026, 10, 17))
+    assert [d.day for d, _ in refeicoes] == [12, 12, 13, 13, 13]
+
+    resultados = list(ia.processar_lote(refeicoes, 'chave', max_concorrencia=2, hoje=date(2026, 10, 17)))
+
+    assert sorted(p for p, _, _ in resultados) == [0, 1, 2, 3, 4]
+    assert pico[0] == 2
+    por_posicao = {p: dados for p, sucesso, dados in resultados if sucesso}
+    assert por_posicao[0]['alimentos'][0]['data'] == '2026-10-12'
+    assert por_posicao[4]['alimentos'][0]['data'] == '2026-10-13'
+
+
+def test_cabecalho_sem_ano_no_futuro_e_do_ano_anterior():
+    refeicoes = ia.separar_refeicoes("28/12: ceia\n- 2027-01-02: almoço", hoje=date(2027, 1, 3))
+    assert refeicoes == [(date(2026, 12, 28), 'ceia'), (date(2027, 1, 2), 'almoço')]
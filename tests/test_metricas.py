@@ -0,0 +1,53 @@
+import json
+
+import metricas
+
+
+def _linhas(caminho):
+    with open(caminho, encoding='utf-8') as f:
+        return [json.loads(linha) for linha in f]
+
+
+def test_exportar_grava_so_eventos_novos(tmp_path):
+    registro = metricas.RegistroMetricas()
+    caminho = tmp_path / 'metricas.jsonl'
+    for i in range(3):
+        registro.registrar('sql', f'SELECT {i}', 0.001)
+    assert registro.exportar(caminho) == 3
+    assert registro.exportar(caminho) == 0
+    registro.registrar('sql', 'SELECT  3', 0.002, linhas=1)
+    assert registro.exportar(caminho) == 1
+    assert [e['nome'] for e in _linhas(caminho)] == ['SELECT 0', 'SELECT 1', 'SELECT 2', 'SELECT 3']
+    # O resumo continua com todos os eventos
+    assert registro.resumo()['chamadas'].sum() == 4
+
+
+def test_exportar_com_buffer_cheio(tmp_path):
+    registro = metricas.RegistroMetricas(capacidade=2)
+    caminho = tmp_path / 'metricas.jsonl'
+    registro.registrar('ia', 'a', 0.1)
+    assert registro.exportar(caminho) == 1
+    for nome in 'bcd':
+        registro.registrar('ia', nome, 0.1)
+    # 'b' saiu do buffer antes de ser exportado
+    assert registro.exportar(caminho) == 2
+    assert [e['nome'] for e in _linhas(caminho)] == ['a', 'c', 'd']
+
+
+def test_exportar_depois_de_limpar(tmp_path):
+    registro = metricas.RegistroMetricas()
+    caminho = tmp_path / 'metricas.jsonl'
+    registro.registrar('sql', 'x', 0.1)
+    registro.limpar()
+    assert registro.exportar(caminho) == 0
+    registro.registrar('sql', 'y', 0.1)
+    assert registro.exportar(caminho) == 1
+    assert [e['nome'] for e in _linhas(caminho)] == ['y']
+
+
+def test_medir_registra_dados_extras():
+    registro = metricas.RegistroMetricas()
+    with registro.medir('sql', 'SELECT 1') as m:
+        m['linhas'] = 5
+    evento, = registro.eventos()
+    assert (evento['tipo'], evento['linhas']) == ('sql', 5) and evento['duracao_ms'] >= 0
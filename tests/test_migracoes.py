@@ -0,0 +1,124 @@
+import threading
+from datetime import date
+
+import pytest
+
+import agregados
+import banco
+import migracoes
+import repositorio
+import taco
+
+
+def _executar_v1(pool):
+    """Esquema do app antes das migrações: as tabelas que ele criava sozinho."""
+    for sql in migracoes.MIGRACOES[0][2]:
+        pool.executar(sql)
+
+
+def test_banco_vazio_chega_a_versao_atual(pool):
+    assert migracoes.versao_do_banco(pool) == 0
+    assert migracoes.aplicar_migracoes(pool) == [numero for numero, _, _ in migracoes.MIGRACOES]
+    assert migracoes.versao_do_banco(pool) == migracoes.VERSAO_ATUAL
+    assert migracoes.aplicar_migracoes(pool) == []
+
+
+def test_banco_legado_migra_sem_perder_linhas(pool):
+    _executar_v1(pool)
+    pool.executar_lote(
+        "INSERT INTO public.consumo (data, alimento, quantidade, kcal, proteina, carbo, gordura, gluten) VALUES %s",
+        [(date(2024, 1, 2), 'Arroz', 100, 130, 2.5, 28, 0.2, 'Não contém'),
+         (date(2024, 1, 2), 'Pão francês', 50, None, None, None, None, 'Contém'),
+         (date(2024, 1, 3), '', 10, 5, 0, 1, 0, None)]
+    )
+    pool.executar_lote("INSERT INTO public.peso (data, peso_kg) VALUES %s", [(date(2024, 1, 2), 130.0), (date(2024, 1, 9), 129.1)])
+
+    migracoes.aplicar_migracoes(pool)
+
+    consumo = pool.consultar("SELECT alimento, kcal, contem_gluten, user_id FROM public.consumo ORDER BY id")
+    assert consumo['user_id'].tolist() == [1, 1, 1]
+    assert consumo['kcal'].tolist() == [130, 0, 5]
+    assert consumo['alimento'].tolist() == ['Arroz', 'Pão francês', '?']
+    assert consumo['contem_gluten'].tolist() == [False, True, None]
+    assert pool.consultar("SELECT user_id FROM public.peso")['user_id'].tolist() == [1, 1]
+    assert agregados.verificar_consumo_diario(pool).empty
+    diario = pool.consultar("SELECT data, kcal FROM public.consumo_diario WHERE user_id = 1 ORDER BY data")
+    assert diario['kcal'].tolist() == [130, 5]
+
+
+def test_rollup_acompanha_escritas(pool_migrado):
+    pool_migrado.executar(
+        "INSERT INTO public.consumo (data, alimento, quantidade, kcal, proteina, carbo, gordura) VALUES (%s, 'Ovo', 50, 70, 6, 0.5, 5)",
+        (date(2024, 5, 1),)
+    )
+    pool_migrado.executar("UPDATE public.consumo SET data = %s", (date(2024, 5, 2),))
+    pool_migrado.executar(
+        "INSERT INTO public.consumo (data, alimento, quantidade, kcal, proteina, carbo, gordura) VALUES (%s, 'Banana', 100, 90, 1, 23, 0)",
+        (date(2024, 5, 2),)
+    )
+    pool_migrado.executar("DELETE FROM public.consumo WHERE alimento = 'Banana'")
+    assert agregados.verificar_consumo_diario(pool_migrado).empty
+    assert pool_migrado.consultar("SELECT data, kcal FROM public.consumo_diario")[['data', 'kcal']].values.tolist() == [[date(2024, 5, 2), 70]]
+
+
+GLUTEN_CLASSIFICADO = [
+    ('Contém', True), ('contem glúten', True), ('Contém traços', True), ('Pode conter', True), ('Sim', True), (' s ', True),
+    ('Não contém', False), ('nao', False), ('Sem glúten', False), ('Isento', False), ('gluten free', False),
+    (None, None), ('', None), ('  ', None), ('?', None), ('NI', None), ('Não informado', None), ('Desconhecido', None),
+    ('talvez', None),
+]
+
+
+@pytest.mark.parametrize('gluten, esperado', GLUTEN_CLASSIFICADO)
+def test_gluten_classificado_na_escrita(pool_migrado, gluten, esperado):
+    pool_migrado.executar("INSERT INTO public.consumo (data, alimento, gluten) VALUES (CURRENT_DATE, 'Item', %s)", (gluten,))
+    assert pool_migrado.consultar("SELECT contem_gluten FROM public.consumo")['contem_gluten'].tolist() == [esperado]
+
+
+def test_gluten_reclassificado_ao_editar(pool_migrado):
+    pool_migrado.executar("INSERT INTO public.consumo (data, alimento, gluten) VALUES (CURRENT_DATE, 'Pão', 'NI')")
+    pool_migrado.executar("UPDATE public.consumo SET gluten = 'Contém'")
+    assert pool_migrado.consultar("SELECT contem_gluten FROM public.consumo")['contem_gluten'].tolist() == [True]
+
+
+def test_gluten_da_taco_chega_classificado(pool_migrado):
+    itens, _ = taco.IndiceTaco([
+        (1, 'Pão, trigo, francês', 300, 8, 58.6, 3.1), (2, 'Pão, de queijo, assado', 363, 5.1, 34.2, 24.6),
+    ]).resolver("1 pão francês + 100g pão de queijo", date(2024, 5, 1))
+    repositorio.importar_consumo(pool_migrado, 1, itens, date(2024, 5, 1))
+
+    consumo = pool_migrado.consultar("SELECT alimento, contem_gluten FROM public.consumo ORDER BY id")
+    assert consumo.values.tolist() == [['Pão, trigo, francês', True], ['Pão, de queijo, assado', False]]
+
+
+def test_migracoes_concorrentes_aplicam_uma_vez(dsn):
+    pools = [banco.PoolBanco(dsn, max_conexoes=1) for _ in range(3)]
+    barreira = threading.Barrier(len(pools))
+    aplicadas, erros = [], []
+
+    def migrar(pool):
+        barreira.wait()
+        try:
+            aplicadas.extend(migracoes.aplicar_migracoes(pool))
+        except Exception as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=migrar, args=(pool,)) for pool in pools]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    try:
+        assert erros == []
+        assert sorted(aplicadas) == [numero for numero, _, _ in migracoes.MIGRACOES]
+        assert pools[0].consultar("SELECT COUNT(*) AS n FROM public.schema_versao")['n'].iloc[0] == migracoes.VERSAO_ATUAL
+    finally:
+        for pool in pools:
+            pool.fechar()
+
+
+def test_garantir_esquema_vai_ao_banco_uma_vez_por_pool(pool):
+    assert migracoes.garantir_esquema(pool) == [numero for numero, _, _ in migracoes.MIGRACOES]
+    idas = banco.idas_ao_banco()
+    assert migracoes.garantir_esquema(pool) == []
+    assert banco.idas_ao_banco() == idas
@@ -0,0 +1,76 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import projecao
+
+INICIO = date(2026, 1, 1)
+
+
+def _pesagens(pesos, passo_dias=1, inicio=INICIO):
+    return pd.DataFrame({
+        'data': [inicio + timedelta(days=i * passo_dias) for i in range(len(pesos))],
+        'peso_kg': pesos,
+    })
+
+
+def test_previsao_pela_regressao_das_ultimas_semanas():
+    # Dois meses subindo e depois 4 semanas perdendo 1 kg/semana: só a janela final conta
+    pesos = list(130 + np.arange(60) * 0.1) + list(136 - np.arange(1, 29) / 7)
+    df_grafico, resumo = projecao.projetar(_pesagens(pesos), meta=130, perda_semanal=0.8)
+
+    ultimo = INICIO + timedelta(days=87)
+    assert resumo['peso_atual'] == pytest.approx(132)
+    assert resumo['kg_por_semana'] == pytest.approx(-1, abs=0.05)
+    # Faltam 2 kg a 1 kg/semana
+    assert abs((resumo['previsao_meta'] - ultimo).days - 14) <= 1
+    assert "previsão de chegar a 130 kg" in projecao.texto_previsao(resumo, 130)
+    assert df_grafico.index[-1] == pd.Timestamp(ultimo + timedelta(days=30))
+
+
+def test_plano_desce_desde_a_primeira_pesagem_ate_a_meta():
+    df_grafico, _ = projecao.projetar(_pesagens([100, 99.5, 99]), meta=98, perda_semanal=0.7, dias_futuros=30)
+
+    assert df_grafico.index.name == 'data'
+    assert df_grafico.columns.tolist() == ['peso_kg', 'tendencia', 'plano']
+    assert df_grafico['plano'].iloc[:3].tolist() == pytest.approx([100, 99.9, 99.8])
+    assert df_grafico['plano'].min() == 98
+    # Tendência não é extrapolada além da última pesagem
+    assert df_grafico['tendencia'].iloc[:3].notna().all() and df_grafico['tendencia'].iloc[3:].isna().all()
+
+
+def test_dias_sem_pesagem_e_pesagens_repetidas():
+    df = pd.DataFrame({
+        'data': [INICIO, INICIO, INICIO + timedelta(days=3)],
+        'peso_kg': [100.0, 101.0, 99.0],
+    })
+    df_grafico, resumo = projecao.projetar(df, meta=90, perda_semanal=0.5, dias_futuros=0)
+
+    assert df_grafico['peso_kg'].tolist()[0] == 100.5
+    assert df_grafico['peso_kg'].isna().tolist() == [False, True, True, False]
+    assert resumo['peso_atual'] == 99.0
+
+
+def test_historico_longo_e_reamostrado():
+    rng = np.random.default_rng(1)
+    pesos = 140 - np.arange(3650) * 0.01 + rng.normal(0, 0.3, 3650)
+    df_grafico, resumo = projecao.projetar(_pesagens(pesos), meta=80, perda_semanal=0.5)
+
+    assert len(df_grafico) <= projecao.PONTOS_MAX + 1
+    # Cada ponto é a média da faixa, não uma pesagem solta
+    assert df_grafico['peso_kg'].iloc[0] == pytest.approx(pesos[:10].mean())
+    assert resumo['peso_atual'] == pytest.approx(pesos[-1])
+
+
+@pytest.mark.parametrize('pesos, passo, meta, texto', [
+    ([100.0], 1, 90, "Registre mais pesagens"),
+    ([100.0, 100.5, 101.0], 7, 90, "não é atingida"),
+    ([89.0, 88.5, 88.0], 7, 90, "Meta de 90 kg atingida"),
+])
+def test_sem_previsao(pesos, passo, meta, texto):
+    _, resumo = projecao.projetar(_pesagens(pesos, passo), meta=meta, perda_semanal=0.5)
+
+    assert resumo['previsao_meta'] is None
+    assert texto in projecao.texto_previsao(resumo, meta)
@@ -0,0 +1,172 @@
+from datetime import date
+
+import pytest
+
+import repositorio
+import usuarios
+
+HOJE = date(2026, 10, 17)
+INICIO, FIM = date(2026, 10, 1), date(2026, 10, 31)
+
+
+def _registrar(pool, user_id, itens):
+    """Grava ``[(data, alimento, quantidade, kcal)]`` e retorna os ids na ordem."""
+    with pool.transacao() as cur:
+        ids = []
+        for data, alimento, quantidade, kcal in itens:
+            cur.execute(
+                "INSERT INTO public.consumo (data, alimento, quantidade, kcal, proteina, carbo, gordura, user_id) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id",
+                (data, alimento, quantidade, kcal, kcal / 10, kcal / 5, kcal / 20, user_id))
+            ids.append(cur.fetchone()[0])
+    return ids
+
+
+def _paginas(pool, user_id, tamanho, inicio=INICIO, fim=FIM):
+    paginas, cursor = [], None
+    while True:
+        df, cursor = repositorio.listar_consumo_pagina(pool, user_id, inicio, fim, tamanho, cursor)
+        paginas.append(df['id'].tolist())
+        if cursor is None:
+            return paginas
+
+
+def test_validar_item_converte_campos():
+    linha = repositorio.validar_item({'alimento': ' Arroz ', 'kcal': '130,5', 'p': 2, 'data': '2026-10-01'}, HOJE)
+    assert linha == (date(2026, 10, 1), 'Arroz', 1.0, 130.5, 2.0, 0.0, 0.0, 'NI')
+
+
+@pytest.mark.parametrize('valor', ['nan', 'NaN', 'inf', '-inf', float('nan'), float('inf')])
+def test_validar_item_recusa_valores_nao_finitos(valor):
+    with pytest.raises(ValueError, match="não é um número finito"):
+        repositorio.validar_item({'alimento': 'Arroz', 'kcal': valor}, HOJE)
+
+
+@pytest.mark.parametrize('item, erro', [
+    ({'alimento': ''}, "vazio"),
+    ({'alimento': 'Arroz', 'kcal': -1}, "negativo"),
+    ({'alimento': 'Arroz', 'p': 'muito'}, "não é numérico"),
+    ({'alimento': 'Arroz', 'data': '31/02'}, "data inválida"),
+])
+def test_validar_item_recusa_invalidos(item, erro):
+    with pytest.raises(ValueError, match=erro):
+        repositorio.validar_item(item, HOJE)
+
+
+def test_validar_itens_lista_erros_por_linha():
+    linhas, erros = repositorio.validar_itens([{'alimento': 'Arroz'}, {'alimento': 'Pão', 'kcal': 'nan'}], HOJE)
+    assert len(linhas) == 1
+    assert erros == [{'linha': 2, 'alimento': 'Pão', 'erro': "'kcal' não é um número finito: 'nan'"}]
+
+
+# --- HISTÓRICO PAGINADO ---
+def test_paginas_cobrem_o_periodo_sem_repetir(pool_migrado):
+    # Vários itens no mesmo dia: o id desempata a ordem e o cursor
+    dias = [date(2026, 10, 10)] * 3 + [date(2026, 10, 12)] * 3 + [date(2026, 10, 15)]
+    ids = _registrar(pool_migrado, 1, [(d, f"Item {i}", 100, 100) for i, d in enumerate(dias)])
+    _registrar(pool_migrado, 1, [(date(2026, 9, 30), "Fora do período", 100, 100)])
+
+    paginas = _paginas(pool_migrado, 1, 3)
+
+    esperado = [i for _, i in sorted(zip(dias, ids), reverse=True)]
+    assert paginas == [esperado[:3], esperado[3:6], esperado[6:]]
+
+
+def test_ultima_pagina_cheia_nao_gera_cursor(pool_migrado):
+    _registrar(pool_migrado, 1, [(date(2026, 10, d), "Arroz", 100, 130) for d in range(1, 7)])
+
+    assert [len(p) for p in _paginas(pool_migrado, 1, 3)] == [3, 3]
+    assert _paginas(pool_migrado, 1, 6, inicio=date(2026, 11, 1), fim=date(2026, 11, 30)) == [[]]
+
+
+def test_pagina_so_tem_itens_do_usuario(pool_migrado):
+    bia = usuarios.criar_usuario(pool_migrado, 'bia', 'Bia', 'segredo1')
+    meus = _registrar(pool_migrado, 1, [(date(2026, 10, 5), "Arroz", 100, 130)])
+    _registrar(pool_migrado, bia, [(date(2026, 10, 5), "Feijão", 100, 76)] * 4)
+
+    assert _paginas(pool_migrado, 1, 2) == [meus]
+
+
+# --- EDIÇÃO E EXCLUSÃO EM LOTE ---
+def _linhas(pool, ids):
+    df = pool.consultar(
+        "SELECT id, data, quantidade, kcal, proteina, carbo, gordura FROM public.consumo WHERE id = ANY(%s) ORDER BY id",
+        ([int(i) for i in ids],))
+    return df.set_index('id').to_dict('index')
+
+
+def test_editar_lote_move_e_escala_os_macros(pool_migrado):
+    ids = _registrar(pool_migrado, 1, [(date(2026, 10, 5), "Arroz", 100, 130), (date(2026, 10, 6), "Feijão", 80, 60)])
+    intocado = _registrar(pool_migrado, 1, [(date(2026, 10, 5), "Ovo", 50, 70)])
+
+    assert repositorio.editar_consumo_lote(pool_migrado, 1, ids, nova_data=date(2026, 10, 7), fator=1.5) == 2
+
+    linhas = _linhas(pool_migrado, ids + intocado)
+    assert linhas[ids[0]] == pytest.approx({
+        'data': date(2026, 10, 7), 'quantidade': 150, 'kcal': 195, 'proteina': 19.5, 'carbo': 39, 'gordura': 9.75})
+    assert (linhas[ids[1]]['data'], linhas[ids[1]]['quantidade'], linhas[ids[1]]['kcal']) == (date(2026, 10, 7), 120, 90)
+    assert (linhas[intocado[0]]['data'], linhas[intocado[0]]['kcal']) == (date(2026, 10, 5), 70)
+
+
+def test_editar_lote_so_data_ou_nada(pool_migrado):
+    ids = _registrar(pool_migrado, 1, [(date(2026, 10, 5), "Arroz", 100, 130)])
+
+    assert repositorio.editar_consumo_lote(pool_migrado, 1, ids) == 0
+    assert repositorio.editar_consumo_lote(pool_migrado, 1, [], nova_data=date(2026, 10, 7)) == 0
+    assert repositorio.editar_consumo_lote(pool_migrado, 1, ids, nova_data=date(2026, 10, 7)) == 1
+    assert _linhas(pool_migrado, ids)[ids[0]]['kcal'] == 130
+
+
+@pytest.mark.parametrize('fator', [0, -1])
+def test_editar_lote_recusa_fator_nao_positivo(pool_migrado, fator):
+    ids = _registrar(pool_migrado, 1, [(date(2026, 10, 5), "Arroz", 100, 130)])
+    with pytest.raises(ValueError, match="positivo"):
+        repositorio.editar_consumo_lote(pool_migrado, 1, ids, fator=fator)
+    assert _linhas(pool_migrado, ids)[ids[0]]['kcal'] == 130
+
+
+def test_lote_ignora_ids_de_outro_usuario(pool_migrado):
+    bia = usuarios.criar_usuario(pool_migrado, 'bia', 'Bia', 'segredo1')
+    meus = _registrar(pool_migrado, 1, [(date(2026, 10, 5), "Arroz", 100, 130)])
+    dela = _registrar(pool_migrado, bia, [(date(2026, 10, 5), "Feijão", 100, 76), (date(2026, 10, 6), "Ovo", 50, 70)])
+
+    assert repositorio.editar_consumo_lote(pool_migrado, 1, meus + dela, fator=2) == 1
+    assert repositorio.excluir_consumo(pool_migrado, 1, meus + dela) == 1
+
+    linhas = _linhas(pool_migrado, meus + dela)
+    assert sorted(linhas) == dela
+    assert [linhas[i]['kcal'] for i in dela] == [76, 70]
+
+
+def test_excluir_sem_ids(pool_migrado):
+    _registrar(pool_migrado, 1, [(date(2026, 10, 5), "Arroz", 100, 130)])
+    assert repositorio.excluir_consumo(pool_migrado, 1, []) == 0
+    assert repositorio.contar_consumo(pool_migrado, 1, INICIO, FIM) == 1
+
+
+# --- VERSÃO DOS DADOS ---
+def test_versao_sobe_a_cada_escrita_na_tabela(pool_migrado):
+    assert repositorio.ler_versoes_dados(pool_migrado) == {'consumo': 0, 'peso': 0}
+
+    # Um INSERT multi-linha é um comando só: uma versão a mais
+    pool_migrado.executar_lote(
+        "INSERT INTO public.consumo (data, alimento, kcal) VALUES %s",
+        [(date(2026, 10, 5), "Arroz", 130), (date(2026, 10, 5), "Feijão", 76)])
+    assert repositorio.ler_versoes_dados(pool_migrado) == {'consumo': 1, 'peso': 0}
+
+    pool_migrado.executar("INSERT INTO public.peso (data, peso_kg) VALUES (%s, %s)", (date(2026, 10, 5), 120.5))
+    ids = pool_migrado.consultar("SELECT id FROM public.consumo")['id'].tolist()
+    repositorio.editar_consumo_lote(pool_migrado, 1, ids, fator=2)
+    repositorio.excluir_consumo(pool_migrado, 1, ids[:1])
+    assert repositorio.ler_versoes_dados(pool_migrado) == {'consumo': 3, 'peso': 1}
+
+    pool_migrado.executar("TRUNCATE public.peso")
+    assert repositorio.ler_versoes_dados(pool_migrado)['peso'] == 2
+
+
+def test_versao_nao_sobe_em_escrita_desfeita(pool_migrado):
+    with pytest.raises(RuntimeError):
+        with pool_migrado.transacao() as cur:
+            cur.execute("INSERT INTO public.consumo (data, alimento, kcal) VALUES (CURRENT_DATE, 'Arroz', 130)")
+            raise RuntimeError("cancelado")
+    assert repositorio.ler_versoes_dados(pool_migrado) == {'consumo': 0, 'peso': 0}
@@ -0,0 +1,128 @@
+from datetime import date
+
+import pytest
+
+import taco
+
+REGISTROS = [
+    (1, 'Arroz, tipo 1, cozido', 128, 2.5, 28.1, 0.2),
+    (2, 'Arroz, integral, cozido', 124, 2.6, 25.8, 1.0),
+    (3, 'Ovo, de galinha, inteiro, cozido/10minutos', 146, 13.3, 0.6, 9.5),
+    (4, 'Ovo, de galinha, inteiro, frito', 240, 15.6, 1.2, 18.6),
+    (5, 'Biscoito, doce, maisena', 443, 8.1, 75.2, 12.0),
+    (6, 'Biscoito, salgado, cream cracker', 432, 10.1, 68.7, 14.4),
+    (7, 'Pão, trigo, francês', 300, 8.0, 58.6, 3.1),
+    (8, 'Pão, de queijo, assado', 363, 5.1, 34.2, 24.6),
+    (9, 'Banana, prata, crua', 98, 1.3, 26.0, 0.1),
+    (10, 'Açúcar, mascavo', None, None, None, None),
+]
+HOJE = date(2026, 10, 17)
+
+
+@pytest.fixture
+def indice():
+    return taco.IndiceTaco(REGISTROS)
+
+
+# --- RESOLVEDOR LOCAL ---
+def test_sem_energia_fica_fora_do_indice(indice):
+    assert len(indice) == 9
+    assert indice.casar('acucar mascavo') is None
+
+
+def test_resolve_quantidade_em_gramas_e_em_unidades(indice):
+    itens, pendentes = indice.resolver("200g arroz integral cozido + 2 ovos", HOJE)
+
+    assert pendentes == []
+    arroz, ovos = itens
+    assert arroz == {
+        'data': '2026-10-17', 'alimento': 'Arroz, integral, cozido', 'quantidade_g': 200.0,
+        'kcal': 248.0, 'p': 5.2, 'c': 51.6, 'g': 2.0, 'gluten': 'Não contém', 'fonte': 'TACO',
+    }
+    # "ovos" cai no alias do ovo cozido; 2 unidades de 50 g
+    assert ovos['alimento'] == 'Ovo, de galinha, inteiro, cozido/10minutos'
+    assert ovos['quantidade_g'] == 100.0
+    assert ovos['kcal'] == 146.0
+
+
+def test_medidas_caseiras_e_numeros_por_extenso(indice):
+    itens, pendentes = indice.resolver("1,5 xícara de arroz; uma banana", HOJE)
+
+    assert pendentes == []
+    assert [(i['alimento'], i['quantidade_g']) for i in itens] == [
+        ('Arroz, tipo 1, cozido', 240.0), ('Banana, prata, crua', 70.0),
+    ]
+
+
+def test_o_que_nao_resolve_com_seguranca_vai_para_a_ia(indice):
+    texto = "arroz + 2 biscoitos + 100g biscoito + 50g farofa de mandioca + 2 ovos fritos"
+    itens, pendentes = indice.resolver(texto, HOJE)
+
+    # Sem quantidade, sem peso de unidade, alimento-base ambíguo e alimento fora da tabela
+    assert pendentes == ["arroz", "2 biscoitos", "100g biscoito", "50g farofa de mandioca"]
+    assert [(i['alimento'], i['quantidade_g']) for i in itens] == [('Ovo, de galinha, inteiro, frito', 100.0)]
+
+
+def test_casar_prefere_alias_e_preparo_cozido(indice):
+    assert indice.casar('arroz')['id'] == 1
+    assert indice.casar('Arroz integral')['id'] == 2
+    assert indice.casar('ovo frito')['id'] == 4
+    assert indice.casar('biscoito') is None
+    assert indice.casar('biscoito maisena')['id'] == 5
+    # A primeira palavra da descrição precisa ter sido digitada
+    assert indice.casar('galinha') is None
+
+
+def test_gluten_pela_descricao(indice):
+    itens, _ = indice.resolver("1 pão francês + 100g pão de queijo", HOJE)
+
+    assert [(i['alimento'], i['gluten']) for i in itens] == [
+        ('Pão, trigo, francês', 'Contém'), ('Pão, de queijo, assado', 'Não contém'),
+    ]
+
+
+def test_indice_do_processo_le_a_tabela_taco(pool_migrado):
+    pool_migrado.executar_lote(
+        "INSERT INTO public.tabela_taco (alimento, kcal, proteina, carbo, gordura) VALUES %s",
+        [r[1:] for r in REGISTROS])
+    taco.invalidar_indice()
+    try:
+        indice = taco.obter_indice(pool_migrado)
+        assert len(indice) == 9
+        assert taco.obter_indice(pool_migrado) is indice
+        itens, pendentes = indice.resolver("200g arroz integral", HOJE)
+        assert pendentes == [] and itens[0]['kcal'] == 248.0
+    finally:
+        taco.invalidar_indice()
+
+
+# --- BUSCA FUZZY (AUTOCOMPLETE) ---
+def test_busca_tolera_erro_de_digitacao_e_acento(indice):
+    assert indice.buscar('aroz integrl')[0]['id'] == 2
+    assert indice.buscar('PAO FRANCES')[0]['id'] == 7
+    assert indice.buscar('pão de queijo')[0]['id'] == 8
+
+
+def test_busca_ordena_por_score_e_respeita_o_limite(indice):
+    resultados = indice.buscar('arroz', limite=1)
+    assert len(resultados) == 1
+
+    resultados = indice.buscar('arroz')
+    scores = [r['score'] for r in resultados]
+    assert scores == sorted(scores, reverse=True)
+    assert {r['id'] for r in resultados} == {1, 2}
+
+
+def test_busca_prefere_o_alimento_preferido():
+    # Sem o bônus, a descrição mais curta ("ouro") teria a maior similaridade
+    indice = taco.IndiceTaco([(1, 'Banana, ouro, crua', 112, 1.5, 29.3, 0.2), (2, 'Banana, prata, crua', 98, 1.3, 26.0, 0.1)])
+    assert [r['id'] for r in indice.buscar('banana')] == [2, 1]
+    assert [r['id'] for r in indice.buscar('banana ouro')] == [1, 2]
+
+
+def test_busca_descarta_pouca_cobertura(indice):
+    assert indice.buscar('') == []
+    assert indice.buscar('xyzw') == []
+    # Prefixo digitado: nem todos os trigramas estão na descrição
+    assert {r['id'] for r in indice.buscar('bisc')} == {5, 6}
+    assert indice.buscar('bisc', cobertura_min=1.0) == []
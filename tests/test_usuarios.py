@@ -0,0 +1,89 @@
+from datetime import date
+
+import psycopg2
+import pytest
+
+import agregados
+import repositorio
+import usuarios
+
+
+def test_autenticar_confere_a_senha(pool_migrado):
+    usuarios.criar_usuario(pool_migrado, 'Bia', 'Bia', 'segredo1')
+    usuario = usuarios.autenticar(pool_migrado, 'bia', 'segredo1')
+    assert usuario['login'] == 'bia' and 'senha_hash' not in usuario
+    assert usuarios.autenticar(pool_migrado, 'bia', 'errada') is None
+    assert usuarios.autenticar(pool_migrado, 'ninguem', 'segredo1') is None
+
+
+def test_usuario_sem_senha_entra_so_com_a_senha_legada(pool_migrado):
+    assert usuarios.autenticar(pool_migrado, 'leo', 'admin', senha_legada='admin')['id'] == usuarios.USUARIO_PADRAO
+    assert usuarios.autenticar(pool_migrado, 'leo', 'admin') is None
+
+
+def test_hash_da_senha_fica_fora_do_cache(pool_migrado):
+    usuarios.criar_usuario(pool_migrado, 'bia', 'Bia', 'segredo1')
+    usuarios.autenticar(pool_migrado, 'bia', 'segredo1')
+    usuarios.obter_usuario(pool_migrado, usuarios.USUARIO_PADRAO)
+    usuarios.obter_por_login(pool_migrado, 'bia')
+    assert not pool_migrado.cache._dados
+
+
+def _registrar(pool, user_id, itens):
+    n, erros = repositorio.importar_consumo(pool, user_id, itens, date(2026, 10, 1))
+    assert erros == []
+    return n
+
+
+def test_dados_de_um_usuario_nao_aparecem_para_outro(pool_migrado):
+    bia = usuarios.criar_usuario(pool_migrado, 'bia', 'Bia', 'segredo1')
+    _registrar(pool_migrado, 1, [{'alimento': 'Arroz', 'kcal': 130}])
+    _registrar(pool_migrado, bia, [{'alimento': 'Feijão', 'kcal': 76}, {'alimento': 'Ovo', 'kcal': 70}])
+    inicio, fim = date(2026, 1, 1), date(2026, 12, 31)
+
+    assert repositorio.contar_consumo(pool_migrado, 1, inicio, fim) == 1
+    assert repositorio.contar_consumo(pool_migrado, bia, inicio, fim) == 2
+    df, _ = repositorio.listar_consumo_pagina(pool_migrado, bia, inicio, fim, 10)
+    assert sorted(df['alimento']) == ['Feijão', 'Ovo']
+    # Ids de outro usuário são ignorados na exclusão e na edição
+    id_leo = int(repositorio.listar_consumo_pagina(pool_migrado, 1, inicio, fim, 10)[0]['id'].iloc[0])
+    assert repositorio.excluir_consumo(pool_migrado, bia, [id_leo]) == 0
+    assert repositorio.editar_consumo_lote(pool_migrado, bia, [id_leo], fator=2) == 0
+
+
+def test_particionar_preserva_linhas_restricoes_indices_e_gatilhos(pool_migrado):
+    bia = usuarios.criar_usuario(pool_migrado, 'bia', 'Bia', 'segredo1')
+    _registrar(pool_migrado, 1, [{'alimento': 'Arroz', 'kcal': 130}])
+    _registrar(pool_migrado, bia, [{'alimento': 'Feijão', 'kcal': 76}])
+
+    def catalogo():
+        return pool_migrado.consultar("""
+            SELECT (SELECT array_agg(conname::text ORDER BY conname) FROM pg_constraint WHERE conrelid = 'public.consumo'::regclass) AS restricoes,
+                   (SELECT array_agg(tgname::text ORDER BY tgname) FROM pg_trigger WHERE tgrelid = 'public.consumo'::regclass AND NOT tgisinternal) AS gatilhos,
+                   (SELECT array_agg(indexname::text ORDER BY indexname) FROM pg_indexes WHERE schemaname = 'public' AND tablename = 'consumo') AS indices
+        """).iloc[0]
+
+    antes = catalogo()
+    assert usuarios.particionar(pool_migrado, 'consumo', particoes=4) == 2
+    depois = catalogo()
+    assert pool_migrado.consultar("SELECT relkind FROM pg_class WHERE oid = 'public.consumo'::regclass")['relkind'].iloc[0] == 'p'
+    assert list(depois['restricoes']) == list(antes['restricoes'])
+    assert list(depois['gatilhos']) == list(antes['gatilhos'])
+    assert list(depois['indices']) == list(antes['indices'])
+    # Segunda chamada não faz nada
+    assert usuarios.particionar(pool_migrado, 'consumo', particoes=4) == 0
+
+    # Depois de particionar: o id continua da sequência, o rollup acompanha e as restrições valem
+    _registrar(pool_migrado, bia, [{'alimento': 'Ovo', 'kcal': 70}])
+    ids = pool_migrado.consultar("SELECT id FROM public.consumo ORDER BY id")['id'].tolist()
+    assert ids == [1, 2, 3]
+    assert agregados.verificar_consumo_diario(pool_migrado).empty
+    with pytest.raises(psycopg2.errors.CheckViolation):
+        pool_migrado.executar("INSERT INTO public.consumo (data, alimento, kcal, user_id) VALUES (CURRENT_DATE, 'x', -1, 1)")
+    with pytest.raises(psycopg2.errors.ForeignKeyViolation):
+        pool_migrado.executar("INSERT INTO public.consumo (data, alimento, kcal, user_id) VALUES (CURRENT_DATE, 'x', 1, 999)")
+
+
+def test_particionar_recusa_tabela_desconhecida(pool_migrado):
+    with pytest.raises(ValueError):
+        usuarios.particionar(pool_migrado, 'usuario')
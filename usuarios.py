@@ -0,0 +1,276 @@
+"""Usuários (perfis) com metas próprias e o dono de cada linha de consumo/peso.
+
+Cada linha de public.consumo e public.peso tem ``user_id``; todas as consultas
+do app filtram por ele e os índices começam por (user_id, data), então o custo
+de uma consulta depende do histórico do usuário, não do total de usuários.
+As metas (kcal, macros, peso) ficam em public.usuario em vez de constantes.
+
+O usuário 1 (login 'leo') é o dono do histórico anterior a esta migração e,
+enquanto não tiver senha própria, entra com o PASSWORD do secrets.toml.
+
+Uso pela linha de comando:
+    python usuarios.py listar
+    python usuarios.py criar --login ana --nome Ana --senha ...
+    python usuarios.py particionar [--particoes 8]   # opcional, ver ``particionar``
+"""
+import argparse
+import getpass
+import hashlib
+import hmac
+import secrets
+import sys
+
+import banco
+
+USUARIO_PADRAO = 1
+
+CAMPOS_METAS = ('meta_kcal', 'meta_proteina', 'meta_carbo', 'meta_gordura', 'meta_peso', 'perda_semanal_kg')
+
+ITERACOES_SENHA = 200_000
+
+SQL_ESQUEMA = [
+    """CREATE TABLE IF NOT EXISTS public.usuario (
+        id SERIAL PRIMARY KEY,
+        login TEXT NOT NULL,
+        nome TEXT NOT NULL,
+        senha_hash TEXT,
+        administrador BOOLEAN NOT NULL DEFAULT false,
+        meta_kcal REAL NOT NULL DEFAULT 1650,
+        meta_proteina REAL NOT NULL DEFAULT 110,
+        meta_carbo REAL NOT NULL DEFAULT 200,
+        meta_gordura REAL NOT NULL DEFAULT 50,
+        meta_peso REAL NOT NULL DEFAULT 120,
+        perda_semanal_kg REAL NOT NULL DEFAULT 0.8,
+        criado_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+        CONSTRAINT usuario_login_unico UNIQUE (login)
+    );""",
+    "INSERT INTO public.usuario (id, login, nome, administrador) VALUES (1, 'leo', 'Leo', true) ON CONFLICT DO NOTHING;",
+    "SELECT setval(pg_get_serial_sequence('public.usuario', 'id'), (SELECT MAX(id) FROM public.usuario));",
+    # Default constante: o ADD COLUMN não reescreve a tabela e escritas antigas (scripts, COPY) caem no usuário 1
+    "ALTER TABLE public.consumo ADD COLUMN IF NOT EXISTS user_id INTEGER NOT NULL DEFAULT 1 REFERENCES public.usuario (id);",
+    "ALTER TABLE public.peso ADD COLUMN IF NOT EXISTS user_id INTEGER NOT NULL DEFAULT 1 REFERENCES public.usuario (id);",
+    "CREATE INDEX IF NOT EXISTS idx_consumo_usuario_data_id ON public.consumo (user_id, data, id);",
+    "CREATE INDEX IF NOT EXISTS idx_peso_usuario_data ON public.peso (user_id, data);",
+    "CREATE INDEX IF NOT EXISTS idx_consumo_usuario_com_gluten ON public.consumo (user_id, data) WHERE contem_gluten;",
+    "DROP INDEX IF EXISTS public.idx_consumo_data_id;",
+    "DROP INDEX IF EXISTS public.idx_peso_data;",
+    "DROP INDEX IF EXISTS public.idx_consumo_com_gluten;",
+    # A chave de idempotência passa a incluir o dono (exigência de uma tabela particionada por user_id)
+    """ALTER TABLE public.consumo DROP CONSTRAINT consumo_chave_idempotencia_unica,
+        ADD CONSTRAINT consumo_chave_idempotencia_unica UNIQUE (user_id, chave_idempotencia);""",
+    """ALTER TABLE public.peso DROP CONSTRAINT peso_chave_idempotencia_unica,
+        ADD CONSTRAINT peso_chave_idempotencia_unica UNIQUE (user_id, chave_idempotencia);""",
+]
+
+
+# --- SENHAS ---
+def gerar_hash_senha(senha):
+    """PBKDF2-SHA256 com sal aleatório, no formato ``pbkdf2_sha256$iteracoes$sal$hash``."""
+    sal = secrets.token_hex(16)
+    resumo = hashlib.pbkdf2_hmac('sha256', senha.encode(), bytes.fromhex(sal), ITERACOES_SENHA)
+    return f"pbkdf2_sha256${ITERACOES_SENHA}${sal}${resumo.hex()}"
+
+
+def verificar_senha(senha, senha_hash):
+    try:
+        algoritmo, iteracoes, sal, esperado = senha_hash.split('$')
+    except (AttributeError, ValueError):
+        return False
+    if algoritmo != 'pbkdf2_sha256':
+        return False
+    resumo = hashlib.pbkdf2_hmac('sha256', senha.encode(), bytes.fromhex(sal), int(iteracoes))
+    return hmac.compare_digest(resumo.hex(), esperado)
+
+
+# --- CONSULTAS ---
+SQL_USUARIO = f"""
+    SELECT id, login, nome, senha_hash, administrador, {', '.join(CAMPOS_METAS)}
+    FROM public.usuario
+"""
+
+
+def _como_dict(df):
+    if df.empty:
+        return None
+    usuario = df.iloc[0].to_dict()
+    usuario['id'] = int(usuario['id'])
+    usuario['administrador'] = bool(usuario['administrador'])
+    for campo in CAMPOS_METAS:
+        usuario[campo] = float(usuario[campo])
+    return usuario
+
+
+# A linha traz o hash da senha: por padrão fica fora do cache de consultas do processo
+def obter_usuario(pool, user_id, cache=False):
+    return _como_dict(pool.consultar(SQL_USUARIO + " WHERE id = %s", (int(user_id),), cache=cache))
+
+
+def obter_por_login(pool, login, cache=False):
+    return _como_dict(pool.consultar(SQL_USUARIO + " WHERE login = %s", (str(login).strip().lower(),), cache=cache))
+
+
+def listar_usuarios(pool):
+    return pool.consultar(f"SELECT id, login, nome, administrador, {', '.join(CAMPOS_METAS)} FROM public.usuario ORDER BY id")
+
+
+def autenticar(pool, login, senha, senha_legada=None):
+    """Retorna o usuário (dict, sem o hash) se login e senha conferem; senão None.
+
+    Usuário sem senha própria só entra com ``senha_legada`` (o PASSWORD único de antes).
+    """
+    # Sem cache: o hash não fica no LRU do processo e uma senha trocada vale na hora
+    usuario = obter_por_login(pool, login, cache=False)
+    if usuario is None:
+        return None
+    if usuario['senha_hash']:
+        ok = verificar_senha(senha, usuario['senha_hash'])
+    else:
+        ok = senha_legada is not None and hmac.compare_digest(str(senha).encode(), str(senha_legada).encode())
+    if not ok:
+        return None
+    usuario.pop('senha_hash')
+    return usuario
+
+
+def criar_usuario(pool, login, nome, senha, administrador=False, **metas):
+    """Cria o usuário e retorna o id. Metas omitidas ficam com o padrão da tabela."""
+    login = str(login).strip().lower()
+    if not login or not str(nome).strip():
+        raise ValueError("Login e nome são obrigatórios.")
+    if len(senha) < 6:
+        raise ValueError("A senha precisa ter ao menos 6 caracteres.")
+    desconhecidas = set(metas) - set(CAMPOS_METAS)
+    if desconhecidas:
+        raise ValueError(f"Metas desconhecidas: {', '.join(sorted(desconhecidas))}")
+    colunas = ['login', 'nome', 'senha_hash', 'administrador', *metas]
+    valores = [login, str(nome).strip(), gerar_hash_senha(senha), bool(administrador), *(float(v) for v in metas.values())]
+    with pool.transacao() as cur:
+        cur.execute(
+            f"INSERT INTO public.usuario ({', '.join(colunas)}) VALUES ({', '.join(['%s'] * len(colunas))}) RETURNING id",
+            valores
+        )
+        return cur.fetchone()[0]
+
+
+def atualizar_metas(pool, user_id, **metas):
+    """Grava as metas informadas (os resumos de aderência se recalculam na próxima leitura)."""
+    desconhecidas = set(metas) - set(CAMPOS_METAS)
+    if desconhecidas:
+        raise ValueError(f"Metas desconhecidas: {', '.join(sorted(desconhecidas))}")
+    if not metas:
+        return 0
+    atribuicoes = ', '.join(f"{campo} = %s" for campo in metas)
+    return pool.executar(
+        f"UPDATE public.usuario SET {atribuicoes} WHERE id = %s", [*(float(v) for v in metas.values()), int(user_id)]
+    )
+
+
+def trocar_senha(pool, user_id, senha):
+    if len(senha) < 6:
+        raise ValueError("A senha precisa ter ao menos 6 caracteres.")
+    return pool.executar("UPDATE public.usuario SET senha_hash = %s WHERE id = %s", (gerar_hash_senha(senha), int(user_id)))
+
+
+# --- PARTICIONAMENTO OPCIONAL ---
+TABELAS_PARTICIONAVEIS = ('consumo', 'peso')
+
+
+def particionar(pool, tabela, particoes=8):
+    """Converte public.<tabela> em tabela particionada por HASH (user_id), numa transação.
+
+    Opcional: com os índices (user_id, data) cada usuário já lê só o que é dele.
+    Particionar ajuda quando há muitos usuários com históricos longos (VACUUM e
+    índices menores por partição). Índices, restrições e triggers são recriados
+    a partir das definições atuais; a chave primária passa a ser (user_id, id).
+    Bloqueia a tabela durante a cópia. Retorna o número de linhas copiadas.
+    """
+    if tabela not in TABELAS_PARTICIONAVEIS:
+        raise ValueError(f"Tabela não particionável: {tabela}")
+    nome = f"public.{tabela}"
+    with pool.transacao() as cur:
+        cur.execute(f"LOCK TABLE {nome} IN ACCESS EXCLUSIVE MODE")
+        cur.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", (nome,))
+        if cur.fetchone()[0] == 'p':
+            return 0
+        cur.execute(
+            "SELECT pg_get_triggerdef(oid) FROM pg_trigger WHERE tgrelid = %s::regclass AND NOT tgisinternal ORDER BY tgname",
+            (nome,)
+        )
+        gatilhos = [linha[0] for linha in cur.fetchall()]
+        cur.execute("""
+            SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype IN ('c', 'f', 'u') ORDER BY conname
+        """, (nome,))
+        restricoes = cur.fetchall()
+        cur.execute("""
+            SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i
+            WHERE i.indrelid = %s::regclass
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+        """, (nome,))
+        indices = [linha[0] for linha in cur.fetchall()]
+        cur.execute("""
+            SELECT attname FROM pg_attribute
+            WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped AND attgenerated = ''
+            ORDER BY attnum
+        """, (nome,))
+        colunas = ', '.join(linha[0] for linha in cur.fetchall())
+
+        antiga = f"{tabela}_antiga"
+        cur.execute(f"ALTER TABLE {nome} RENAME TO {antiga}")
+        cur.execute(
+            f"CREATE TABLE {nome} (LIKE public.{antiga} INCLUDING DEFAULTS INCLUDING GENERATED) PARTITION BY HASH (user_id)"
+        )
+        for resto in range(particoes):
+            cur.execute(f"CREATE TABLE public.{tabela}_p{resto} PARTITION OF {nome} FOR VALUES WITH (MODULUS {particoes}, REMAINDER {resto})")
+        # A sequência do id passa para a tabela nova (senão cairia junto com a antiga)
+        cur.execute(f"ALTER SEQUENCE public.{tabela}_id_seq OWNED BY {nome}.id")
+        # Sem triggers ainda: rollups e versões já refletem estas linhas
+        cur.execute(f"INSERT INTO {nome} ({colunas}) SELECT {colunas} FROM public.{antiga}")
+        copiadas = cur.rowcount
+        cur.execute(f"DROP TABLE public.{antiga}")
+
+        cur.execute(f"ALTER TABLE {nome} ADD CONSTRAINT {tabela}_pkey PRIMARY KEY (user_id, id)")
+        for conname, _, definicao in restricoes:
+            cur.execute(f"ALTER TABLE {nome} ADD CONSTRAINT {conname} {definicao}")
+        for definicao in indices:
+            cur.execute(definicao)
+        for definicao in gatilhos:
+            cur.execute(definicao)
+        cur.execute(f"ANALYZE {nome}")
+    return copiadas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Usuários do Leo Tracker.")
+    sub = parser.add_subparsers(dest='comando', required=True)
+    p_listar = sub.add_parser('listar')
+    p_criar = sub.add_parser('criar')
+    p_criar.add_argument('--login', required=True)
+    p_criar.add_argument('--nome', required=True)
+    p_criar.add_argument('--senha', help="Padrão: perguntada no terminal")
+    p_criar.add_argument('--administrador', action='store_true')
+    for campo in CAMPOS_METAS:
+        p_criar.add_argument(f"--{campo.replace('_', '-')}", dest=campo, type=float)
+    p_part = sub.add_parser('particionar')
+    p_part.add_argument('--particoes', type=int, default=8)
+    p_part.add_argument('--tabelas', nargs='+', choices=TABELAS_PARTICIONAVEIS, default=list(TABELAS_PARTICIONAVEIS))
+    for p in (p_listar, p_criar, p_part):
+        banco.argumento_dsn(p)
+    args = parser.parse_args(argv)
+
+    pool = banco.pool_cli(args)
+    if args.comando == 'listar':
+        print(listar_usuarios(pool).to_string(index=False))
+    elif args.comando == 'criar':
+        metas = {c: getattr(args, c) for c in CAMPOS_METAS if getattr(args, c) is not None}
+        senha = args.senha or getpass.getpass("Senha: ")
+        user_id = criar_usuario(pool, args.login, args.nome, senha, args.administrador, **metas)
+        print(f"Usuário {args.login} criado (id {user_id}).")
+    else:
+        for tabela in args.tabelas:
+            print(f"{tabela}: {particionar(pool, tabela, args.particoes)} linha(s) copiadas para a tabela particionada.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())